@@ -11,15 +11,22 @@ from bokeh.models import ColumnDataSource, TextInput, Button, RadioButtonGroup
 from bokeh.models import Spacer, Div, Panel, Tabs, LinearAxis, Range1d
 from bokeh.plotting import figure
 
-from DHLLDV.PipeObj import Pipeline
+import curve_cache
 
-pipeline = Pipeline()
+slurry, pipeline = curve_cache.default_state()
 
-flow_list = [pipeline.pipesections[-1].flow(v) for v in pipeline.slurry.vls_list]
-im_source = ColumnDataSource(data=dict(Q=flow_list,
-                                       im=[pipeline.calc_system_head(Q)[0] for Q in flow_list],
-                                       il=[pipeline.calc_system_head(Q)[1] for Q in flow_list],
-                                       ))
+def calc_data(pipeline):
+    """Calculate the system head curve data for pipeline
+
+    This does not touch the document, so it can run off the bokeh server thread"""
+    flow_list = [pipeline.pipesections[-1].flow(v) for v in pipeline.slurry.vls_list]
+    heads = [pipeline.calc_system_head(Q) for Q in flow_list]
+    return dict(Q=flow_list,
+                im=[h[0] for h in heads],
+                il=[h[1] for h in heads],
+                )
+
+im_source = ColumnDataSource(data=calc_data(pipeline))
 
 HQ_TOOLTIPS = [('name', "$name"),
                ("Flow (m\u00b3/sec)", "@Q"),
@@ -58,13 +65,13 @@ HQ_plot.axis.minor_tick_out = 0
 
 HQ_plot.legend.location = "top_left"
 
-def update_all(pipeline):
-    """Placeholder for an update function"""
-    flow_list = [pipeline.pipesections[-1].flow(v) for v in pipeline.slurry.vls_list]
-    im_source.data=dict(Q=flow_list,
-                        im=[pipeline.calc_system_head(Q)[0] for Q in flow_list],
-                        il=[pipeline.calc_system_head(Q)[1] for Q in flow_list],
-                        )
+def update_all(pipeline, data=None):
+    """Update the system tab
+
+    data: The system curve data from calc_data, if already calculated"""
+    if data is None:
+        data = calc_data(pipeline)
+    im_source.data = data
     HQ_plot.xaxis[1].axis_label = f'Velocity (m/sec in {pipeline.slurry.Dp:0.3f}m pipe)'
     for i, r in enumerate(pipecol.children):    # iterate over the rows of pipe
         r.children[2].value = f"{pipeline.pipesections[i].diameter:0.3f}"
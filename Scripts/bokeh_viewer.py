@@ -6,6 +6,9 @@ Execute by running 'bokeh serve --show .\Scripts\bokeh_viewer.py' to open a tab
 Added by R. Ramsdell 19 August, 2021
 """
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from functools import partial
 
 from bokeh.io import curdoc
 from bokeh.layouts import column, row
@@ -14,60 +17,60 @@ from bokeh.models import Spacer, Div, Panel, Tabs
 from bokeh.plotting import figure
 
 from DHLLDV import DHLLDV_framework
-from DHLLDV import SlurryObj, PipeObj
 
+import curve_cache
 import SystemTab
 
+DEBOUNCE_MS = 300   # Input changes closer together than this are calculated once
+COARSE_STEP = 5     # The first pass calculates every 5th velocity and concentration
+REFINE_PASSES = 4   # The rest of the points are filled in over this many passes
+
 # Set up data
 
-slurry = SlurryObj.Slurry()
-
-im_source = ColumnDataSource(data=dict(v=slurry.vls_list,
-                                       graded_Cvt_im=slurry.im_curves['graded_Cvt_im'],
-                                       Cvs_im=slurry.im_curves['Cvs_im'],
-                                       Cvt_im=slurry.im_curves['Cvt_im'],
-                                       il=slurry.im_curves['il'],
-                                       regime=slurry.Erhg_curves['Cvs_regime']))
-LDV50_source = ColumnDataSource(data=dict(v=slurry.LDV_curves['vls'],
-                                          im=slurry.LDV_curves['im'],
-                                          il=slurry.LDV_curves['il'],
-                                          Erhg=slurry.LDV_curves['Erhg'],
-                                          regime=slurry.LDV_curves['regime']))
-LDV85_source = ColumnDataSource(data=dict(v=slurry.LDV85_curves['vls'],
-                                          im=slurry.LDV85_curves['im'],
-                                          il=slurry.LDV85_curves['il'],
-                                          Erhg=slurry.LDV85_curves['Erhg'],
-                                          regime=slurry.LDV85_curves['regime']))
-Erhg_source = ColumnDataSource(data=dict(il=slurry.Erhg_curves['il'],
-                                         graded_Cvt=slurry.Erhg_curves['graded_Cvt_Erhg'],
-                                         Cvs=slurry.Erhg_curves['Cvs_Erhg'],
-                                         Cvt=slurry.Erhg_curves['Cvt_Erhg'],
-                                         regime=slurry.Erhg_curves['Cvs_regime']))
-
-pipeline = PipeObj.Pipeline(slurry=slurry)
-def update_source_data():
-    slurry.generate_curves()
-    im_source.data = dict(v=slurry.vls_list,
-                          graded_Cvt_im=slurry.im_curves['graded_Cvt_im'],
-                          Cvs_im=slurry.im_curves['Cvs_im'],
-                          Cvt_im=slurry.im_curves['Cvt_im'],
-                          il=slurry.im_curves['il'],
-                          regime=slurry.Erhg_curves['Cvs_regime'])
-    LDV50_source.data = dict(v=slurry.LDV_curves['vls'],
-                             im=slurry.LDV_curves['im'],
-                             il=slurry.LDV_curves['il'],
-                             Erhg=slurry.LDV_curves['Erhg'],
-                             regime=slurry.LDV_curves['regime'])
-    LDV85_source.data = dict(v=slurry.LDV85_curves['vls'],
-                             im=slurry.LDV85_curves['im'],
-                             il=slurry.LDV85_curves['il'],
-                             Erhg=slurry.LDV85_curves['Erhg'],
-                             regime=slurry.LDV85_curves['regime'])
-    Erhg_source.data = dict(il=slurry.Erhg_curves['il'],
-                            graded_Cvt=slurry.Erhg_curves['graded_Cvt_Erhg'],
-                            Cvs=slurry.Erhg_curves['Cvs_Erhg'],
-                            Cvt=slurry.Erhg_curves['Cvt_Erhg'],
-                            regime=slurry.Erhg_curves['Cvs_regime'])
+def slurry_source_data(s, vls_list=None):
+    """Return the data for the im, LDV50, LDV85 and Erhg ColumnDataSources from slurry s
+
+    vls_list: The velocities of the slurry curves, default s.vls_list"""
+    return {'im': dict(v=s.vls_list if vls_list is None else vls_list,
+                       graded_Cvt_im=s.im_curves['graded_Cvt_im'],
+                       Cvs_im=s.im_curves['Cvs_im'],
+                       Cvt_im=s.im_curves['Cvt_im'],
+                       il=s.im_curves['il'],
+                       regime=s.Erhg_curves['Cvs_regime']),
+            'LDV50': dict(v=s.LDV_curves['vls'],
+                          im=s.LDV_curves['im'],
+                          il=s.LDV_curves['il'],
+                          Erhg=s.LDV_curves['Erhg'],
+                          regime=s.LDV_curves['regime']),
+            'LDV85': dict(v=s.LDV85_curves['vls'],
+                          im=s.LDV85_curves['im'],
+                          il=s.LDV85_curves['il'],
+                          Erhg=s.LDV85_curves['Erhg'],
+                          regime=s.LDV85_curves['regime']),
+            'Erhg': dict(il=s.Erhg_curves['il'],
+                         graded_Cvt=s.Erhg_curves['graded_Cvt_Erhg'],
+                         Cvs=s.Erhg_curves['Cvs_Erhg'],
+                         Cvt=s.Erhg_curves['Cvt_Erhg'],
+                         regime=s.Erhg_curves['Cvs_regime']),
+            }
+
+slurry, pipeline = curve_cache.default_state()
+source_data = slurry_source_data(slurry)
+im_source = ColumnDataSource(data=source_data['im'])
+LDV50_source = ColumnDataSource(data=source_data['LDV50'])
+LDV85_source = ColumnDataSource(data=source_data['LDV85'])
+Erhg_source = ColumnDataSource(data=source_data['Erhg'])
+
+
+doc = curdoc()
+executor = ThreadPoolExecutor(max_workers=1)
+recalc = {'generation': 0,      # Incremented on every input change
+          'timeout': None,      # The pending debounce callback
+          'future': None,       # The calculation queued or running
+          }
+
+def update_input_displays():
+    """Update the displays that follow directly from the inputs"""
     roughness_label.value = f"{slurry.epsilon:0.3e}"
     fluid_viscosity_label.value = f"{slurry.nu:0.4e}"
     fluid_density_label.value = f"{slurry.rhol:0.4f}"
@@ -78,7 +81,128 @@ def update_source_data():
     percents = sorted(list(slurry.GSD.keys()))
     GSD_source.data = dict(p=percents, dia=[slurry.GSD[pct] * 1000 for pct in percents])
     HQ_plot.xaxis[0].axis_label = f'Velocity (m/sec in {slurry.Dp:0.3f}m pipe)'
-    SystemTab.update_all(pipeline)
+
+def update_source_data():
+    """Update the input displays now and schedule the curves to be recalculated
+
+    The curves are calculated on the executor so the server stays responsive. Changes
+    within DEBOUNCE_MS of each other are calculated once, and the results of a
+    calculation are dropped if the inputs changed while it ran."""
+    update_input_displays()
+    recalc['generation'] += 1
+    if recalc['timeout'] is not None:
+        try:
+            doc.remove_timeout_callback(recalc['timeout'])
+        except ValueError:
+            pass    # It already ran
+    recalc['timeout'] = doc.add_timeout_callback(start_recalc, DEBOUNCE_MS)
+    status_div.text = "Calculating..."
+
+def pass_indices(n):
+    """Split range(n) into the coarse pass and the refining passes"""
+    coarse = list(range(COARSE_STEP - 1, n, COARSE_STEP))
+    coarse_set = set(coarse)
+    rest = [i for i in range(n) if i not in coarse_set]
+    return [coarse] + [rest[k::REFINE_PASSES] for k in range(REFINE_PASSES)]
+
+def merge_pass(store, indices, curves):
+    """Add the curves (a dict of lists) for the points at indices to store, and return the
+    curves for all the points so far, in index order"""
+    for key, values in curves.items():
+        column = store.setdefault(key, {})
+        for i, v in zip(indices, values):
+            column[i] = v
+    return {key: [column[i] for i in sorted(column)] for key, column in store.items()}
+
+def calc_curves(s, pl, generation, push):
+    """Generate the curves for slurry s and pipeline pl, this runs on the executor
+
+    A coarse set of points is calculated and pushed first, then the rest of the points
+    are filled in over REFINE_PASSES passes. The work stops if the inputs change.
+    push(data, system_data): Called with the source data after each pass, and the
+    system curve data after the last
+
+    The full curves are shared with other sessions through curve_cache, so inputs that
+    were already calculated, or are being calculated by another session, are not
+    calculated again."""
+    value = curve_cache.cache.get_or_compute(curve_cache.state_key(s, pl), partial(calc_passes, s, pl, generation, push))
+    if value is None:
+        return None     # Superseded
+    curve_cache.apply_curves(value, s, pl)
+    push(slurry_source_data(s), SystemTab.calc_data(pl))
+    return pl.slurries
+
+def calc_passes(s, pl, generation, push):
+    """Calculate the curves in passes for calc_curves, returns the value for curve_cache"""
+    vls_all = s.vls_list
+    d50 = s.get_dx(0.5)
+    d85 = s.get_dx(0.85)
+    Cv_all = [(i + 1) / 100. for i in range(50)]
+    stores = {'Erhg': {}, 'LDV50': {}, 'LDV85': {}}
+    vls_done = []
+    for vls_pass, Cv_pass in zip(pass_indices(len(vls_all)), pass_indices(len(Cv_all))):
+        if generation != recalc['generation']:
+            return None     # Superseded
+        Cv_list = [Cv_all[i] for i in Cv_pass]
+        s.Erhg_curves = merge_pass(stores['Erhg'], vls_pass, s.generate_Erhg_curves([vls_all[i] for i in vls_pass]))
+        s.im_curves = s.generate_im_curves()
+        s.LDV_curves = merge_pass(stores['LDV50'], Cv_pass, s.generate_LDV_curves(d50, Cv_list))
+        s.LDV85_curves = merge_pass(stores['LDV85'], Cv_pass, s.generate_LDV_curves(d85, Cv_list))
+        vls_done = sorted(vls_done + vls_pass)
+        if len(vls_done) < len(vls_all):
+            push(slurry_source_data(s, [vls_all[i] for i in vls_done]))
+    pl.slurry = s
+    return curve_cache.curves_from(s, pl)
+
+def start_recalc():
+    """Start calculating the curves for a snapshot of the current inputs"""
+    recalc['timeout'] = None
+    if recalc['future'] is not None:
+        recalc['future'].cancel()   # Only cancels it if it has not started
+    s = copy(slurry)
+    pl = copy(pipeline)
+    pl.pipesections = [copy(p) for p in pipeline.pipesections]
+    generation = recalc['generation']
+
+    def push(data, system_data=None):
+        doc.add_next_tick_callback(partial(push_curves, generation, data, system_data, s))
+
+    future = executor.submit(calc_curves, s, pl, generation, push)
+    recalc['future'] = future
+    future.add_done_callback(lambda f: doc.add_next_tick_callback(partial(finish_recalc, generation, f)))
+
+def push_curves(generation, data, system_data, s):
+    """Put the calculated curves into the plots, back on the server thread
+
+    system_data: The system curve data, given with the final curves"""
+    if generation != recalc['generation']:
+        return  # Superseded by a later input change
+    im_source.data = data['im']
+    LDV50_source.data = data['LDV50']
+    LDV85_source.data = data['LDV85']
+    Erhg_source.data = data['Erhg']
+    if system_data is None:
+        status_div.text = f"Refining ({len(data['im']['v'])} points)..."
+    else:
+        slurry.Erhg_curves = s.Erhg_curves
+        slurry.im_curves = s.im_curves
+        slurry.LDV_curves = s.LDV_curves
+        slurry.LDV85_curves = s.LDV85_curves
+        SystemTab.update_all(pipeline, system_data)
+
+def finish_recalc(generation, future):
+    """Clean up after the calculation, back on the server thread"""
+    if future.cancelled() or generation != recalc['generation']:
+        return
+    try:
+        slurries = future.result()
+    except Exception as e:
+        print(f"Curve calculation failed: {e}")
+        status_div.text = "Calculation failed"
+        return
+    pipeline.slurries = dict(slurries)
+    pipeline.slurries[slurry.Dp] = slurry
+    status_div.text = ""
 
 ################
 # Set up HQ plot
@@ -259,7 +383,6 @@ def update_Dp(attrname, old, new):
     for p in pipeline.pipesections:
         if p.diameter == old_Dp:
             p.diameter = slurry.Dp
-    pipeline.slurry = slurry
     update_source_data()
 
 
@@ -442,9 +565,10 @@ def stop_button_callback():
     sys.exit()  # Stop the server
 stop_button = Button(label="Stop", button_type="success", width=75)
 stop_button.on_click(stop_button_callback)
+status_div = Div(text="", width=200)
 
 
 curdoc().add_root(column(Tabs(tabs=[slurry_panel,
                                     SystemTab.system_panel(pipeline)]),
-                         stop_button))
+                         row(stop_button, status_div)))
 curdoc().title = "Visualizing DHLLDV"
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+curve_cache: Curves shared by all the sessions of the bokeh viewer
+
+bokeh serve runs bokeh_viewer.py again for each browser session, but imported modules are
+loaded once per server, so the cache here is shared by all the sessions. It is keyed by
+the slurry and pipeline inputs, holds at most MAX_ENTRIES results (least recently used
+are dropped first), and when two sessions ask for the same inputs at once the curves are
+calculated once and both get the result.
+
+The default slurry and pipeline are calculated when the module is first imported.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from copy import copy, deepcopy
+
+from DHLLDV import SlurryObj, PipeObj
+
+MAX_ENTRIES = 32
+
+
+class CurveCache():
+    """A thread safe LRU cache where each key is calculated only once at a time"""
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}        # key: Future for the calculations underway
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        return None
+
+    def put(self, key, value):
+        """Store value for key, dropping the least recently used entries if full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the value for key, calling compute() to calculate it if needed
+
+        If another thread is already calculating key, wait for its result. If compute
+        returns None (the work was abandoned) nothing is stored, and any waiting threads
+        calculate it themselves."""
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                future = self._in_flight.get(key)
+                owner = future is None
+                if owner:
+                    future = Future()
+                    self._in_flight[key] = future
+                    self.misses += 1
+            if not owner:
+                value = future.result()
+                if value is not None:
+                    return value
+                continue    # The owner gave up, try again
+            try:
+                value = compute()
+                if value is not None:
+                    self.put(key, value)
+            except BaseException as e:
+                with self._lock:
+                    del self._in_flight[key]
+                future.set_exception(e)
+                raise
+            with self._lock:
+                del self._in_flight[key]
+            future.set_result(value)
+            return value
+
+
+cache = CurveCache()
+
+
+def state_key(slurry, pipeline):
+    """Return the cache key for all the inputs of the slurry and pipeline"""
+    return ((slurry.Dp, slurry.D50, tuple(sorted(slurry.GSD.items())), slurry.epsilon, slurry.nu,
+             slurry.rhol, slurry.rhos, slurry.Cv, tuple(slurry.vls_list)),
+            tuple((p.name, p.diameter, p.length, p.total_K, p.elev_change) for p in pipeline.pipesections))
+
+
+def curves_from(slurry, pipeline):
+    """Return the value to cache for a slurry and pipeline with their curves generated
+
+    Treat the value as read only, it is shared between sessions"""
+    return {'Erhg_curves': slurry.Erhg_curves,
+            'im_curves': slurry.im_curves,
+            'LDV_curves': slurry.LDV_curves,
+            'LDV85_curves': slurry.LDV85_curves,
+            'slurries': dict(pipeline.slurries),
+            }
+
+
+def apply_curves(value, slurry, pipeline=None):
+    """Set the cached curves on slurry, and the slurries for the other diameters on pipeline
+
+    They are copies, so the session can change them without changing the cache"""
+    value = deepcopy(value)
+    slurry.Erhg_curves = value['Erhg_curves']
+    slurry.im_curves = value['im_curves']
+    slurry.LDV_curves = value['LDV_curves']
+    slurry.LDV85_curves = value['LDV85_curves']
+    if pipeline is not None:
+        pipeline.slurries = value['slurries']
+        pipeline.slurries[slurry.Dp] = slurry
+
+
+def default_state():
+    """Return a new slurry and pipeline with the default inputs, without recalculating the curves"""
+    slurry = deepcopy(_default_slurry)
+    pipeline = copy(_default_pipeline)
+    pipeline.pipesections = [copy(p) for p in _default_pipeline.pipesections]
+    pipeline._slurry = slurry   # The curves are cached, so skip the slurry setter that regenerates them
+    apply_curves(curves_from(_default_slurry, _default_pipeline), slurry, pipeline)
+    return slurry, pipeline
+
+
+# Preload the default scenario
+_default_slurry = SlurryObj.Slurry()
+_default_pipeline = PipeObj.Pipeline(slurry=_default_slurry)
+cache.put(state_key(_default_slurry, _default_pipeline), curves_from(_default_slurry, _default_pipeline))
@@ -9,10 +9,9 @@ import csv
 
 from DHLLDV import DHLLDV_constants
 from DHLLDV import DHLLDV_framework
+from DHLLDV import HeadLossModels
 from DHLLDV import homogeneous
 
-from Wilson import Wilson_Stratified, Wilson_V50
-
 #import numpy as np
 try:
     import matplotlib.pyplot as plt
@@ -38,23 +37,16 @@ if __name__ == '__main__':
     num_points = 100
     vls_list = [(i+1)/10. for i in range(num_points)]
 
-    #The DHLLDV model for the given material
-    Erhg_obj_list = [DHLLDV_framework.Cvs_Erhg(vls, Dp, d, epsilon, nu, rhol, rhos, Cv, get_dict=True) for vls in vls_list]
-    il_list = [Erhg_obj['il'] for Erhg_obj in Erhg_obj_list]
-    Cvt_Erhg_list = [DHLLDV_framework.Cvt_Erhg(vls, Dp, d, epsilon, nu, rhol, rhos, Cv) for vls in vls_list]
-    graded_Cvt_Erhg_list = [DHLLDV_framework.Erhg_graded(GSD, vls, Dp, epsilon, nu, rhol, rhos, Cv, Cvt_eq_Cvs=True)
-                            for vls in vls_list]
-
-    #Wilson Coarse for the D50 and D85
+    #The DHLLDV and Wilson models for the given material, Wilson coarse for the D50 and D85
     musf = DHLLDV_constants.musf
-    Wilson_Stratified_ERHG_list_50 = [Wilson_Stratified.Erhg(Vls, Dp, GSD[0.5], epsilon, nu, rhol, rhos, musf, Cv)
-                                      for Vls in vls_list]
-    Wilson_Stratified_ERHG_list_85 = [Wilson_Stratified.Erhg(Vls, Dp, GSD[0.85], epsilon, nu, rhol, rhos, musf, Cv)
-                                      for Vls in vls_list]
-
-    #Wilson V50 (heterogeneous)
-    Wilson_V50_ERHG_list = [Wilson_V50.Erhg(Vls, Dp, GSD[0.50], GSD[0.85], epsilon, nu, rhol, rhos, musf)
-                            for Vls in vls_list]
+    spec = HeadLossModels.SlurrySpec(Dp, GSD[0.50], GSD[0.85], GSD[0.15], epsilon, nu, rhol, rhos, Cv, musf)
+    curves = HeadLossModels.compare(spec, vls_list, ['DHLLDV graded Cvt', 'Wilson stratified',
+                                                     'Wilson stratified d85', 'Wilson V50'])
+    il_list = curves['il']
+    graded_Cvt_Erhg_list = curves['DHLLDV graded Cvt']['Erhg']
+    Wilson_Stratified_ERHG_list_50 = curves['Wilson stratified']['Erhg']
+    Wilson_Stratified_ERHG_list_85 = curves['Wilson stratified d85']['Erhg']
+    Wilson_V50_ERHG_list = curves['Wilson V50']['Erhg']
 
 
     #LDV curves
@@ -93,13 +85,10 @@ if __name__ == '__main__':
 
 
     #The im curves
-    im_list = [graded_Cvt_Erhg_list[i]*Rsd*Cv+il_list[i] for i in range(num_points)]
-    Wilson_Stratified_im_list_50 = [Wilson_Stratified.stratified_head_loss(Vls, Dp, GSD[0.5], epsilon, nu, rhol, rhos, musf, Cv)
-                                    for Vls in vls_list]
-    Wilson_Stratified_im_list_85 = [Wilson_Stratified.stratified_head_loss(Vls, Dp, GSD[0.85], epsilon, nu, rhol, rhos, musf, Cv)
-                                    for Vls in vls_list]
-    Wilson_v50_im_list = [Wilson_V50.heterogeneous_head_loss(Vls, Dp, GSD[0.50], GSD[0.85], epsilon, nu, rhol, rhos, musf, Cv)
-                          for Vls in vls_list]
+    im_list = curves['DHLLDV graded Cvt']['im']
+    Wilson_Stratified_im_list_50 = curves['Wilson stratified']['im']
+    Wilson_Stratified_im_list_85 = curves['Wilson stratified d85']['im']
+    Wilson_v50_im_list = curves['Wilson V50']['im']
 
     if plt:
         fig = plt.figure(figsize=(11,7.5))
@@ -0,0 +1,244 @@
+"""
+bench - Timing and memory benchmarks of the DHLLDV hot paths
+
+    python benchmarks/bench.py                          # run them all and print the results
+    python benchmarks/bench.py -k LDV -k Erhg_graded    # only the benchmarks matching a pattern
+    python benchmarks/bench.py --save baseline.json     # save the results as a baseline
+    python benchmarks/bench.py --compare baseline.json  # flag regressions against a baseline
+
+Each benchmark has fixed inputs. The time is the best of --repeat runs of a batch of calls,
+divided by the number of calls. The memory is measured with tracemalloc on one more call:
+    peak_kib: The peak memory allocated during the call (KiB)
+    net_kib: The memory still allocated after the call (KiB)
+    blocks: The number of memory blocks still allocated after the call
+
+A benchmark regresses if it is more than --threshold (default 25%) slower than the
+baseline, or its peak memory is more than the threshold (and 1 KiB) higher. The exit
+status is 1 if any benchmark regressed. Baselines are only comparable on the same machine.
+
+Run from the repository root, the src directory is added to the path if DHLLDV is not
+installed. No network access or extra packages are needed.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+
+try:
+    import DHLLDV
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV import stratified
+from DHLLDV.DHLLDV_constants import steel_roughness
+from DHLLDV.DHLLDV_Utils import interpDict
+from DHLLDV.PipeObj import Pipeline
+from DHLLDV.PumpObj import Pump
+from DHLLDV.SlurryObj import Slurry
+from Wilson import Wilson_Stratified, Wilson_V50
+
+# The default slurry of the viewer: 762 mm pipe, 1 mm sand, 17.5% in sea water
+Dp = 0.762
+d = 0.001
+nu = 1.0508e-6
+rhol = 1.0248103
+rhos = 2.65
+Cv = 0.175
+args = (Dp, d, steel_roughness, nu, rhol, rhos, Cv)
+GSD = {0.15: d / 2.0, 0.50: d, 0.85: d * 2.72}
+VLS = [1.0, 2.0, 3.0, 4.0, 5.0, 7.0]     # Velocities covering the regimes (m/sec)
+
+_benchmarks = {}
+
+
+def benchmark(name, number=1):
+    """Decorator for a setup function that returns the callable to time
+
+    number: The calls per timed batch"""
+    def decorator(setup):
+        _benchmarks[name] = (setup, number)
+        return setup
+    return decorator
+
+
+@benchmark('Cvs_Erhg', number=50)
+def _cvs_erhg():
+    return lambda: [DHLLDV_framework.Cvs_Erhg(vls, *args) for vls in VLS]
+
+
+@benchmark('Cvt_Erhg', number=20)
+def _cvt_erhg():
+    return lambda: [DHLLDV_framework.Cvt_Erhg(vls, *args) for vls in VLS]
+
+
+@benchmark('LDV', number=100)
+def _ldv():
+    return lambda: DHLLDV_framework.LDV(None, *args)
+
+
+@benchmark('vls_FBSB', number=100)
+def _vls_fbsb():
+    return lambda: stratified.vls_FBSB(*args)
+
+
+def _graded(num_fracs):
+    fracs = DHLLDV_framework.create_fracs(GSD, Dp, nu, rhol, rhos, num_fracs)
+    return lambda: [DHLLDV_framework.Erhg_graded(fracs, vls, Dp, steel_roughness, nu, rhol, rhos, Cv,
+                                                 Cvt_eq_Cvs=True, num_fracs=None) for vls in VLS]
+
+
+for _n in (4, 10, 20):
+    benchmark(f'Erhg_graded {_n} fracs', number=5)(lambda n=_n: _graded(n))
+
+
+@benchmark('Slurry()')
+def _slurry():
+    return Slurry
+
+
+@benchmark('Pipeline.calc_system_head', number=2)
+def _system_head():
+    pipeline = Pipeline(slurry=Slurry())
+    pipe = pipeline.pipesections[-1]
+    flows = [pipe.flow((i + 1) / 2.0) for i in range(19)]
+    return lambda: [pipeline.calc_system_head(Q) for Q in flows]
+
+
+@benchmark('Pump.point power limited', number=20)
+def _pump_point():
+    H = interpDict({0.3567568: 30.093008, 1.0702704: 29.090661, 1.7837840: 28.474970, 2.4972976: 27.627627,
+                    3.2108112: 26.291587, 3.9243248: 24.538921, 4.6378384: 22.671603, 5.3513520: 21.082392})
+    P = interpDict({0.3567568: 229.184279, 1.0702704: 450.410668, 1.7837840: 656.571060, 2.4972976: 860.271806,
+                    3.2108112: 1061.634585, 3.9243248: 1276.124040, 4.6378384: 1542.729293, 5.3513520: 1915.670989})
+    pump = Pump("Bench Pump", 3.5, 1.88, 0.8636, 0.8636, H, P, avail_power=895, limited='power', slurry=Slurry())
+    flows = [0.5 + 0.125 * i for i in range(21)]
+    return lambda: [pump.point(Q, exact=True) for Q in flows]
+
+
+@benchmark('Wilson V50 Erhg', number=20)
+def _wilson_v50():
+    def run():
+        Wilson_V50.V50_M.cache_clear()     # Time the V50 and M calculation, not the cache
+        return Wilson_V50.Erhg_list(VLS, Dp, d, d * 2.72, steel_roughness, nu, rhol, rhos, 0.4)
+    return run
+
+
+@benchmark('Wilson stratified Erhg', number=50)
+def _wilson_stratified():
+    return lambda: Wilson_Stratified.Erhg_list(VLS, Dp, d, steel_roughness, nu, rhol, rhos, 0.4, Cv)
+
+
+def names():
+    """Return the names of the benchmarks"""
+    return list(_benchmarks)
+
+
+def run_one(name, repeat=5):
+    """Run the benchmark name, returns the dict of results"""
+    setup, number = _benchmarks[name]
+    func = setup()
+    func()      # Warm up
+    times = []
+    gc_was = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            times.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was:
+            gc.enable()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        result = func()
+        after, peak = tracemalloc.get_traced_memory()
+        blocks = sum(s.count_diff for s in tracemalloc.take_snapshot().compare_to(snapshot, 'filename'))
+        del result
+    finally:
+        tracemalloc.stop()
+    times.sort()
+    return {'time': times[0],
+            'median': times[len(times) // 2],
+            'number': number,
+            'peak_kib': (peak - before) / 1024,
+            'net_kib': (after - before) / 1024,
+            'blocks': blocks,
+            }
+
+
+def run(patterns=None, repeat=5, progress=None):
+    """Run the benchmarks matching any of the regex patterns (all if None)
+
+    returns the dict {'machine': ..., 'results': {name: dict}}"""
+    results = {}
+    for name in names():
+        if patterns and not any(re.search(p, name) for p in patterns):
+            continue
+        results[name] = run_one(name, repeat)
+        if progress is not None:
+            print(format_line(name, results[name]), file=progress, flush=True)
+    return {'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'processor': platform.processor()},
+            'results': results}
+
+
+def compare(results, baseline, threshold=0.25):
+    """Return the list of (name, quantity, value, baseline value) that regressed"""
+    regressions = []
+    for name, r in results['results'].items():
+        b = baseline['results'].get(name)
+        if b is None:
+            continue
+        if r['time'] > b['time'] * (1 + threshold):
+            regressions.append((name, 'time', r['time'], b['time']))
+        if r['peak_kib'] > max(b['peak_kib'] * (1 + threshold), b['peak_kib'] + 1):
+            regressions.append((name, 'peak_kib', r['peak_kib'], b['peak_kib']))
+    return regressions
+
+
+def format_line(name, r):
+    return (f"{name:30s} {r['time'] * 1e6:12.1f} us {r['peak_kib']:10.1f} KiB peak "
+            f"{r['net_kib']:8.1f} KiB net {r['blocks']:7d} blocks")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python benchmarks/bench.py', description="DHLLDV benchmarks")
+    parser.add_argument('-k', dest='patterns', action='append', help="Only run the benchmarks matching this regex")
+    parser.add_argument('-r', '--repeat', type=int, default=5, help="The timed runs of each benchmark")
+    parser.add_argument('--save', help="Save the results to this JSON file")
+    parser.add_argument('--compare', help="Compare the results to this baseline JSON file")
+    parser.add_argument('--threshold', type=float, default=0.25, help="The allowed slow down (fraction)")
+    parser.add_argument('-l', '--list', action='store_true', help="List the benchmarks")
+    args = parser.parse_args(argv)
+    if args.list:
+        print('\n'.join(names()))
+        return 0
+    results = run(args.patterns, args.repeat, progress=sys.stdout)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, quantity, value, base in regressions:
+            print(f"REGRESSION {name}: {quantity} {value:0.6g} vs baseline {base:0.6g} "
+                  f"({(value / base - 1) * 100:+0.0f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
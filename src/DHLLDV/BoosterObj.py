@@ -0,0 +1,305 @@
+"""
+BoosterObj - Pumps in series along a Pipeline: the dredge pump and any booster stations
+"""
+import bisect
+import heapq
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from dataclasses import dataclass
+from math import ceil
+
+from DHLLDV.DHLLDV_constants import gravity
+from DHLLDV.PipeObj import Pipeline
+from DHLLDV.PumpObj import Pump
+
+
+@dataclass
+class Station():
+    """A pump placed along the pipeline"""
+    pump: Pump
+    chainage: float = 0.0     # m from the start of the pipeline
+
+
+def _search_speeds(first, tables, suctions, Hreq, min_suction, max_discharge):
+    """Find the lowest power combination of speeds, with the first pump at a fixed speed
+
+    first: Index of the speed of the first pump
+    tables: For each pump a list of (H, P, set speed, actual speed) sorted by H
+    suctions: The head lost between the start and each station (m of water)
+    Hreq: The head required to deliver the flow (m of water)
+    min_suction, max_discharge: Pressure limits at the stations (m of water), or None
+
+    returns a tuple (power, [index of each pump in tables]) or None if no combination works"""
+    best = None
+    last = tables[-1]
+    last_heads = [t[0] for t in last]
+    for rest in itertools.product(*[range(len(t)) for t in tables[1:-1]]):
+        combo = (first,) + rest
+        H = 0.0
+        P = 0.0
+        ok = True
+        for i, j in enumerate(combo):
+            suction = H - suctions[i]
+            H += tables[i][j][0]
+            P += tables[i][j][1]
+            if (min_suction is not None and suction < min_suction) or \
+                    (max_discharge is not None and suction + tables[i][j][0] > max_discharge):
+                ok = False
+                break
+        if not ok:
+            continue
+        suction = H - suctions[-1]
+        if min_suction is not None and suction < min_suction:
+            continue
+        for k in range(bisect.bisect_left(last_heads, Hreq - H), len(last)):
+            if max_discharge is not None and suction + last[k][0] > max_discharge:
+                break
+            if best is None or P + last[k][1] < best[0]:
+                best = (P + last[k][1], list(combo) + [k])
+    return best
+
+
+class PumpTrain():
+    """Object to manage a set of pumps in series along a pipeline
+
+    The pumps handle the slurry of the pipeline, whatever their own slurry"""
+    def __init__(self, pipeline=None, stations=None):
+        if not pipeline:
+            pipeline = Pipeline()
+        self.pipeline = pipeline
+        self.stations = sorted(stations or [], key=lambda s: s.chainage)
+
+    @property
+    def pumps(self):
+        return [s.pump for s in self.stations]
+
+    def set_speeds(self, speeds):
+        """Set the current speed of each pump
+
+        speeds: list of speeds in Hz, one for each station"""
+        for s, N in zip(self.stations, speeds):
+            s.pump.current_speed = N
+
+    def required_head(self, Q, suction_head=0.0):
+        """Return the total pump head (m of water) needed to deliver the flow Q (m3/sec)
+
+        suction_head: The head available at the pipeline entrance (m of water)"""
+        return self.pipeline.calc_system_head(Q)[0] - suction_head
+
+    def pressure_profile(self, Q, suction_head=0.0):
+        """Calculate the pressures along the pipeline at the current pump speeds
+
+        Q is the flow in m3/sec
+        suction_head: The head available at the pipeline entrance (m of water)
+
+        returns a dict with:
+            'stations': A list of dicts, one per station, with the 'chainage' (m),
+                        'suction' and 'discharge' pressures and pump 'head' (m of water),
+                        'power' (kW), and 'speed' (Hz)
+            'chainage', 'pressure': lists of the pressure (m of water) at the section
+                        boundaries and at the suction and discharge of each station
+            'delivery': The pressure left at the end of the pipeline (m of water), this
+                        is negative if the pumps cannot deliver the flow"""
+        pipeline = self.pipeline
+        heads = pipeline.section_heads(Q)
+        end = pipeline.length
+        points = sorted(set(pipeline.chainages + [s.chainage for s in self.stations] + [end]))
+        used = dict(zip(points, pipeline.head_profile(Q, points, heads)))
+        Hv = pipeline.pipesections[-1].velocity(Q) ** 2 / (2 * gravity)
+
+        stations = []
+        chainage = []
+        pressure = []
+        base = suction_head
+        s_iter = iter(self.stations)
+        station = next(s_iter, None)
+        for x in points:
+            while station is not None and station.chainage <= x:
+                suction = base - used[station.chainage]
+                Qp, H, P, N = station.pump.point(Q, rhom=pipeline.slurry.rhom)
+                stations.append({'chainage': station.chainage, 'suction': suction, 'discharge': suction + H,
+                                 'head': H, 'power': P, 'speed': N})
+                chainage += [station.chainage, station.chainage]
+                pressure += [suction, suction + H]
+                base += H
+                station = next(s_iter, None)
+            if not chainage or x > chainage[-1]:
+                chainage.append(x)
+                pressure.append(base - used[x])
+        delivery = base - used[end] - Hv * pipeline.slurry.rhom
+        return {'stations': stations, 'chainage': chainage, 'pressure': pressure, 'delivery': delivery}
+
+    def speed_tables(self, Q, speed_points=11, min_speed_ratio=0.5):
+        """Calculate the head and power of each pump over a range of speeds
+
+        Q is the flow in m3/sec
+        speed_points: The number of speeds to try for each pump
+        min_speed_ratio: The lowest speed to try, as a fraction of the design speed
+
+        returns a list (one per pump) of lists of (H, P, set speed, actual speed) sorted by H.
+        Speeds where the flow is off the pump curve are left out"""
+        tables = []
+        rhom = self.pipeline.slurry.rhom
+        for pump in self.pumps:
+            table = []
+            old_speed = pump.current_speed
+            for i in range(speed_points):
+                frac = min_speed_ratio + (1 - min_speed_ratio) * i / max(speed_points - 1, 1)
+                pump.current_speed = frac * pump.design_speed
+                try:
+                    Qp, H, P, N = pump.point(Q, rhom=rhom)
+                except IndexError:
+                    continue
+                table.append((H, P, pump.current_speed, N))
+            pump.current_speed = old_speed
+            table.sort()
+            tables.append(table)
+        return tables
+
+    def optimize_speeds(self, Q, suction_head=0.0, min_suction=None, max_discharge=None,
+                        speed_points=11, min_speed_ratio=0.5, workers=None):
+        """Find the pump speeds that deliver the flow Q with the least total power
+
+        Each pump's head and power are tabulated once over its speed range, then all the
+        combinations of speeds are checked against the required head and pressure limits.
+        Q is the flow in m3/sec
+        suction_head: The head available at the pipeline entrance (m of water)
+        min_suction: The lowest allowed suction pressure at any station (m of water)
+        max_discharge: The highest allowed discharge pressure at any station (m of water)
+        speed_points: The number of speeds to try for each pump
+        min_speed_ratio: The lowest speed to try, as a fraction of the design speed
+        workers: The number of processes to split the search over, None to run in this process
+
+        returns a dict with the set 'speeds' and 'actual_speeds' after any power limits (Hz),
+        the total 'power' (kW) and total 'head' (m of water), or None if no combination of speeds delivers the flow"""
+        if not self.stations:
+            return None
+        tables = self.speed_tables(Q, speed_points, min_speed_ratio)
+        if not all(tables):
+            return None
+        used = self.pipeline.head_profile(Q, [s.chainage for s in self.stations])
+        suctions = [u - suction_head for u in used]
+        Hreq = self.required_head(Q, suction_head)
+        if len(tables) == 1:
+            tables = tables + [[(0.0, 0.0, None, None)]]
+            suctions = suctions + [suctions[-1]]
+            single = True
+        else:
+            single = False
+        args = (tables, suctions, Hreq, min_suction, max_discharge)
+        firsts = range(len(tables[0]))
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_search_speeds, firsts, *[[a] * len(firsts) for a in args]))
+        else:
+            results = [_search_speeds(first, *args) for first in firsts]
+        results = [r for r in results if r is not None]
+        if not results:
+            return None
+        power, combo = min(results, key=lambda r: r[0])
+        if single:
+            combo = combo[:1]
+        picks = [tables[i][j] for i, j in enumerate(combo)]
+        return {'speeds': [p[2] for p in picks],
+                'actual_speeds': [p[3] for p in picks],
+                'power': power,
+                'head': sum(p[0] for p in picks),
+                }
+
+
+def plan_stations(pipeline, pumps, Q, min_suction, max_discharge, suction_head=0.0, delivery_head=0.0,
+                  step=50.0, objective='count', max_stations=20, placement='late'):
+    """Plan the booster stations needed to deliver the flow Q through the pipeline
+
+    The pipeline is divided into candidate positions every step meters, and the head used
+    to reach each position is calculated once from the pipeline's section curves.
+    The pressure at any point is the suction head plus the heads of the pumps upstream, less
+    the head used to get there, so the stations are found by a shortest path search over
+    the sequence of pumps, where each label keeps the earliest chainage the last station can
+    be placed.
+    pipeline: The Pipeline
+    pumps: A list of Pump objects that can be used for a station, at their current speed
+    Q: The flow in m3/sec
+    min_suction: The lowest allowed pressure in the line, usually the pump vacuum limit (m of water)
+    max_discharge: The highest allowed pressure in the line, the pipe rating (m of water)
+    suction_head: The head available at the pipeline entrance (m of water)
+    delivery_head: The head required at the end of the pipeline (m of water)
+    step: The spacing of the candidate positions (m)
+    objective: 'count' to use the fewest stations (then least power), 'power' for the least
+               total power (then fewest stations)
+    max_stations: The most stations to try
+    placement: 'late' places each station as far down the line as the suction allows,
+               'early' as close to the previous station as the discharge limit allows
+
+    returns a dict with the 'stations' (a list of Station objects, the first at the
+    entrance), the station 'count', the total 'power' (kW) and 'head' (m of water),
+    or None if the flow cannot be delivered"""
+    end = pipeline.length
+    n = int(ceil(end / step))
+    positions = [min(i * step, end) for i in range(n + 1)]
+    used = pipeline.head_profile(Q, positions)
+    used[-1] += pipeline.pipesections[-1].velocity(Q) ** 2 / (2 * gravity) * pipeline.slurry.rhom
+    umax = list(itertools.accumulate(used, max))                   # The most head used to reach a point
+    umin = list(itertools.accumulate(reversed(used), min))[::-1]   # The least head used from a point on
+
+    duty = []
+    for pump in pumps:
+        try:
+            Qp, H, P, N = pump.point(Q, rhom=pipeline.slurry.rhom)
+        except IndexError:
+            H = None
+        duty.append((H, P) if H and H > 0 else None)
+
+    def cost(count, power):
+        return (count, power) if objective == 'count' else (power, count)
+
+    def reach(head):
+        """The last position the pressure stays above min_suction"""
+        return bisect.bisect_right(umax, head - min_suction) - 1
+
+    # A label is (cost, index of last station, head, power, pumps, station indices)
+    labels = []
+    if suction_head - used[0] >= min_suction:
+        for k, d in enumerate(duty):
+            if d is not None and umin[0] >= suction_head + d[0] - max_discharge:
+                heapq.heappush(labels, (cost(1, d[1]), 0, suction_head + d[0], d[1], (k,), (0,)))
+    seen = set()
+    while labels:
+        c, last, head, power, seq, idx = heapq.heappop(labels)
+        key = tuple(sorted(seq))
+        if key in seen:
+            continue
+        seen.add(key)
+        furthest = reach(head)
+        if furthest == n and head - used[n] >= delivery_head:
+            break
+        if len(seq) >= max_stations:
+            continue
+        for k, d in enumerate(duty):
+            if d is None:
+                continue
+            new_head = head + d[0]
+            j = max(bisect.bisect_left(umin, new_head - max_discharge), last + 1)
+            if j <= min(furthest, n - 1):
+                heapq.heappush(labels, (cost(len(seq) + 1, power + d[1]), j, new_head, power + d[1],
+                                        seq + (k,), idx + (j,)))
+    else:
+        return None
+
+    idx = list(idx)
+    if placement == 'late':
+        heads = list(itertools.accumulate([suction_head] + [duty[k][0] for k in seq]))
+        for i in range(len(idx) - 1, 0, -1):
+            latest = reach(heads[i])
+            if i < len(idx) - 1:
+                latest = min(latest, idx[i + 1] - 1)
+            idx[i] = max(idx[i], min(latest, n - 1))
+    stations = []
+    for k, i in zip(seq, idx):
+        stations.append(Station(copy(pumps[k]), positions[i]))
+    return {'stations': stations,
+            'count': len(stations),
+            'power': power,
+            'head': head - suction_head,
+            }
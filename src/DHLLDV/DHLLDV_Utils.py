@@ -7,6 +7,8 @@ Created on Oct 23, 2014
 '''
 import bisect
 
+from DHLLDV import telemetry
+
 class interpDict(dict):
     """
     interpDict: Dict of two-tuples that will interpolate values not found in the dict.
@@ -35,4 +37,109 @@ class interpDict(dict):
         return val
 
     def __setitem__(self, key, val):
-        raise KeyError("interpDict is read-only")
\ No newline at end of file
+        raise KeyError("interpDict is read-only")
+
+
+def find_root(f, a, b, xtol=1e-9, max_steps=100):
+    """Find a root of f between a and b using the Illinois (modified regula falsi) method.
+
+    f(a) and f(b) must have opposite signs (or one of them be zero).
+    xtol: The absolute tolerance on x
+    max_steps: The maximum number of steps
+
+    returns x"""
+    fa = f(a)
+    fb = f(b)
+    if fa == 0:
+        return a
+    if fb == 0:
+        return b
+    if (fa > 0) == (fb > 0):
+        raise ValueError(f"find_root: f({a})={fa} and f({b})={fb} have the same sign")
+    side = 0
+    x = b
+    fx = fb
+    for step in range(max_steps):
+        x = (a * fb - b * fa) / (fb - fa)
+        if not min(a, b) < x < max(a, b):
+            x = (a + b) / 2
+        fx = f(x)
+        if fx == 0 or abs(b - a) < xtol:
+            if telemetry.enabled:
+                telemetry.record('DHLLDV_Utils.find_root', step + 1, fx, True)
+            return x
+        if (fx > 0) == (fb > 0):
+            b, fb = x, fx
+            if side == -1:
+                fa /= 2
+            side = -1
+        else:
+            a, fa = x, fx
+            if side == 1:
+                fb /= 2
+            side = 1
+    if telemetry.enabled:
+        telemetry.record('DHLLDV_Utils.find_root', max_steps, fx, False, (a, b))
+    return x
+
+
+def find_minimum(f, a, b, xtol=1e-6, max_steps=100):
+    """Find a minimum of f between a and b using Brent's method (golden section with parabolic steps).
+
+    f should have one minimum between a and b, it need not be smooth.
+    xtol: The absolute tolerance on x
+    max_steps: The maximum number of steps
+
+    returns (x, f(x))"""
+    golden = 0.3819660112501051     # (3 - sqrt(5)) / 2
+    if a > b:
+        a, b = b, a
+    x = w = v = a + golden * (b - a)
+    fx = fw = fv = f(x)
+    d = e = 0.0
+    for step in range(max_steps):
+        m = (a + b) / 2
+        tol = xtol / 2 + 1e-10 * abs(x)
+        if abs(x - m) <= 2 * tol - (b - a) / 2:
+            if telemetry.enabled:
+                telemetry.record('DHLLDV_Utils.find_minimum', step, b - a, True)
+            return x, fx
+        parabolic = False
+        if abs(e) > tol:
+            # Fit a parabola through x, w and v
+            r = (x - w) * (fx - fv)
+            q = (x - v) * (fx - fw)
+            p = (x - v) * q - (x - w) * r
+            q = 2 * (q - r)
+            if q > 0:
+                p = -p
+            q = abs(q)
+            if abs(p) < abs(q * e / 2) and q * (a - x) < p < q * (b - x):
+                e = d
+                d = p / q
+                parabolic = True
+                if (x + d) - a < 2 * tol or b - (x + d) < 2 * tol:
+                    d = tol if m > x else -tol
+        if not parabolic:
+            e = (b if x < m else a) - x
+            d = golden * e
+        u = x + (d if abs(d) >= tol else (tol if d > 0 else -tol))
+        fu = f(u)
+        if fu <= fx:
+            if u < x:
+                b = x
+            else:
+                a = x
+            v, fv, w, fw, x, fx = w, fw, x, fx, u, fu
+        else:
+            if u < x:
+                a = u
+            else:
+                b = u
+            if fu <= fw or w == x:
+                v, fv, w, fw = w, fw, u, fu
+            elif fu <= fv or v == x or v == w:
+                v, fv = u, fu
+    if telemetry.enabled:
+        telemetry.record('DHLLDV_Utils.find_minimum', max_steps, b - a, False, (a, b))
+    return x, fx
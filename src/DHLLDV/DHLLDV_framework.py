@@ -7,7 +7,9 @@ Created on Mar 3, 2015
 from . import stratified
 from . import heterogeneous
 from . import homogeneous
+from . import telemetry
 from .DHLLDV_constants import gravity, particle_ratio, stk_fine
+from contextlib import contextmanager
 from math import pi, exp, log10
 
 alpha_xi = 0.5    # alpha in Eqn 8.12-9
@@ -55,7 +57,7 @@ def Cvs_Erhg(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, get_dict=False):
         return Erhg_obj[Erhg_obj['regime']]
 
 
-def Cvs_regime(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs):
+def Cvs_regime(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, cached=False):
     """
     Return the name of the regime for the given slurry and velocity
     vls = average line speed (velocity, m/sec)
@@ -66,7 +68,11 @@ def Cvs_regime(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs):
     rhol = density of the fluid (ton/m3)
     rhos = particle density (ton/m3)
     Cvs = insitu volume concentration
+    cached: if true compare vls with the cached regime boundaries, see regimes.boundaries
     """
+    if cached:
+        from .regimes import regime
+        return regime(vls, Dp, d, epsilon, nu, rhol, rhos, Cvs, 'Cvs')
     Erhg_obj = Cvs_Erhg(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, get_dict=True)
     return {'FB': 'fixed bed',
             'SB': 'sliding bed',
@@ -75,7 +81,34 @@ def Cvs_regime(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs):
             }[Erhg_obj['regime']]
 
 
-def LDV(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, max_steps=10):
+LDV_table = None    # A surrogate.LDVTable for LDV to use, see use_LDV_table
+
+
+def use_LDV_table(table):
+    """Have LDV use a table (a surrogate.LDVTable, or the path of one) instead of iterating
+
+    The table is used for the slurries with its fluid, solids and pipe roughness, inside
+    its range. Pass None to go back to the exact LDV. Returns the table."""
+    global LDV_table
+    if isinstance(table, str):
+        from .surrogate import LDVTable
+        table = LDVTable.open(table)
+    LDV_table = table
+    return table
+
+
+@contextmanager
+def exact_LDV():
+    """A context in which LDV does not use the LDV_table, e.g. to build or check another table"""
+    global LDV_table
+    table, LDV_table = LDV_table, None
+    try:
+        yield
+    finally:
+        LDV_table = table
+
+
+def LDV(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, max_steps=10, exact=False):
     """
     Return the LDV for the given slurry.
     vls: not used, included for consistency sake
@@ -86,7 +119,12 @@ def LDV(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, max_steps=10):
     rhol = density of the fluid (ton/m3)
     rhos = particle density (ton/m3)
     Cvs = insitu volume concentration
+    exact: If true, do not use the LDV_table
     """
+    if LDV_table is not None and not exact:
+        vlsldv = LDV_table.lookup(Dp, d, epsilon, nu, rhol, rhos, Cvs)
+        if vlsldv is not None:
+            return vlsldv
     Rsd = (rhos-rhol)/rhol
     fbot = (2*gravity*Rsd*Dp)**0.5
 
@@ -104,6 +142,9 @@ def LDV(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, max_steps=10):
         FL_vs = 1.4*(nu*Rsd*gravity)**(1./3.)*(8/lambdal)**0.5/fbot  # Eqn 8.11-1
         vlsldv = FL_vs*fbot
         steps += 1
+    if telemetry.enabled:
+        telemetry.record('DHLLDV_framework.LDV:very small', steps, vls/vlsldv - 1,
+                         1.00001 >= vls/vlsldv > 0.99999, (Dp, d, epsilon, nu, rhol, rhos, Cvs))
 
     # Small Particles
     vls = 4.0
@@ -126,6 +167,9 @@ def LDV(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, max_steps=10):
         FL_ss = alphap * (vt*Cvs*(1-Cvs/KC)**beta/(lambdal*fbot))**(1./3)  # Eqn 8.11-3
         vlsldv = FL_ss*fbot
         steps += 1
+    if telemetry.enabled:
+        telemetry.record('DHLLDV_framework.LDV:small', steps, vls/vlsldv - 1,
+                         1.00001 >= vls/vlsldv > 0.99999, (Dp, d, epsilon, nu, rhol, rhos, Cvs))
 
     FL_s = max(FL_vs, FL_ss)    # Eqn 8.11-4
 
@@ -149,6 +193,9 @@ def LDV(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, max_steps=10):
                        (stratified.musf*stratified.Cvb*pi/8)**0.5 * Cvr_ldv**0.5/lambdal)**(1./3)  # Eqn 8.11-6
         vlsldv = FL_r*fbot
         steps += 1
+    if telemetry.enabled:
+        telemetry.record('DHLLDV_framework.LDV:large', steps, vls/vlsldv - 1,
+                         1.00001 >= vls/vlsldv > 0.99999, (Dp, d, epsilon, nu, rhol, rhos, Cvs))
 
     # The Upper limit
     d0 = 0.0005*(1.65/Rsd)**0.5  # Eqn 8.11-8
@@ -177,6 +224,9 @@ def LDV(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvs, max_steps=10):
         C = ((8.5**2/lambdal)*(vt/(gravity*d)**0.5)**(10./3)*(nu*gravity)**(2./3))/stratified.musf
         vlsldv = (-1*B - (B**2-4*A*C)**0.5)/(2*A)   # Eqn 8.11-11
         steps += 1
+    if telemetry.enabled:
+        telemetry.record('DHLLDV_framework.LDV:lower limit', steps, vls/vlsldv - 1,
+                         1.00001 >= vls/vlsldv > 0.99999, (Dp, d, epsilon, nu, rhol, rhos, Cvs))
     FL_ll = vlsldv/fbot  # Eqn 8.11-12
 
     FL = max(FL_ul, FL_ll)  # Eqn 8.11-13
@@ -293,7 +343,7 @@ def Cvt_Erhg(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvt, get_dict=False):
         return Erhg_obj[Erhg_obj['regime']]
 
 
-def Cvt_regime(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvt):
+def Cvt_regime(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvt, cached=False):
     """
     Return the name of the regime for the given slurry and velocity in the Cvt case
     vls = average line speed (velocity, m/sec)
@@ -304,7 +354,11 @@ def Cvt_regime(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvt):
     rhol = density of the fluid (ton/m3)
     rhos = particle density (ton/m3)
     Cvs = insitu volume concentration
+    cached: if true compare vls with the cached regime boundaries, see regimes.boundaries
     """
+    if cached:
+        from .regimes import regime
+        return regime(vls, Dp, d, epsilon, nu, rhol, rhos, Cvt, 'Cvt')
     Erhg_obj = Cvt_Erhg(vls, Dp,  d, epsilon, nu, rhol, rhos, Cvt, get_dict=True)
     return {'FB': 'fixed bed',
             'SB': 'sliding bed',
@@ -0,0 +1,167 @@
+"""
+HeadLossModels - A registry of head loss models with one calling convention, and a
+comparison of several models over the same velocities
+
+Each model is a function model(spec, vls_list, shared) returning a list of Erhg, one per
+velocity, where spec is a SlurrySpec and shared is the dict from shared_terms with the
+pieces that do not depend on the model (fluid head loss, fractioned GSD). Register new
+models with the register decorator:
+
+    @register('My model')
+    def my_model(spec, vls_list, shared):
+        return [...]
+"""
+from dataclasses import dataclass, field
+
+from DHLLDV import DHLLDV_constants
+from DHLLDV import DHLLDV_framework
+from DHLLDV import homogeneous
+
+_models = {}
+
+
+@dataclass
+class SlurrySpec():
+    """The pipe, fluid and solids for a head loss calculation"""
+    Dp: float = 0.762                                   # Pipe diameter (m)
+    d50: float = 1.0 / 1000                             # Median particle diameter (m)
+    d85: float = None                                   # Default d50 * 2.72, as Slurry
+    d15: float = None                                   # Default d50 / 2.0, as Slurry
+    epsilon: float = DHLLDV_constants.steel_roughness   # Absolute pipe roughness (m)
+    nu: float = 1.0508e-6                               # Fluid kinematic viscosity (m2/sec)
+    rhol: float = 1.0248103                             # Fluid density (ton/m3)
+    rhos: float = 2.65                                  # Particle density (ton/m3)
+    Cv: float = 0.175                                   # Volume concentration
+    musf: float = DHLLDV_constants.musf                 # Coefficient of sliding friction
+    GSD: dict = field(default=None, repr=False)         # Fractioned GSD, default from d15, d50, d85
+
+    def __post_init__(self):
+        if self.d85 is None:
+            self.d85 = self.d50 * 2.72
+        if self.d15 is None:
+            self.d15 = self.d50 / 2.0
+
+    @classmethod
+    def from_slurry(cls, slurry):
+        """Return the SlurrySpec for a Slurry object"""
+        return cls(Dp=slurry.Dp, d50=slurry.get_dx(0.5), d85=slurry.get_dx(0.85), d15=slurry.get_dx(0.15),
+                   epsilon=slurry.epsilon, nu=slurry.nu, rhol=slurry.rhol, rhos=slurry.rhos, Cv=slurry.Cv,
+                   GSD=slurry.GSD)
+
+    def to_slurry(self, Dp=None, vls_max=10.0):
+        """Return a Slurry object for the spec in a pipe of diameter Dp (default self.Dp),
+        with curves from 0.1 m/sec to at least vls_max (m/sec)"""
+        from DHLLDV.SlurryObj import Slurry
+        Dp = self.Dp if Dp is None else Dp
+        GSD = self.GSD
+        if GSD is None:
+            GSD = DHLLDV_framework.create_fracs({0.15: self.d15, 0.5: self.d50, 0.85: self.d85},
+                                                Dp, self.nu, self.rhol, self.rhos)
+        return Slurry(Dp=Dp, D50=self.d50, Cv=self.Cv, max_index=max(100, int(vls_max * 10) + 1),
+                      epsilon=self.epsilon, nu=self.nu, rhol=self.rhol, rhos=self.rhos, GSD=GSD)
+
+    @property
+    def Rsd(self):
+        return (self.rhos - self.rhol) / self.rhol
+
+
+def register(name):
+    """Decorator to add a model function to the registry under name"""
+    def decorator(model):
+        _models[name] = model
+        return model
+    return decorator
+
+
+def models():
+    """Return the names of the registered models"""
+    return list(_models)
+
+
+def shared_terms(spec, vls_list):
+    """Return the dict of the model independent terms for the spec and velocities
+
+    'il': The fluid head loss at each velocity (m.w.c per m)
+    'GSD': The fractioned GSD for the graded models"""
+    GSD = spec.GSD
+    if GSD is None:
+        GSD = DHLLDV_framework.create_fracs({0.15: spec.d15, 0.50: spec.d50, 0.85: spec.d85},
+                                            spec.Dp, spec.nu, spec.rhol, spec.rhos)
+    return {'il': [homogeneous.fluid_head_loss(vls, spec.Dp, spec.epsilon, spec.nu, spec.rhol) for vls in vls_list],
+            'GSD': GSD,
+            }
+
+
+def evaluate(name, spec, vls_list, shared=None):
+    """Evaluate the model name for the spec at the velocities in vls_list (m/sec)
+
+    shared: The dict from shared_terms, if already calculated
+    returns a dict with the lists 'Erhg' and 'im' (m.w.c per m)"""
+    if name not in _models:
+        raise KeyError(f"HeadLossModels: No model named {name}, the models are {models()}")
+    if shared is None:
+        shared = shared_terms(spec, vls_list)
+    Erhgs = _models[name](spec, vls_list, shared)
+    RsdCv = spec.Rsd * spec.Cv
+    return {'Erhg': Erhgs,
+            'im': [E * RsdCv + il for E, il in zip(Erhgs, shared['il'])],
+            }
+
+
+def compare(spec, vls_list, names=None):
+    """Evaluate several models for the spec at the velocities in vls_list (m/sec)
+
+    names: The models to compare, default all the registered models
+    returns a dict with the 'vls' and fluid 'il' lists, and a dict for each model as from evaluate"""
+    shared = shared_terms(spec, vls_list)
+    result = {'vls': list(vls_list), 'il': shared['il']}
+    for name in names or models():
+        result[name] = evaluate(name, spec, vls_list, shared)
+    return result
+
+
+@register('DHLLDV Cvs')
+def _dhlldv_cvs(spec, vls_list, shared):
+    return [DHLLDV_framework.Cvs_Erhg(vls, spec.Dp, spec.d50, spec.epsilon, spec.nu, spec.rhol, spec.rhos, spec.Cv)
+            for vls in vls_list]
+
+
+@register('DHLLDV Cvt')
+def _dhlldv_cvt(spec, vls_list, shared):
+    return [DHLLDV_framework.Cvt_Erhg(vls, spec.Dp, spec.d50, spec.epsilon, spec.nu, spec.rhol, spec.rhos, spec.Cv)
+            for vls in vls_list]
+
+
+@register('DHLLDV graded Cvs')
+def _dhlldv_graded_cvs(spec, vls_list, shared):
+    return [DHLLDV_framework.Erhg_graded(shared['GSD'], vls, spec.Dp, spec.epsilon, spec.nu, spec.rhol, spec.rhos,
+                                         spec.Cv, Cvt_eq_Cvs=False, num_fracs=None)
+            for vls in vls_list]
+
+
+@register('DHLLDV graded Cvt')
+def _dhlldv_graded_cvt(spec, vls_list, shared):
+    return [DHLLDV_framework.Erhg_graded(shared['GSD'], vls, spec.Dp, spec.epsilon, spec.nu, spec.rhol, spec.rhos,
+                                         spec.Cv, Cvt_eq_Cvs=True, num_fracs=None)
+            for vls in vls_list]
+
+
+@register('Wilson V50')
+def _wilson_v50(spec, vls_list, shared):
+    from Wilson import Wilson_V50
+    return Wilson_V50.Erhg_list(vls_list, spec.Dp, spec.d50, spec.d85, spec.epsilon, spec.nu, spec.rhol,
+                                spec.rhos, spec.musf)
+
+
+@register('Wilson stratified')
+def _wilson_stratified(spec, vls_list, shared):
+    from Wilson import Wilson_Stratified
+    return Wilson_Stratified.Erhg_list(vls_list, spec.Dp, spec.d50, spec.epsilon, spec.nu, spec.rhol,
+                                       spec.rhos, spec.musf, spec.Cv)
+
+
+@register('Wilson stratified d85')
+def _wilson_stratified_d85(spec, vls_list, shared):
+    from Wilson import Wilson_Stratified
+    return Wilson_Stratified.Erhg_list(vls_list, spec.Dp, spec.d85, spec.epsilon, spec.nu, spec.rhol,
+                                       spec.rhos, spec.musf, spec.Cv)
@@ -73,28 +73,79 @@ class Pipeline():
                 self.slurries[p.diameter].Dp = p.diameter
                 self.slurries[p.diameter].generate_curves()
 
-    def calc_system_head(self, Q):
-        """Calculate the system head for a pipeline
+    @property
+    def chainages(self):
+        """The chainage (m) at the start of each pipe section"""
+        chainage = 0.0
+        chainages = []
+        for p in self.pipesections:
+            chainages.append(chainage)
+            chainage += p.length
+        return chainages
 
-        Q is the flow in m3/sec
+    @property
+    def length(self):
+        """The total length (m) of the pipeline"""
+        return sum(p.length for p in self.pipesections)
 
-        returns a tuple, im, il"""
-        rhom = self.slurry.rhom
+    def section_heads(self, Q):
+        """Calculate the head used by each pipe section
 
-        delta_z = -1 * self.pipesections[0].elev_change
-        Hfit = 0
-        Hfric_m = 0
-        Hfric_l = 0
-        for p in self.pipesections:
+        Q is the flow in m3/sec
+
+        returns a list of tuples (Hfric_m, Hfric_l, Hminor), one per section:
+            Hfric_m: The slurry friction head in m of water
+            Hfric_l: The water friction head in m of water
+            Hminor: The fitting and elevation head in m of fluid, multiply by the density.
+                    The elevation change of the first section is not included."""
+        heads = []
+        for i, p in enumerate(self.pipesections):
             v = p.velocity(Q)
             Hv = v ** 2 / (2 * gravity)
-            Hfit += p.total_K*Hv
-            delta_z += p.elev_change
             index = bisect.bisect_left(self.slurries[p.diameter].vls_list, v)
             im = self.slurries[p.diameter].im_curves['graded_Cvt_im'][index]
-            Hfric_m += im * p.length
-            index = bisect.bisect_left(self.slurries[p.diameter].vls_list, v)
             il = self.slurries[p.diameter].im_curves['il'][index]
-            Hfric_l += il * p.length
-        return (Hfric_m + (Hfit + delta_z + Hv) * self.slurry.rhom,
-                Hfric_l + (Hfit + delta_z + Hv) * self.slurry.rhol)
\ No newline at end of file
+            delta_z = p.elev_change if i > 0 else 0.0
+            heads.append((im * p.length, il * p.length, p.total_K * Hv + delta_z))
+        return heads
+
+    def head_profile(self, Q, chainages, heads=None):
+        """Calculate the slurry head used from the start of the pipeline to each chainage
+
+        The friction and elevation heads are spread over the length of each section, zero
+        length sections (like the entrance) are counted at their start. The velocity head
+        at the discharge is not included.
+        Q is the flow in m3/sec
+        chainages is a list of chainages in m
+        heads is the result of section_heads(Q), if already calculated
+
+        returns a list of heads in m of water"""
+        if heads is None:
+            heads = self.section_heads(Q)
+        rhom = self.slurry.rhom
+        starts = self.chainages
+        profile = []
+        for x in chainages:
+            H = 0.0
+            for start, p, (Hfric_m, Hfric_l, Hminor) in zip(starts, self.pipesections, heads):
+                if x < start:
+                    break
+                if p.length > 0:
+                    frac = min((x - start) / p.length, 1.0)
+                else:
+                    frac = 1.0
+                H += frac * (Hfric_m + Hminor * rhom)
+            profile.append(H)
+        return profile
+
+    def calc_system_head(self, Q):
+        """Calculate the system head for a pipeline
+
+        Q is the flow in m3/sec
+
+        returns a tuple, im, il"""
+        heads = self.section_heads(Q)
+        Hv = self.pipesections[-1].velocity(Q) ** 2 / (2 * gravity)
+        Hminor = sum(h[2] for h in heads) + Hv
+        return (sum(h[0] for h in heads) + Hminor * self.slurry.rhom,
+                sum(h[1] for h in heads) + Hminor * self.slurry.rhol)
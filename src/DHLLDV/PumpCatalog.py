@@ -0,0 +1,214 @@
+"""
+PumpCatalog: A library of pump curves that can be searched for the best pump for a duty point
+
+The curves are loaded from JSON or CSV files. A JSON file holds a list of pumps (or a dict
+with the list under 'pumps'), each like:
+    {"name": "10x12 dredge pump", "design_speed": 6.0, "design_impeller": 1.0,
+     "suction_dia": 0.305, "disch_dia": 0.254, "avail_power": 600, "limited": "torque",
+     "Q": [0.1, 0.2, ...], "H": [45.0, 44.1, ...], "P": [150.0, 190.0, ...]}
+A CSV file has one row per curve point, with the columns:
+    name, design_speed, design_impeller, suction_dia, disch_dia, avail_power, Q, H, P
+and optionally limited. Rows with the same name, impeller and speed form one curve set.
+Flows are in m3/sec, heads in m of water, power in kW and speeds in Hz.
+"""
+import bisect
+import csv
+import json
+import os
+
+from DHLLDV.DHLLDV_constants import gravity
+from DHLLDV.DHLLDV_Utils import interpDict
+from DHLLDV.PumpObj import Pump
+
+
+def _interp(xs, ys, x):
+    """Linear interpolation in the sorted list xs, like interpDict without re-sorting the keys"""
+    index = bisect.bisect_left(xs, x)
+    if index < len(xs) and xs[index] == x:
+        return ys[index]
+    if index == 0 or index == len(xs):
+        raise IndexError("key out of range")
+    x1 = xs[index - 1]
+    x2 = xs[index]
+    return ys[index - 1] + (ys[index] - ys[index - 1]) * (x - x1) / (x2 - x1)
+
+
+class PumpCatalog():
+    """A set of pump curves indexed by their flow range"""
+    def __init__(self, entries=None):
+        """entries: A list of dicts in the JSON format"""
+        self.entries = []
+        self.Q = []         # Sorted design flows for each entry
+        self.H = []
+        self.P = []
+        self.Qmax = []      # Maximum design flow of each entry
+        self.Hmax = []      # Maximum design head of each entry
+        self._by_Qmax = []  # Indices of the entries, sorted by Qmax
+        self._Qmax_sorted = []
+        for e in entries or []:
+            self.add(e)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        """Add a pump to the catalog
+
+        entry: A dict in the JSON format"""
+        points = sorted(zip(entry['Q'], entry['H'], entry['P']))
+        if len(points) < 2:
+            raise ValueError(f"Pump {entry.get('name')} needs at least two curve points")
+        entry = dict(entry)
+        entry['Q'], entry['H'], entry['P'] = (list(c) for c in zip(*points))
+        i = len(self.entries)
+        self.entries.append(entry)
+        self.Q.append(entry['Q'])
+        self.H.append(entry['H'])
+        self.P.append(entry['P'])
+        self.Qmax.append(entry['Q'][-1])
+        self.Hmax.append(max(entry['H']))
+        index = bisect.bisect(self._Qmax_sorted, self.Qmax[i])
+        self._Qmax_sorted.insert(index, self.Qmax[i])
+        self._by_Qmax.insert(index, i)
+
+    def load(self, path):
+        """Load the pumps from a JSON or CSV file, or all such files in a directory
+
+        returns the number of pumps loaded"""
+        if os.path.isdir(path):
+            return sum(self.load(os.path.join(path, f)) for f in sorted(os.listdir(path))
+                       if os.path.splitext(f)[1].lower() in ('.json', '.csv'))
+        if os.path.splitext(path)[1].lower() == '.json':
+            with open(path) as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                data = data.get('pumps', [data])
+        else:
+            data = self._read_csv(path)
+        for e in data:
+            self.add(e)
+        return len(data)
+
+    @staticmethod
+    def _read_csv(path):
+        """Read a CSV file of curve points into a list of entries"""
+        curves = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                key = (row['name'], row['design_impeller'], row['design_speed'])
+                if key not in curves:
+                    curves[key] = {'name': row['name'],
+                                   'design_speed': float(row['design_speed']),
+                                   'design_impeller': float(row['design_impeller']),
+                                   'suction_dia': float(row['suction_dia']),
+                                   'disch_dia': float(row['disch_dia']),
+                                   'avail_power': float(row['avail_power']),
+                                   'limited': row.get('limited') or 'torque',
+                                   'Q': [], 'H': [], 'P': []}
+                for c in 'QHP':
+                    curves[key][c].append(float(row[c]))
+        return list(curves.values())
+
+    def pump(self, i, slurry=None):
+        """Return a Pump object for entry i
+
+        slurry: The Slurry for the pump, share one slurry between pumps as creating a
+                default Slurry for each pump is slow"""
+        e = self.entries[i]
+        return Pump(name=e['name'],
+                    design_speed=e['design_speed'],
+                    design_impeller=e['design_impeller'],
+                    suction_dia=e['suction_dia'],
+                    disch_dia=e['disch_dia'],
+                    design_QH_curve=interpDict(dict(zip(e['Q'], e['H']))),
+                    design_QP_curve=interpDict(dict(zip(e['Q'], e['P']))),
+                    avail_power=e['avail_power'],
+                    limited=e.get('limited', 'torque'),
+                    slurry=slurry)
+
+    def candidates(self, Q, head, rhom=1.0, max_speed_ratio=1.0):
+        """Return the indices of the pumps that might reach head at flow Q
+
+        This is the quick screen on the flow range and maximum head only.
+        Q: flow in m3/sec
+        head: The required head in m of water
+        rhom: The slurry density
+        max_speed_ratio: The highest speed allowed, as a fraction of the design speed"""
+        Q0 = Q / max_speed_ratio
+        start = bisect.bisect_left(self._Qmax_sorted, Q0)
+        H_factor = max_speed_ratio ** 2 * rhom
+        return [i for i in self._by_Qmax[start:]
+                if self.Q[i][0] <= Q0 and self.Hmax[i] * H_factor >= head]
+
+    def duty(self, i, Q, head, rhom=1.0, min_speed_ratio=0.5, max_speed_ratio=1.0):
+        """Find the speed at which pump i delivers head at flow Q
+
+        Q: flow in m3/sec
+        head: The required head in m of water
+        rhom: The slurry density
+        min_speed_ratio, max_speed_ratio: The allowed speed range, as a fraction of the design speed
+
+        returns a dict with the 'index', 'name', 'speed' (Hz), 'head' (m of water), 'power' (kW)
+        and 'efficiency', or None if the pump cannot meet the duty"""
+        Qs, Hs, Ps = self.Q[i], self.H[i], self.P[i]
+
+        def pump_head(r):
+            Q0 = Q / r
+            if not Qs[0] <= Q0 <= Qs[-1]:
+                return None
+            return _interp(Qs, Hs, Q0) * r ** 2 * rhom
+
+        H_hi = pump_head(max_speed_ratio)
+        if H_hi is None or H_hi < head:
+            return None
+        r_lo = min_speed_ratio
+        H_lo = pump_head(r_lo)
+        if H_lo is not None and H_lo >= head:
+            r = r_lo    # The pump has head to spare even at the lowest speed
+        else:
+            r_hi = max_speed_ratio
+            while r_hi - r_lo > 1e-6 * r_hi:    # The pump head increases with speed
+                r = (r_lo + r_hi) / 2
+                H = pump_head(r)
+                if H is not None and H >= head:
+                    r_hi = r
+                else:
+                    r_lo = r
+            r = r_hi
+        H0 = _interp(Qs, Hs, Q / r)
+        P0 = _interp(Qs, Ps, Q / r)
+        H = H0 * r ** 2 * rhom
+        P = P0 * r ** 3 * rhom
+        e = self.entries[i]
+        avail = e['avail_power']
+        if e.get('limited', 'torque').lower() == 'torque':
+            avail *= r
+        if e.get('limited', 'torque').lower() != 'none' and P > avail:
+            return None
+        return {'index': i,
+                'name': e['name'],
+                'speed': r * e['design_speed'],
+                'head': H,
+                'power': P,
+                'efficiency': gravity * Q * H / P,
+                }
+
+    def best_match(self, system_curve, Q, rhom=1.0, min_speed_ratio=0.5, max_speed_ratio=1.0, count=None):
+        """Find the pumps that meet the system curve at flow Q, best efficiency first
+
+        system_curve: The system head in m of water, or a function returning it for a flow,
+                      like lambda Q: pipeline.calc_system_head(Q)[0]
+        Q: flow in m3/sec
+        rhom: The slurry density
+        min_speed_ratio, max_speed_ratio: The allowed speed range, as a fraction of the design speed
+        count: The number of matches to return, None for all
+
+        returns a list of dicts, as returned by duty"""
+        head = system_curve(Q) if callable(system_curve) else system_curve
+        matches = []
+        for i in self.candidates(Q, head, rhom, max_speed_ratio):
+            match = self.duty(i, Q, head, rhom, min_speed_ratio, max_speed_ratio)
+            if match is not None:
+                matches.append(match)
+        matches.sort(key=lambda m: -m['efficiency'])
+        return matches[:count] if count else matches
@@ -3,12 +3,102 @@ PumpObj: Object to simulate a pump and driver
 
 Added by R. Ramsdell 03 September, 2021
 """
+import bisect
 from dataclasses import dataclass
 
 from DHLLDV.DHLLDV_constants import gravity
+from DHLLDV import telemetry
 from DHLLDV.DHLLDV_Utils import interpDict
 from DHLLDV.SlurryObj import Slurry
 
+
+class AffinitySurface():
+    """Head, power and efficiency of a pump tabulated over a flow x speed grid
+
+    The grid is built once from the design curves using the affinity laws, lookups are
+    bilinear. Values are for water (rhom = 1.0), multiply head and power by the rhom.
+    Grid points where the flow falls outside the design curves at that speed are left
+    as None, lookups that touch those points return None so the caller can fall back to
+    the exact calculation."""
+    def __init__(self, pump, flows, speeds):
+        """pump: The Pump object providing the design curves
+        flows: Sorted list of flows in m3/sec
+        speeds: Sorted list of speeds in Hz"""
+        self.flows = list(flows)
+        self.speeds = list(speeds)
+        design_flows = sorted(pump.design_QH_curve.keys())
+        Qmin = max(design_flows[0], min(pump.design_QP_curve.keys()))
+        Qmax = min(design_flows[-1], max(pump.design_QP_curve.keys()))
+        self.H = []
+        self.P = []
+        self.eta = []
+        for N in self.speeds:
+            speed_ratio = N / pump.design_speed
+            H_row = []
+            P_row = []
+            eta_row = []
+            for Q in self.flows:
+                Q0 = Q / speed_ratio
+                if Qmin <= Q0 <= Qmax:
+                    H = pump.design_QH_curve[Q0] * speed_ratio ** 2
+                    P = pump.design_QP_curve[Q0] * speed_ratio ** 3
+                    H_row.append(H)
+                    P_row.append(P)
+                    eta_row.append(gravity * Q * H / P)
+                else:
+                    H_row.append(None)
+                    P_row.append(None)
+                    eta_row.append(None)
+            self.H.append(H_row)
+            self.P.append(P_row)
+            self.eta.append(eta_row)
+
+    def _cell(self, Q, N):
+        """Return the indices and weights of the grid cell containing Q, N or None"""
+        if not (self.flows[0] <= Q <= self.flows[-1] and self.speeds[0] <= N <= self.speeds[-1]):
+            return None
+        j = min(max(bisect.bisect_right(self.flows, Q) - 1, 0), len(self.flows) - 2)
+        i = min(max(bisect.bisect_right(self.speeds, N) - 1, 0), len(self.speeds) - 2)
+        tq = (Q - self.flows[j]) / (self.flows[j + 1] - self.flows[j])
+        tn = (N - self.speeds[i]) / (self.speeds[i + 1] - self.speeds[i])
+        return i, j, tq, tn
+
+    @staticmethod
+    def _interp(grid, i, j, tq, tn):
+        """Bilinear interpolation in grid, None if any corner is off the curves"""
+        v00 = grid[i][j]
+        v01 = grid[i][j + 1]
+        v10 = grid[i + 1][j]
+        v11 = grid[i + 1][j + 1]
+        if v00 is None or v01 is None or v10 is None or v11 is None:
+            return None
+        return ((v00 * (1 - tq) + v01 * tq) * (1 - tn) +
+                (v10 * (1 - tq) + v11 * tq) * tn)
+
+    def lookup(self, Q, N):
+        """Return the (head, power, efficiency) at flow Q and speed N, or None if off the grid
+
+        Q: flow in m3/sec
+        N: Speed in Hz
+        Head in m and power in kW are for water"""
+        cell = self._cell(Q, N)
+        if cell is None:
+            return None
+        H = self._interp(self.H, *cell)
+        if H is None:
+            return None
+        return H, self._interp(self.P, *cell), self._interp(self.eta, *cell)
+
+    def lookup_many(self, flows, speeds):
+        """Return a list of (head, power, efficiency) tuples (or None) for each flow
+
+        flows: list of flows in m3/sec
+        speeds: list of speeds in Hz, or a single speed for all flows"""
+        if isinstance(speeds, (int, float)):
+            return [self.lookup(Q, speeds) for Q in flows]
+        return [self.lookup(Q, N) for Q, N in zip(flows, speeds)]
+
+
 @dataclass
 class Pump():
     """Model a pump and driver"""
@@ -27,10 +117,37 @@ class Pump():
         if self.slurry == None:
             self.slurry = Slurry()
         self._current_speed = self.design_speed
-
-    def efficiency(self, q):
-        """Return the efficiency of the pump based on the current speed"""
-        Q, H, P, N = self.point(q)
+        self.surface = None
+
+    def build_surface(self, flow_points=100, speed_points=50, min_speed=None, max_speed=None):
+        """Precompute the head, power and efficiency over a grid of flow and speed
+
+        Once built, point and efficiency use the grid, with the exact affinity calculation
+        as a fallback where the grid does not cover the point.
+        flow_points: Number of flows in the grid
+        speed_points: Number of speeds in the grid
+        min_speed, max_speed: The speed range in Hz, default 50% to 100% of design speed
+
+        returns the AffinitySurface"""
+        if min_speed is None:
+            min_speed = 0.5 * self.design_speed
+        if max_speed is None:
+            max_speed = self.design_speed
+        Qmax = max(self.design_QH_curve.keys()) * max_speed / self.design_speed
+        flows = [Qmax * i / (flow_points - 1) for i in range(flow_points)]
+        speeds = [min_speed + (max_speed - min_speed) * i / (speed_points - 1) for i in range(speed_points)]
+        self.surface = AffinitySurface(self, flows, speeds)
+        return self.surface
+
+    def efficiency(self, q, exact=False):
+        """Return the efficiency of the pump based on the current speed
+
+        exact: If true, don't use the precomputed surface"""
+        Q, H, P, N = self.point(q, exact=exact)
+        if self.surface is not None and not exact:
+            HPeta = self.surface.lookup(q, N)
+            if HPeta is not None:
+                return HPeta[2]
         return gravity * q * H / P
 
     @property
@@ -45,23 +162,34 @@ class Pump():
         N: New speed in Hz"""
         self._current_speed = N
 
-    def point(self, Q):
+    def _head_power(self, Q, N, exact=False):
+        """Return the head (m) and power (kW) on water at flow Q and speed N"""
+        if self.surface is not None and not exact:
+            HPeta = self.surface.lookup(Q, N)
+            if HPeta is not None:
+                return HPeta[0], HPeta[1]
+        speed_ratio = N / self.design_speed
+        Q0 = Q / speed_ratio
+        return (self.design_QH_curve[Q0] * speed_ratio ** 2,
+                self.design_QP_curve[Q0] * speed_ratio ** 3)
+
+    def point(self, Q, exact=False, rhom=None, max_steps=50):
         """Return the head and power
 
         Q: flow in m3/sec
+        exact: If true, don't use the precomputed surface
+        rhom: The density of the slurry in the pump, if not that of self.slurry
+        max_steps: The most steps to find the reduced speed of a power or torque limited pump
 
         returns a tuple: (Q: flow in m3/sec,
                           H: Head in m of water,
                           P: Power in kW,
                           N: Speed in Hz (for the power/torque limited case)"""
-
-        speed_ratio = self._current_speed / self.design_speed
-        Q0 = Q /speed_ratio
-        H0 = self.design_QH_curve[Q0]
-        P0 = self.design_QP_curve[Q0]
-
-        H = H0 * speed_ratio**2 * self.slurry.rhom
-        P = P0 * speed_ratio**3 * self.slurry.rhom
+        if rhom is None:
+            rhom = self.slurry.rhom
+        H0, P0 = self._head_power(Q, self._current_speed, exact)
+        H = H0 * rhom
+        P = P0 * rhom
 
         if self.limited.lower() == 'torque':
             Pavail = self.avail_power * self._current_speed / self.design_speed
@@ -71,21 +199,16 @@ class Pump():
             return (Q, H, P, self._current_speed)
         else: # Find reduced speed/head/power
             n_new = self._current_speed
-            while not (0.99995 < P/Pavail < 1.00005):
+            steps = 0
+            while not (0.99995 < P/Pavail < 1.00005) and steps < max_steps:
+                steps += 1
                 n_new *= (Pavail / P) ** 0.5
-                speed_ratio = n_new / self.design_speed
-                Q0 = Q / speed_ratio
-
-                P0 = self.design_QP_curve[Q0]
-                P = P0 * speed_ratio ** 3 * self.slurry.rhom
+                H0, P0 = self._head_power(Q, n_new, exact)
+                P = P0 * rhom
                 if self.limited.lower() == 'torque':
                     Pavail = self.avail_power * n_new / self.design_speed
-        H0 = self.design_QH_curve[Q0]
-        H = H0 * speed_ratio ** 2 * self.slurry.rhom
+            if telemetry.enabled:
+                telemetry.record('PumpObj.Pump.point', steps, P/Pavail - 1, 0.99995 < P/Pavail < 1.00005,
+                                 (self.name, Q, self._current_speed, rhom))
+        H = H0 * rhom
         return (Q, H, P, n_new)
-
-
-
-
-
-
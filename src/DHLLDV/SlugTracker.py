@@ -0,0 +1,212 @@
+"""
+SlugTracker - Time stepping simulation of density slugs moving through a pipeline
+
+The pipeline is divided into cells of equal volume, held in a ring buffer of concentrations
+from the entrance (cell 0) to the discharge. Each step the flow volume is pushed in at the
+entrance and the same volume leaves at the discharge. The total concentration in each pipe
+section is kept up to date as the cells cross the section boundaries, so the system head
+takes one calculation per section rather than per cell.
+
+The friction head of each section uses the Erhg curve of the section's slurry (graded,
+Cvt=c), scaled by the concentration in the section: im = il + Erhg * Rsd * Cv.
+"""
+import bisect
+from array import array
+from math import pi
+
+from DHLLDV.DHLLDV_constants import gravity
+from DHLLDV.DHLLDV_Utils import find_root
+
+
+def _curve(slurry, key, v):
+    """Interpolate the slurry Erhg_curves[key] at velocity v"""
+    vls = slurry.vls_list
+    ys = slurry.Erhg_curves[key]
+    index = min(max(bisect.bisect_left(vls, v), 1), len(vls) - 1)
+    v1 = vls[index - 1]
+    v2 = vls[index]
+    return ys[index - 1] + (ys[index] - ys[index - 1]) * (v - v1) / (v2 - v1)
+
+
+class SlugTracker():
+    """Track density slugs through the pipeline of a PumpTrain"""
+    def __init__(self, train, cells=2000, Cv=None):
+        """train: The PumpTrain with the pipeline and pumps
+        cells: The number of cells to divide the pipeline into
+        Cv: The concentration initially in the pipeline, default the pipeline slurry Cv"""
+        self.train = train
+        pipeline = train.pipeline
+        self.slurry = pipeline.slurry
+        if Cv is None:
+            Cv = self.slurry.Cv
+        volumes = [p.length * pi * (p.diameter / 2) ** 2 for p in pipeline.pipesections]
+        self.cell_volume = sum(volumes) / cells
+        self.starts = []
+        self.ends = []
+        n = 0
+        for V, p in zip(volumes, pipeline.pipesections):
+            self.starts.append(n)
+            if p.length > 0:
+                n += max(1, round(V / self.cell_volume))
+            self.ends.append(n)
+        self.cells = array('d', [Cv] * n)
+        self._head = 0          # Index in self.cells of the entrance cell
+        self._shifts = 0
+        self._carry = 0.0       # Volume pumped but not yet a whole cell
+        self.sums = [Cv * (e - s) for s, e in zip(self.starts, self.ends)]
+        self.station_cells = [self._cell_at(s.chainage) for s in train.stations]
+        self.Q = None
+
+    def _cell_at(self, chainage):
+        """Return the cell (counted from the entrance) at the given chainage"""
+        pipeline = self.train.pipeline
+        for start, p, s, e in zip(pipeline.chainages, pipeline.pipesections, self.starts, self.ends):
+            if p.length > 0 and chainage < start + p.length:
+                return min(s + int((chainage - start) / p.length * (e - s)), e - 1)
+        return len(self.cells) - 1
+
+    def Cv_at(self, i):
+        """Return the concentration of cell i, counted from the entrance"""
+        return self.cells[(self._head + i) % len(self.cells)]
+
+    def section_Cv(self):
+        """Return the average concentration in each pipe section"""
+        Cvs = []
+        for k, (s, e) in enumerate(zip(self.starts, self.ends)):
+            Cvs.append(self.sums[k] / (e - s) if e > s else self.Cv_at(0))
+        return Cvs
+
+    def push(self, Cv):
+        """Push one cell of concentration Cv in at the entrance
+
+        returns the concentration of the cell leaving at the discharge"""
+        cells = self.cells
+        n = len(cells)
+        head = self._head
+        for k, (s, e) in enumerate(zip(self.starts, self.ends)):
+            if e > s:
+                entering = Cv if s == 0 else cells[(head + s - 1) % n]
+                self.sums[k] += entering - cells[(head + e - 1) % n]
+        self._head = (head - 1) % n
+        leaving = cells[self._head]
+        cells[self._head] = Cv
+        self._shifts += 1
+        if self._shifts % n == 0:   # Re-add the sums once in a while to avoid round off drift
+            self.sums = [sum(self.Cv_at(i) for i in range(s, e)) for s, e in zip(self.starts, self.ends)]
+        return leaving
+
+    def system_head(self, Q, Cvs=None):
+        """Return the head (m of water) to push the flow Q (m3/sec) with the current slugs
+
+        Cvs: The average concentration in each section, if already calculated"""
+        if Cvs is None:
+            Cvs = self.section_Cv()
+        pipeline = self.train.pipeline
+        rhol = self.slurry.rhol
+        Rsd = self.slurry.Rsd
+        H = 0.0
+        for i, (p, Cv) in enumerate(zip(pipeline.pipesections, Cvs)):
+            rhom = rhol + Cv * (self.slurry.rhos - rhol)
+            v = p.velocity(Q)
+            Hv = v ** 2 / (2 * gravity)
+            slurry = pipeline.slurries[p.diameter]
+            if p.length > 0:
+                im = _curve(slurry, 'il', v) + _curve(slurry, 'graded_Cvt_Erhg', v) * Rsd * Cv
+                H += im * p.length
+            delta_z = p.elev_change if i > 0 else 0.0
+            H += (p.total_K * Hv + delta_z) * rhom
+        Cv_out = self.Cv_at(len(self.cells) - 1)
+        H += pipeline.pipesections[-1].velocity(Q) ** 2 / (2 * gravity) * (rhol + Cv_out * (self.slurry.rhos - rhol))
+        return H
+
+    def pump_head(self, Q):
+        """Return the total head (m of water) and power (kW) of the pumps at flow Q (m3/sec)"""
+        rhol = self.slurry.rhol
+        H = 0.0
+        P = 0.0
+        for s, i in zip(self.train.stations, self.station_cells):
+            rhom = rhol + self.Cv_at(i) * (self.slurry.rhos - rhol)
+            Qp, Hp, Pp, N = s.pump.point(Q, rhom=rhom)
+            H += Hp
+            P += Pp
+        return H, P
+
+    def operating_point(self, Q_guess):
+        """Find the flow (m3/sec) where the pumps match the system head
+
+        Q_guess: A starting flow, usually the flow from the last step"""
+        Cvs = self.section_Cv()
+
+        def excess(Q):
+            try:
+                return self.pump_head(Q)[0] - self.system_head(Q, Cvs)
+            except IndexError:      # Off the end of the pump curve
+                return 1e6 if Q < Q_guess else -1e6
+
+        lo = Q_guess * 0.95
+        hi = Q_guess * 1.05
+        f_lo = excess(lo)
+        f_hi = excess(hi)
+        for _ in range(30):
+            if f_lo >= 0 >= f_hi:
+                break
+            if f_lo < 0:    # The flow is lower than lo
+                hi, f_hi = lo, f_lo
+                lo *= 0.8
+                f_lo = excess(lo)
+            else:
+                lo, f_lo = hi, f_hi
+                hi *= 1.2
+                f_hi = excess(hi)
+        else:
+            raise ValueError(f"SlugTracker: No operating point near Q={Q_guess:0.3f} m3/sec")
+        Q = find_root(excess, lo, hi, xtol=1e-6 * Q_guess)
+        if abs(excess(Q)) >= 1e6:
+            raise ValueError(f"SlugTracker: The pumps cannot push the slurry, the flow drops "
+                             f"off the pump curve below Q={Q_guess:0.3f} m3/sec")
+        return Q
+
+    def step(self, dt, Cv_in):
+        """Advance the simulation by dt seconds with concentration Cv_in entering
+
+        returns a dict with the flow 'Q' (m3/sec), pump 'H' (m of water), 'P' (kW) and
+        the 'Cv_out' leaving the pipeline during the step"""
+        if self.Q is None:
+            self.Q = self.train.pipeline.pipesections[-1].flow(5.0)
+        self.Q = self.operating_point(self.Q)
+        H, P = self.pump_head(self.Q)
+        self._carry += self.Q * dt
+        Cv_out = self.Cv_at(len(self.cells) - 1)
+        while self._carry >= self.cell_volume:
+            Cv_out = self.push(Cv_in)
+            self._carry -= self.cell_volume
+        return {'Q': self.Q, 'H': H, 'P': P, 'Cv_out': Cv_out}
+
+    def run(self, duration, Cv_in, dt=1.0, Q_guess=None):
+        """Run the simulation
+
+        duration: The time to simulate in seconds
+        Cv_in: The concentration entering the pipeline, a function of time (sec) or a list
+               with one value per step
+        dt: The time step in seconds
+        Q_guess: The flow to start the operating point search (m3/sec)
+
+        returns a dict of lists with the time 't' (sec), flow 'Q' (m3/sec), pump head 'H'
+        (m of water), power 'P' (kW), and concentrations 'Cv_in', 'Cv_out' and 'Cv_mean'"""
+        if Q_guess is not None:
+            self.Q = Q_guess
+        results = {'t': [], 'Q': [], 'H': [], 'P': [], 'Cv_in': [], 'Cv_out': [], 'Cv_mean': []}
+        steps = int(round(duration / dt))
+        total = len(self.cells)
+        for n in range(steps):
+            t = n * dt
+            Cv = Cv_in(t) if callable(Cv_in) else Cv_in[n]
+            r = self.step(dt, Cv)
+            results['t'].append(t)
+            results['Q'].append(r['Q'])
+            results['H'].append(r['H'])
+            results['P'].append(r['P'])
+            results['Cv_in'].append(Cv)
+            results['Cv_out'].append(r['Cv_out'])
+            results['Cv_mean'].append(sum(self.sums) / total)
+        return results
@@ -13,7 +13,11 @@ from . import DHLLDV_constants
 from . import homogeneous
 
 class Slurry():
-    def __init__(self, Dp=0.762, D50=1.0/1000., silt=None, fluid='fresh', Cv=0.175, max_index=100):
+    def __init__(self, Dp=0.762, D50=1.0/1000., silt=None, fluid='fresh', Cv=0.175, max_index=100,
+                 epsilon=DHLLDV_constants.steel_roughness, nu=1.0508e-6, rhol=1.0248103, rhos=2.65, GSD=None):
+        """The curves are generated once, for all the arguments
+
+        GSD: The fractioned GSD, default generated from D50 and silt"""
         self.max_index = max_index
         self.Dp = Dp
         self.D50 = D50
@@ -21,15 +25,18 @@ class Slurry():
             self._silt = -1
         else:
             self._silt = silt
-        self.epsilon = DHLLDV_constants.steel_roughness
+        self.epsilon = epsilon
         self._fluid = fluid
         self.Cv = Cv
-        self.nu = 1.0508e-6  # DHLLDV_constants.water_viscosity[20]
-        self.rhol = 1.0248103  # DHLLDV_constants.water_density[20]
-        self.rhos = 2.65
+        self.nu = nu  # DHLLDV_constants.water_viscosity[20]
+        self.rhol = rhol  # DHLLDV_constants.water_density[20]
+        self.rhos = rhos
         self.rhoi = 1.92
         self.vls_list = [(i + 1) / 10. for i in range(self.max_index)]
-        self.generate_GSD()
+        if GSD is None:
+            self.generate_GSD()
+        else:
+            self.GSD = GSD
         self.generate_curves()
 
     @property
@@ -110,12 +117,15 @@ class Slurry():
             logdthis = log10(dnext) - (log10(dnext) - log10(dlow)) * (fnext - 0.15) / (fnext - flow)
         return 10 ** logdthis
 
-    def generate_Erhg_curves(self):
+    def generate_Erhg_curves(self, vls_list=None):
         """Generate a dict with the Erhg curves
 
+        vls_list: The velocities to calculate, default self.vls_list
         Note assumes the GSD is already generated"""
+        if vls_list is None:
+            vls_list = self.vls_list
         Erhg_obj_list = [DHLLDV_framework.Cvs_Erhg(vls, self.Dp, self.D50, self.epsilon, self.nu, self.rhol, self.rhos, self.Cv, get_dict=True) for vls in
-                         self.vls_list]
+                         vls_list]
         il_list = [Erhg_obj['il'] for Erhg_obj in Erhg_obj_list]
         # Erhg for the ELM is just the il
         return {'Erhg_objects': Erhg_obj_list,
@@ -127,38 +137,43 @@ class Slurry():
                 'Ho': [Erhg_obj['Ho'] for Erhg_obj in Erhg_obj_list],
                 'Cvs_regime': [Erhg_obj['regime'] for Erhg_obj in Erhg_obj_list],
                 'Cvs_from_Cvt': [DHLLDV_framework.Cvs_from_Cvt(vls, self.Dp, self.D50, self.epsilon, self.nu, self.rhol, self.rhos, self.Cv) for vls in
-                                 self.vls_list],
-                'Cvt_Erhg': [DHLLDV_framework.Cvt_Erhg(vls, self.Dp, self.D50, self.epsilon, self.nu, self.rhol, self.rhos, self.Cv) for vls in self.vls_list],
+                                 vls_list],
+                'Cvt_Erhg': [DHLLDV_framework.Cvt_Erhg(vls, self.Dp, self.D50, self.epsilon, self.nu, self.rhol, self.rhos, self.Cv) for vls in vls_list],
                 'graded_Cvs_Erhg': [
                     DHLLDV_framework.Erhg_graded(self.GSD, vls, self.Dp, self.epsilon, self.nu, self.rhol, self.rhos, self.Cv, Cvt_eq_Cvs=False,
                                                  num_fracs=None)
-                    for vls in self.vls_list],
+                    for vls in vls_list],
                 'graded_Cvt_Erhg': [
                     DHLLDV_framework.Erhg_graded(self.GSD, vls, self.Dp, self.epsilon,
                                                  self.nu, self.rhol, self.rhos, self.Cv,
                                                  Cvt_eq_Cvs=True, num_fracs=None)
-                    for vls in self.vls_list],
+                    for vls in vls_list],
                 }
 
     def generate_im_curves(self):
         """Generate the im curves, given the Erhg curves"""
         c = self.Erhg_curves
         il_list = c['il']
+        points = len(il_list)
         return {'il': il_list,
-                'Cvs_im': [c['Cvs_Erhg'][i] * self.Rsd * self.Cv + il_list[i] for i in range(self.max_index)],
-                'FB': [c['FB'][i] * self.Rsd * self.Cv + il_list[i] for i in range(self.max_index)],
-                'SB': [c['SB'][i] * self.Rsd * self.Cv + il_list[i] for i in range(self.max_index)],
-                'He': [c['He'][i] * self.Rsd * self.Cv + il_list[i] for i in range(self.max_index)],
-                'ELM': [il_list[i] * self.rhom for i in range(self.max_index)],
-                'Ho': [c['Ho'][i] * self.Rsd * self.Cv + il_list[i] for i in range(self.max_index)],
-                'Cvt_im': [c['Cvt_Erhg'][i] * self.Rsd * self.Cv + il_list[i] for i in range(self.max_index)],
-                'graded_Cvs_im': [c['graded_Cvs_Erhg'][i] * self.Rsd * self.Cv + il_list[i] for i in range(self.max_index)],
-                'graded_Cvt_im': [c['graded_Cvt_Erhg'][i] * self.Rsd * self.Cv + il_list[i] for i in range(self.max_index)]
+                'Cvs_im': [c['Cvs_Erhg'][i] * self.Rsd * self.Cv + il_list[i] for i in range(points)],
+                'FB': [c['FB'][i] * self.Rsd * self.Cv + il_list[i] for i in range(points)],
+                'SB': [c['SB'][i] * self.Rsd * self.Cv + il_list[i] for i in range(points)],
+                'He': [c['He'][i] * self.Rsd * self.Cv + il_list[i] for i in range(points)],
+                'ELM': [il_list[i] * self.rhom for i in range(points)],
+                'Ho': [c['Ho'][i] * self.Rsd * self.Cv + il_list[i] for i in range(points)],
+                'Cvt_im': [c['Cvt_Erhg'][i] * self.Rsd * self.Cv + il_list[i] for i in range(points)],
+                'graded_Cvs_im': [c['graded_Cvs_Erhg'][i] * self.Rsd * self.Cv + il_list[i] for i in range(points)],
+                'graded_Cvt_im': [c['graded_Cvt_Erhg'][i] * self.Rsd * self.Cv + il_list[i] for i in range(points)]
                 }
 
-    def generate_LDV_curves(self, d):
-        cv_points = 50
-        Cv_list = [(i + 1) / 100. for i in range(cv_points)]
+    def generate_LDV_curves(self, d, Cv_list=None):
+        """Generate the LDV curves for particle diameter d
+
+        Cv_list: The concentrations to calculate, default 0.01 to 0.50"""
+        if Cv_list is None:
+            Cv_list = [(i + 1) / 100. for i in range(50)]
+        cv_points = len(Cv_list)
         LDV_vls_list = [DHLLDV_framework.LDV(1, self.Dp, d, self.epsilon, self.nu, self.rhol, self.rhos, Cv) for Cv in Cv_list]
         LDV_il_list = [homogeneous.fluid_head_loss(vls, self.Dp, self.epsilon, self.nu, self.rhol) for vls in LDV_vls_list]
         LDV_Ergh_list = [DHLLDV_framework.Cvs_Erhg(LDV_vls_list[i], self.Dp, d, self.epsilon, self.nu, self.rhol, self.rhos, Cv_list[i]) for i in
@@ -0,0 +1,202 @@
+"""
+aio - An asyncio facade for the DHLLDV calculations
+
+The framework is synchronous and CPU bound, so calling it from a coroutine blocks the
+event loop. The Evaluator here runs the calculations in a thread or process pool:
+
+    from DHLLDV import aio
+    from DHLLDV.HeadLossModels import SlurrySpec
+
+    curves = await aio.evaluate_curves(SlurrySpec(Dp=0.6, Cv=0.2), vls_list=[1.0, 2.0, 3.0])
+
+- Identical requests that are in flight at the same time are calculated once, and all the
+  callers get the result.
+- At most max_pending calculations are in flight, further requests wait for a free slot.
+- The curves are calculated in chunks of velocities. If every caller of a request is
+  cancelled, no more chunks are started, so abandoned requests stop using the workers.
+"""
+import asyncio
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV import HeadLossModels
+from DHLLDV.HeadLossModels import SlurrySpec
+from DHLLDV.service import pipeline_for, pipeline_key
+
+CHUNK_SIZE = 20     # Velocities per job
+
+
+def _freeze(value):
+    """Return a hashable version of value, for the key of a request"""
+    if dataclasses.is_dataclass(value):
+        value = dataclasses.asdict(value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _compare(spec, vls_list, names):
+    return HeadLossModels.compare(spec, vls_list, names)
+
+
+def _ldv(spec):
+    return DHLLDV_framework.LDV(None, spec.Dp, spec.d50, spec.epsilon, spec.nu, spec.rhol, spec.rhos, spec.Cv)
+
+
+def _system_heads(key, Q_list):
+    pipeline = pipeline_for(key, max(Q_list))
+    return [list(pipeline.calc_system_head(Q)) for Q in Q_list]
+
+
+def _merge(chunks, names):
+    """Join the compare results for chunks of velocities into one"""
+    result = {'vls': [], 'il': []}
+    result.update({name: {'Erhg': [], 'im': []} for name in names})
+    for chunk in chunks:
+        result['vls'] += chunk['vls']
+        result['il'] += chunk['il']
+        for name in names:
+            result[name]['Erhg'] += chunk[name]['Erhg']
+            result[name]['im'] += chunk[name]['im']
+    return result
+
+
+class Evaluator():
+    """Run the DHLLDV calculations in a pool, for use from coroutines"""
+    def __init__(self, executor=None, processes=False, max_workers=None, max_pending=64, chunk_size=CHUNK_SIZE):
+        """executor: A concurrent.futures executor to use, default a new pool
+        processes: If True (and no executor) use a process pool, otherwise a thread pool
+        max_workers: The number of workers in the new pool
+        max_pending: The most calculations in flight, further requests wait
+        chunk_size: The number of velocities per job in evaluate_curves"""
+        self._own_executor = executor is None
+        if executor is None:
+            executor = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=max_workers)
+        self.executor = executor
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self._slots = None          # The semaphore is made in the running loop
+        self._slots_loop = None
+        self._in_flight = {}        # key: [task, number of callers]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Shut down the pool, if the Evaluator made it"""
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    @property
+    def pending(self):
+        """The number of calculations in flight"""
+        return len(self._in_flight)
+
+    async def _call(self, func, *args):
+        """Run func(*args) in the pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args))
+
+    async def _run(self, key, make):
+        """Return the result of the coroutine make(), shared with the other callers of key
+
+        The calculation is cancelled when all of its callers are cancelled."""
+        entry = self._in_flight.get(key)
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            if self._slots is None or self._slots_loop is not loop:
+                self._slots, self._slots_loop = asyncio.Semaphore(self.max_pending), loop
+            await self._slots.acquire()
+            entry = self._in_flight.get(key)    # Someone may have started it while we waited
+            if entry is None:
+                entry = [asyncio.ensure_future(make()), 0]
+                self._in_flight[key] = entry
+                entry[0].add_done_callback(partial(self._finished, key, entry, self._slots))
+            else:
+                self._slots.release()
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if not entry[0].done():
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._in_flight[key]    # New callers start again
+                    entry[0].cancel()
+            raise
+
+    def _finished(self, key, entry, slots, task):
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+        slots.release()
+        if not task.cancelled():
+            task.exception()    # Retrieved here so an unawaited failure is not logged
+
+    async def evaluate_curves(self, spec=None, vls_list=None, models=None):
+        """Evaluate the head loss models for spec, as HeadLossModels.compare
+
+        spec: A SlurrySpec, default SlurrySpec()
+        vls_list: The velocities (m/sec), default 0.1 to 10.0 by 0.1
+        models: The names of the models, default all the registered models"""
+        spec = spec or SlurrySpec()
+        vls_list = list(vls_list or [(i + 1) / 10. for i in range(100)])
+        names = list(models or HeadLossModels.models())
+
+        async def make():
+            chunks = []
+            for i in range(0, len(vls_list), self.chunk_size):
+                chunks.append(await self._call(_compare, spec, vls_list[i:i + self.chunk_size], names))
+            return _merge(chunks, names)
+
+        return await self._run(('curves', _freeze(spec), tuple(vls_list), tuple(names)), make)
+
+    async def ldv(self, spec=None):
+        """Return the limit deposit velocity (m/sec) for spec, a SlurrySpec"""
+        spec = spec or SlurrySpec()
+        return await self._run(('LDV', _freeze(spec)), partial(self._call, _ldv, spec))
+
+    async def system_heads(self, Q_list, pipeline, spec=None):
+        """Return the [slurry head, water head] (m of water) at each flow in Q_list (m3/sec)
+
+        pipeline: A list of pipe sections, each a dict with name, diameter, length, K and dz
+        spec: The slurry, a SlurrySpec, its Dp is ignored as the slurry is in the last section"""
+        spec = spec or SlurrySpec()
+        params = {'pipeline': pipeline, 'd': spec.d50, 'd15': spec.d15, 'd85': spec.d85, 'epsilon': spec.epsilon,
+                  'nu': spec.nu, 'rhol': spec.rhol, 'rhos': spec.rhos, 'Cv': spec.Cv}
+        if spec.GSD is not None:
+            params['GSD'] = spec.GSD
+        key = pipeline_key(params)
+        Q_list = [float(Q) for Q in Q_list]
+        return await self._run(('system', key, tuple(Q_list)), partial(self._call, _system_heads, key, Q_list))
+
+
+_default = None
+
+
+def default_evaluator():
+    """Return the shared Evaluator (on a thread pool) used by the module functions"""
+    global _default
+    if _default is None:
+        _default = Evaluator()
+    return _default
+
+
+async def evaluate_curves(spec=None, vls_list=None, models=None):
+    """Evaluate the head loss models for spec with the default Evaluator, see Evaluator.evaluate_curves"""
+    return await default_evaluator().evaluate_curves(spec, vls_list, models)
+
+
+async def ldv(spec=None):
+    """Return the limit deposit velocity for spec with the default Evaluator"""
+    return await default_evaluator().ldv(spec)
+
+
+async def system_heads(Q_list, pipeline, spec=None):
+    """Return the system heads with the default Evaluator, see Evaluator.system_heads"""
+    return await default_evaluator().system_heads(Q_list, pipeline, spec)
@@ -0,0 +1,304 @@
+"""
+backcalc - Back-calculate the concentration from logged flow and pressure gradient
+
+    python -m DHLLDV.backcalc log.csv -o result.csv --Dp 0.762 --d 0.001 --model Cvt
+    python -m DHLLDV.backcalc log.dlb -o result.dlb --Dp 0.762 --GSD 0.15:0.0005 0.5:0.001 0.85:0.00272 \\
+        --model "graded Cvt"
+    python -m DHLLDV.backcalc log.csv -o result.csv --Dp 0.762 --d 0.001 --table erhg.dlt
+
+The log is read and the results written CHUNK_SIZE samples at a time, so the memory used
+does not depend on the length of the log. A log is CSV with a header row, or the binary
+format of BinaryWriter (recognised by its MAGIC): the column names, then the samples as
+little endian doubles. The input columns are (the names can be changed with options):
+    time: The time of the sample, copied to the output
+    Q: The flow (m3/sec)
+    im: The measured hydraulic gradient (m water/m)
+    rhom: The measured density (ton/m3), optional
+The output columns are time, vls, im, Cv (back-calculated) and Cv_density (from rhom,
+nan without it). The output is binary if its name ends with .dlb, otherwise CSV.
+
+For each sample the Cv is found where the model im equals the measured im, by secant
+steps from a narrow bracket around the Cv of the previous sample scaled by the change in
+the excess im (im - il). Where they do not converge (near a regime change) the bracket is
+widened until it holds the Cv, which find_root then finds. The im is assumed to increase
+with the Cv at a given velocity. Cv is 0 where the measured im is not
+above the im of the fluid alone, and nan where the inputs are missing or no Cv in the
+range matches.
+
+The models are Cvs_Erhg ('Cvs'), Cvt_Erhg ('Cvt') and Erhg_graded with the Cvs or Cvt
+basis ('graded Cvs', 'graded Cvt'). With --table the Erhg comes from a surrogate.ErhgTable
+(with its basis, fluid and solids), which is much faster for long logs.
+"""
+import argparse
+import array
+import csv
+import json
+import math
+import struct
+import sys
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV import homogeneous
+from DHLLDV import telemetry
+from DHLLDV.DHLLDV_constants import steel_roughness
+from DHLLDV.DHLLDV_Utils import find_root
+
+MAGIC = b'DHLLDVL1'
+MODELS = ('Cvs', 'Cvt', 'graded Cvs', 'graded Cvt')
+CHUNK_SIZE = 10000
+COLUMNS = ('time', 'vls', 'im', 'Cv', 'Cv_density')
+CV_RANGE = (0.001, 0.4)
+WARM_WIDTH = 0.01       # The relative half width of the first bracket around the predicted Cv
+SECANT_STEPS = 6
+
+
+def _float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def read_chunks(path, columns, chunk_size=CHUNK_SIZE):
+    """Yield the log at path as dicts of {column: list of floats}, chunk_size samples at a time
+
+    columns: The names of the columns to read, a missing column is all nan"""
+    with open(path, 'rb') as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+    if binary:
+        yield from _read_binary(path, columns, chunk_size)
+    else:
+        yield from _read_csv(path, columns, chunk_size)
+
+
+def _read_csv(path, columns, chunk_size):
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+        indices = [header.index(name) if name in header else None for name in columns]
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield _csv_chunk(rows, columns, indices)
+                rows = []
+        if rows:
+            yield _csv_chunk(rows, columns, indices)
+
+
+def _csv_chunk(rows, columns, indices):
+    return {name: [math.nan] * len(rows) if i is None else [_float(row[i]) for row in rows]
+            for name, i in zip(columns, indices)}
+
+
+def _read_binary(path, columns, chunk_size):
+    with open(path, 'rb') as f:
+        f.read(len(MAGIC))
+        size = struct.unpack('<I', f.read(4))[0]
+        header = json.loads(f.read(size))['columns']
+        indices = [header.index(name) if name in header else None for name in columns]
+        width = len(header)
+        while True:
+            blob = f.read(chunk_size * width * 8)
+            if not blob:
+                return
+            data = array.array('d')
+            data.frombytes(blob[:len(blob) - len(blob) % (width * 8)])
+            if sys.byteorder != 'little':
+                data.byteswap()
+            count = len(data) // width
+            yield {name: [math.nan] * count if i is None else data[i::width].tolist()
+                   for name, i in zip(columns, indices)}
+
+
+class BinaryWriter():
+    """Write a log in the binary format: MAGIC, header length (uint32), JSON header, the samples"""
+    def __init__(self, f, columns):
+        self.f = f
+        self.columns = list(columns)
+        blob = json.dumps({'columns': self.columns}).encode()
+        f.write(MAGIC + struct.pack('<I', len(blob)) + blob)
+
+    def write_chunk(self, chunk):
+        data = array.array('d', (value for row in zip(*(chunk[name] for name in self.columns)) for value in row))
+        if sys.byteorder != 'little':
+            data.byteswap()
+        self.f.write(data.tobytes())
+
+
+class CSVWriter():
+    """Write a log as CSV with a header row"""
+    def __init__(self, f, columns):
+        self.columns = list(columns)
+        self.writer = csv.writer(f)
+        self.writer.writerow(self.columns)
+
+    def write_chunk(self, chunk):
+        self.writer.writerows(zip(*(chunk[name] for name in self.columns)))
+
+
+class BackCalculator():
+    """Back-calculate the Cv of samples for one pipe and solids
+
+    model: One of MODELS, ignored with a table
+    Dp: Pipe diameter (m)
+    d: Particle diameter (m), for the uniform models and the table
+    GSD: Particle size distribution dict {x: d_x, ...}, for the graded models
+    table: A surrogate.ErhgTable to take the Erhg from, with its basis, fluid and solids
+    xtol: The tolerance of the Cv"""
+    def __init__(self, model='Cvt', Dp=0.762, d=None, GSD=None, epsilon=steel_roughness, nu=1.0508e-6,
+                 rhol=1.0248103, rhos=2.65, table=None, Cv_range=CV_RANGE, xtol=1e-6):
+        if table is not None:
+            model = table.basis
+            epsilon, nu, rhol, rhos = table.epsilon, table.nu, table.rhol, table.rhos
+        if model not in MODELS:
+            raise ValueError(f"backcalc: model must be one of {MODELS}, not {model!r}")
+        if (GSD is None) == (d is None) or (GSD is not None) != model.startswith('graded'):
+            raise ValueError(f"backcalc: the {model} model needs {'GSD' if model.startswith('graded') else 'd'}")
+        self.model = model
+        self.Dp = Dp
+        self.epsilon = epsilon
+        self.nu = nu
+        self.rhol = rhol
+        self.rhos = rhos
+        self.Rsd = (rhos - rhol) / rhol  # Eqn 8.2-1
+        self.Cv_range = Cv_range
+        self.xtol = xtol
+        self.previous = None
+        self.failures = 0
+        if table is not None:
+            self.Erhg = lambda vls, Cv: table.Erhg(vls, Dp, d, Cv)
+        elif GSD is not None:
+            fracs = DHLLDV_framework.create_fracs(GSD, Dp, nu, rhol, rhos)
+            Cvt_eq_Cvs = model == 'graded Cvt'
+            self.Erhg = lambda vls, Cv: DHLLDV_framework.Erhg_graded(fracs, vls, Dp, epsilon, nu, rhol, rhos, Cv,
+                                                                     Cvt_eq_Cvs=Cvt_eq_Cvs, num_fracs=None)
+        else:
+            func = DHLLDV_framework.Cvt_Erhg if model == 'Cvt' else DHLLDV_framework.Cvs_Erhg
+            self.Erhg = lambda vls, Cv: func(vls, Dp, d, epsilon, nu, rhol, rhos, Cv)
+
+    def Cv(self, vls, im):
+        """Return the Cv where the model im at vls is im, starting from the previous Cv"""
+        excess = im - homogeneous.fluid_head_loss(vls, self.Dp, self.epsilon, self.nu, self.rhol) if vls > 0 else math.nan
+        if excess <= 0:
+            return 0.0
+        if math.isnan(excess):
+            return math.nan
+        try:
+            Cv = self._solve(vls, excess)
+        except (IndexError, TypeError, ValueError, ZeroDivisionError):
+            # The model is not defined here, e.g. Cvs above the bed concentration or a complex Erhg at low velocity
+            Cv = None
+        if Cv is None:
+            self.failures += 1
+            self.previous = None
+            return math.nan
+        self.previous = (Cv, excess)
+        return Cv
+
+    def _solve(self, vls, excess):
+        lo, hi = self.Cv_range
+
+        def f(Cv):
+            return self.Erhg(vls, Cv) * self.Rsd * Cv - excess
+
+        if self.previous is None:
+            guess = math.sqrt(lo * hi)
+        else:
+            # Erhg changes slowly from sample to sample, so Cv is nearly proportional to the excess im
+            Cv, previous_excess = self.previous
+            guess = min(max(Cv * excess / previous_excess, lo), hi)
+        a = max(lo, guess / (1 + WARM_WIDTH))
+        b = min(hi, guess * (1 + WARM_WIDTH))
+        fa, fb = f(a), f(b)
+        # Secant steps from the first bracket, usually enough as f is smooth away from regime changes
+        x0, f0, x1, f1 = a, fa, b, fb
+        for step in range(SECANT_STEPS):
+            if f1 == f0:
+                break
+            x2 = x1 - f1 * (x1 - x0) / (f1 - f0)
+            if not lo <= x2 <= hi:
+                break
+            if abs(x2 - x1) < self.xtol:
+                if telemetry.enabled:
+                    telemetry.record('backcalc.BackCalculator.Cv', step + 3, f1, True)
+                return x2
+            x0, f0, x1, f1 = x1, f1, x2, f(x2)
+        # Otherwise step out to bracket the root, and find it with find_root
+        while (fa > 0) == (fb > 0) and fa != 0 and fb != 0:
+            if fb < 0:      # Both too low, move up
+                if b >= hi:
+                    return None
+                a, fa = b, fb
+                b = min(hi, b * 2)
+                fb = f(b)
+            else:
+                if a <= lo:
+                    return None
+                b, fb = a, fa
+                a = max(lo, a / 2)
+                fa = f(a)
+        return find_root(f, a, b, xtol=self.xtol)
+
+    def process(self, chunk, flow='Q', gradient='im', density='rhom', time='time'):
+        """Return the output chunk (see COLUMNS) for an input chunk from read_chunks"""
+        pipe_area = math.pi * self.Dp ** 2 / 4
+        vls = [Q / pipe_area for Q in chunk[flow]]
+        ims = chunk[gradient]
+        return {'time': chunk[time],
+                'vls': vls,
+                'im': ims,
+                'Cv': [self.Cv(v, im) for v, im in zip(vls, ims)],
+                'Cv_density': [(rhom - self.rhol) / (self.rhos - self.rhol) for rhom in chunk[density]],
+                }
+
+
+def run(source, output, calculator, chunk_size=CHUNK_SIZE, flow='Q', gradient='im', density='rhom', time='time',
+        progress=None):
+    """Back-calculate the log at source into output, returns the number of samples"""
+    count = 0
+    binary = output.endswith('.dlb')
+    with open(output, 'wb' if binary else 'w', newline=None if binary else '') as f:
+        writer = (BinaryWriter if binary else CSVWriter)(f, COLUMNS)
+        for chunk in read_chunks(source, (time, flow, gradient, density), chunk_size):
+            writer.write_chunk(calculator.process(chunk, flow, gradient, density, time))
+            count += len(chunk[flow])
+            if progress is not None:
+                print(f"{count} samples", file=progress, flush=True)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m DHLLDV.backcalc',
+                                     description="Back-calculate the concentration from a log of flow and gradient")
+    parser.add_argument('log', help="The log, CSV or binary")
+    parser.add_argument('-o', '--output', required=True, help="The results, binary if it ends with .dlb, else CSV")
+    parser.add_argument('--Dp', type=float, required=True, help="The pipe diameter (m)")
+    parser.add_argument('--d', type=float, help="The particle diameter (m), for the uniform models")
+    parser.add_argument('--GSD', nargs='+', metavar='FRACTION:DIAMETER', help="The GSD, for the graded models")
+    parser.add_argument('--model', choices=MODELS, default='Cvt')
+    parser.add_argument('--table', help="A surrogate Erhg table to use instead of the model")
+    parser.add_argument('--fluid', choices=('fresh', 'salt'), default='salt')
+    parser.add_argument('--rhos', type=float, default=2.65, help="The solids density (ton/m3)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    for name, default in (('time', 'time'), ('flow', 'Q'), ('gradient', 'im'), ('density', 'rhom')):
+        parser.add_argument(f'--{name}-column', default=default, help=f"The name of the {name} column")
+    args = parser.parse_args(argv)
+    from DHLLDV.surrogate import FLUIDS, ErhgTable
+    rhol, nu = FLUIDS[args.fluid]
+    GSD = None
+    if args.GSD:
+        GSD = {float(x): float(d) for x, d in (item.split(':') for item in args.GSD)}
+    table = ErhgTable.open(args.table) if args.table else None
+    try:
+        calculator = BackCalculator(args.model, args.Dp, args.d, GSD, nu=nu, rhol=rhol, rhos=args.rhos, table=table)
+    except ValueError as e:
+        parser.error(str(e))
+    count = run(args.log, args.output, calculator, args.chunk_size, args.flow_column, args.gradient_column,
+                args.density_column, args.time_column, progress=sys.stderr)
+    print(f"{count} samples, {calculator.failures} without a solution", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
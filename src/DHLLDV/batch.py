@@ -0,0 +1,255 @@
+"""
+batch - Run a sweep of slurry and pipeline scenarios from the command line
+
+    dhlldv-batch scenarios.json -o results.csv --workers 4
+
+The scenario file is JSON:
+    {"defaults": {"Dp": 0.762, "d50": 0.001, "Cv": 0.175},
+     "sweep": {"Dp": [0.6, 0.762], "Cv": [0.1, 0.2, 0.3]},
+     "cases": [{"name": "coarse", "d50": 0.002}],
+     "vls": {"start": 0.5, "stop": 10.0, "step": 0.1},
+     "models": ["DHLLDV graded Cvt", "Wilson V50"]}
+Each case is the defaults updated with the case's own values. The sweep adds a case for
+every combination of its values, on top of each listed case (or the defaults alone if no
+cases are listed). Case values are the SlurrySpec fields, plus optionally:
+    "name": Used in the output, default from the swept values or the case number
+    "vls": A list of velocities (m/sec) or a dict with start, stop and step
+    "models": The head loss models to run, see HeadLossModels.models()
+    "pipeline": A list of pipe sections, each a dict with name, diameter, length, K and dz,
+                to add the system head at each velocity in the last section
+
+The results are written as each case finishes, to CSV (one row per case, model and
+velocity) or to NPZ if numpy is installed. The names of the finished cases are written to
+a checkpoint file, so an interrupted run can be continued with --resume.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV import HeadLossModels
+from DHLLDV import homogeneous
+from DHLLDV.HeadLossModels import SlurrySpec
+
+COLUMNS = ['case', 'model', 'vls', 'il', 'Erhg', 'im', 'Q', 'Hm', 'Hl']
+DEFAULT_MODELS = ['DHLLDV graded Cvt']
+_spec_fields = set(SlurrySpec.__dataclass_fields__) - {'GSD'}
+
+
+def velocity_list(vls):
+    """Return the list of velocities for a list, or a dict with start, stop and step"""
+    if isinstance(vls, dict):
+        start = vls.get('start', 0.1)
+        step = vls.get('step', 0.1)
+        count = int(round((vls.get('stop', 10.0) - start) / step)) + 1
+        return [start + i * step for i in range(count)]
+    return list(vls)
+
+
+def expand_cases(scenario):
+    """Return the list of cases (dicts) in the scenario"""
+    defaults = dict(scenario.get('defaults', {}))
+    for key in ('vls', 'models'):
+        if key in scenario:
+            defaults.setdefault(key, scenario[key])
+    listed = scenario.get('cases') or [{}]
+    sweep = scenario.get('sweep', {})
+    keys = list(sweep)
+    cases = []
+    for n, listed_case in enumerate(listed):
+        for values in itertools.product(*[sweep[k] for k in keys]):
+            case = dict(defaults)
+            case.update(listed_case)
+            case.update(zip(keys, values))
+            parts = [listed_case['name']] if 'name' in listed_case else []
+            if not parts and len(listed) > 1:
+                parts = [f'case {n + 1}']
+            parts += [f'{k}={v}' for k, v in zip(keys, values)]
+            case['name'] = ' '.join(parts) or 'case 1'
+            cases.append(case)
+    names = [c['name'] for c in cases]
+    if len(set(names)) != len(names):
+        raise ValueError("batch: The case names must be unique")
+    return cases
+
+
+def run_case(case):
+    """Calculate one case, returns (name, list of rows)"""
+    spec = SlurrySpec(**{k: v for k, v in case.items() if k in _spec_fields})
+    vls_list = velocity_list(case.get('vls', {'start': 0.1, 'stop': 10.0, 'step': 0.1}))
+    name = case['name']
+    result = HeadLossModels.compare(spec, vls_list, case.get('models', DEFAULT_MODELS))
+    rows = []
+    for model in case.get('models', DEFAULT_MODELS):
+        for vls, il, Erhg, im in zip(vls_list, result['il'], result[model]['Erhg'], result[model]['im']):
+            rows.append({'case': name, 'model': model, 'vls': vls, 'il': il, 'Erhg': Erhg, 'im': im})
+    vldv = DHLLDV_framework.LDV(None, spec.Dp, spec.d50, spec.epsilon, spec.nu, spec.rhol, spec.rhos, spec.Cv)
+    il = homogeneous.fluid_head_loss(vldv, spec.Dp, spec.epsilon, spec.nu, spec.rhol)
+    Erhg = DHLLDV_framework.Cvs_Erhg(vldv, spec.Dp, spec.d50, spec.epsilon, spec.nu, spec.rhol, spec.rhos, spec.Cv)
+    rows.append({'case': name, 'model': 'LDV', 'vls': vldv, 'il': il, 'Erhg': Erhg, 'im': Erhg * spec.Rsd * spec.Cv + il})
+    if case.get('pipeline'):
+        rows += _system_rows(name, spec, vls_list, case['pipeline'])
+    return name, rows
+
+
+def _system_rows(name, spec, vls_list, sections):
+    """Rows of the pipeline system head at each velocity in the last section
+
+    The slurry curves are extended to the highest velocity in any section"""
+    from DHLLDV.PipeObj import Pipe, Pipeline
+    Dp = sections[-1]['diameter']
+    vls_max = max(vls_list) * max((Dp / s['diameter']) ** 2 for s in sections)
+    slurry = spec.to_slurry(Dp, vls_max)
+    pipes = [Pipe(s.get('name', f'Pipe {i}'), s['diameter'], s.get('length', 0.0), s.get('K', 0.0), s.get('dz', 0.0))
+             for i, s in enumerate(sections)]
+    pipeline = Pipeline(pipes, slurry=slurry)
+    rows = []
+    for vls in vls_list:
+        Q = pipes[-1].flow(vls)
+        Hm, Hl = pipeline.calc_system_head(Q)
+        rows.append({'case': name, 'model': 'system', 'vls': vls, 'Q': Q, 'Hm': Hm, 'Hl': Hl})
+    return rows
+
+
+class CSVWriter():
+    """Write the rows to a CSV file as they arrive"""
+    def __init__(self, path, append=False):
+        exists = append and os.path.exists(path)
+        self.f = open(path, 'a' if exists else 'w', newline='')
+        self.writer = csv.DictWriter(self.f, COLUMNS)
+        if not exists:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class NPZWriter():
+    """Write the rows to a numpy .npz file, one array per column
+
+    Each case is saved as it arrives to its own chunk in the directory path + '.parts', and
+    close() joins the chunks (after the rows already in path when appending) into path. The
+    chunks of an interrupted run are kept for --resume."""
+    def __init__(self, path, append=False):
+        import numpy
+        self.numpy = numpy
+        self.path = path
+        self.append = append
+        self.parts = path + '.parts'
+        if not append:
+            shutil.rmtree(self.parts, ignore_errors=True)
+        os.makedirs(self.parts, exist_ok=True)
+        self.count = len(self._chunks())
+
+    def _chunks(self):
+        return sorted(os.path.join(self.parts, n) for n in os.listdir(self.parts) if n != 'tmp.npz')
+
+    def write(self, rows):
+        columns = {c: self.numpy.array([r.get(c, '' if c in ('case', 'model') else float('nan')) for r in rows])
+                   for c in COLUMNS}
+        tmp = os.path.join(self.parts, 'tmp.npz')
+        self.numpy.savez(tmp, **columns)
+        os.replace(tmp, os.path.join(self.parts, f'{self.count:06d}.npz'))
+        self.count += 1
+
+    def close(self):
+        chunks = self._chunks()
+        if self.append and os.path.exists(self.path):
+            chunks.insert(0, self.path)
+        columns = {c: [] for c in COLUMNS}
+        for chunk in chunks:
+            with self.numpy.load(chunk) as arrays:
+                for c in COLUMNS:
+                    columns[c].append(arrays[c])
+        tmp = self.path + '.tmp.npz'
+        self.numpy.savez(tmp, **{c: self.numpy.concatenate(v) if v else self.numpy.array([])
+                                 for c, v in columns.items()})
+        os.replace(tmp, self.path)
+        shutil.rmtree(self.parts)
+
+
+def run(scenario, output, workers=None, checkpoint=None, resume=False, progress=sys.stderr):
+    """Run the cases in scenario (a dict) and write the results to output
+
+    workers: The number of processes, None or 0 to run in this process
+    checkpoint: The file of finished case names, default output + '.done'
+    resume: Skip the cases in the checkpoint file and add to the output
+    progress: A file for the progress messages, or None
+
+    returns the number of cases run"""
+    cases = expand_cases(scenario)
+    checkpoint = checkpoint or output + '.done'
+    done = set()
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            done = {line.rstrip('\n') for line in f if line.strip()}
+    else:
+        resume = False
+        open(checkpoint, 'w').close()
+    todo = [c for c in cases if c['name'] not in done]
+    if output.lower().endswith('.npz'):
+        writer = NPZWriter(output, append=resume)
+    else:
+        writer = CSVWriter(output, append=resume)
+    start = time.time()
+    finished = 0
+
+    def record(name, rows):
+        nonlocal finished
+        writer.write(rows)
+        with open(checkpoint, 'a') as f:
+            f.write(name + '\n')
+        finished += 1
+        if progress is not None:
+            elapsed = time.time() - start
+            eta = elapsed / finished * (len(todo) - finished)
+            print(f"{finished}/{len(todo)} cases, {elapsed:0.1f} s elapsed, {eta:0.1f} s to go: {name}",
+                  file=progress, flush=True)
+
+    try:
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(run_case, c) for c in todo]
+                for future in as_completed(futures):
+                    record(*future.result())
+        else:
+            for c in todo:
+                record(*run_case(c))
+    finally:
+        writer.close()
+    return finished
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='dhlldv-batch', description="Run a sweep of DHLLDV slurry scenarios")
+    parser.add_argument('scenario', help="The JSON scenario file")
+    parser.add_argument('-o', '--output', default='results.csv', help="The output file, .csv or .npz")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help="The number of worker processes, 0 to run in this process")
+    parser.add_argument('--checkpoint', help="The file of finished cases, default OUTPUT.done")
+    parser.add_argument('--resume', action='store_true', help="Skip the cases already in the checkpoint file")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Do not report progress")
+    args = parser.parse_args(argv)
+    if args.output.lower().endswith('.npz'):
+        try:
+            import numpy
+        except ImportError:
+            parser.error("NPZ output needs numpy, install it or use a .csv output")
+    with open(args.scenario) as f:
+        scenario = json.load(f)
+    run(scenario, args.output, args.workers, args.checkpoint, args.resume, None if args.quiet else sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
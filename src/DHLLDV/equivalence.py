@@ -0,0 +1,408 @@
+"""
+equivalence - Check fast paths against the scalar reference functions, using golden data
+
+    python -m DHLLDV.equivalence generate golden.dlg -n 256 --seed 1
+    python -m DHLLDV.equivalence check golden.dlg
+
+generate draws a reproducible random set of cases over the valid inputs (pipe diameter,
+particle diameter, concentration, velocity, solids density, fresh or salt water and the
+spread of the GSD), evaluates the scalar reference functions for each, and saves the
+inputs and outputs in a compact binary file. check evaluates every registered fast path
+on the same inputs and reports the cases that differ from the golden outputs by more
+than the tolerance for the quantity.
+
+The regime can change within a tiny change of velocity, so every eighth case is placed on
+a regime boundary, and each case records whether it is within BOUNDARY_DELTA (relative)
+of one. Mismatches in those cases are reported apart and do not fail the check.
+
+Register a fast path with the fast_path decorator. It is called with a case dict (or
+with the list of cases, if batch=True) and returns the quantity:
+
+    @fast_path('My fast Cvt_Erhg', 'Cvt_Erhg')
+    def my_fast_cvt(case):
+        return ...
+"""
+import argparse
+import array
+import json
+import math
+import random
+import struct
+import sys
+import zlib
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV.DHLLDV_constants import steel_roughness, water_density, water_viscosity
+from DHLLDV.surrogate import REGIME_CODES, ErhgTable, LDVTable
+
+MAGIC = b'DHLLDVG1'
+INPUTS = ('vls', 'Dp', 'd', 'Cv', 'rhos', 'rhol', 'nu', 'spread')
+QUANTITIES = ('Cvs_Erhg', 'Cvt_Erhg', 'Cvs_regime', 'Cvt_regime', 'Cvs_boundary', 'Cvt_boundary', 'LDV',
+              'Erhg_graded', 'Wilson_V50', 'Wilson_stratified')
+BOUNDARY_DELTA = 1e-3
+
+# (relative, absolute) tolerance of each quantity, for fast paths that should match exactly
+TOLERANCES = {'Cvs_Erhg': (1e-9, 1e-12),
+              'Cvt_Erhg': (1e-9, 1e-12),
+              'Cvs_regime': (0, 0),
+              'Cvt_regime': (0, 0),
+              'LDV': (1e-9, 1e-12),
+              'Erhg_graded': (1e-9, 1e-12),
+              'Wilson_V50': (1e-9, 1e-12),
+              'Wilson_stratified': (1e-9, 1e-12),
+              }
+FLUIDS = ((water_density[20], water_viscosity[20]),     # fresh
+          (1.0248103, 1.0508e-6))                        # salt
+# The table fast paths build a table of one cell around each case, from x / TABLE_CELL to
+# x * TABLE_CELL ** 1.5 on each axis, and are checked to a few times the error bound
+# (measure_error) of such a table. Erhg and LDV have kinks, so the error is first order.
+TABLE_CELL = 1.001
+TABLE_TOLERANCES = {'Erhg': (1e-3, 1e-12),
+                    'LDV': (1e-4, 1e-12),
+                    }
+
+_fast_paths = {}
+
+
+def sample_cases(n, seed=0, boundary_every=8):
+    """Return n reproducible random cases (dicts of INPUTS) over the valid input space
+
+    boundary_every: Move the velocity of every this many cases onto a regime boundary, 0 for none"""
+    rng = random.Random(seed)
+    cases = []
+    while len(cases) < n:
+        Dp = math.exp(rng.uniform(math.log(0.1), math.log(1.2)))
+        d = math.exp(rng.uniform(math.log(0.05e-3), math.log(20e-3)))
+        if d > 0.05 * Dp:
+            continue
+        rhol, nu = rng.choice(FLUIDS)
+        cases.append({'vls': rng.uniform(0.5, 8.0),
+                      'Dp': Dp,
+                      'd': d,
+                      'Cv': rng.uniform(0.02, 0.35),
+                      'rhos': rng.uniform(2.0, 2.8),
+                      'rhol': rhol,
+                      'nu': nu,
+                      'spread': rng.uniform(1.5, 4.0),
+                      })
+        if boundary_every and len(cases) % boundary_every == 0:
+            _snap_to_boundary(cases[-1], DHLLDV_framework.Cvt_Erhg if rng.random() < 0.5 else
+                              DHLLDV_framework.Cvs_Erhg)
+    return cases
+
+
+def _snap_to_boundary(case, func, tol=1e-10):
+    """Move the velocity of case to the first regime change of func above it (or below, if none)"""
+    args = case_args(case)
+    steps = [0.5 + 0.25 * i for i in range(31)]
+    start = min(range(len(steps)), key=lambda i: abs(steps[i] - case['vls']))
+    order = steps[start:] + steps[start::-1]
+    for lo, hi in zip(order, order[1:]):
+        if lo > hi:
+            lo, hi = hi, lo
+        r_lo = _regime(func, lo, args)
+        if r_lo != _regime(func, hi, args):
+            while hi - lo > tol * hi:
+                mid = (lo + hi) / 2
+                if _regime(func, mid, args) == r_lo:
+                    lo = mid
+                else:
+                    hi = mid
+            case['vls'] = hi
+            return
+
+
+def case_args(case):
+    """Return the (Dp, d, epsilon, nu, rhol, rhos, Cv) arguments of the framework functions"""
+    return case['Dp'], case['d'], steel_roughness, case['nu'], case['rhol'], case['rhos'], case['Cv']
+
+
+def case_GSD(case):
+    """Return the GSD of the case, d50 = d, d85 = d * spread and d15 = d * 1.36 / spread"""
+    d, spread = case['d'], case['spread']
+    return {0.15: d * 1.36 / spread, 0.50: d, 0.85: d * spread}
+
+
+def _regime(func, vls, args):
+    return REGIME_CODES[func(vls, *args, get_dict=True)['regime']]
+
+
+def reference(case):
+    """Return the dict of QUANTITIES for a case, from the scalar reference functions
+
+    Quantities the reference cannot calculate for the case are nan"""
+    from Wilson import Wilson_Stratified, Wilson_V50
+    vls = case['vls']
+    args = case_args(case)
+    Dp, d, epsilon, nu, rhol, rhos, Cv = args
+    result = {}
+    for basis, func in (('Cvs', DHLLDV_framework.Cvs_Erhg), ('Cvt', DHLLDV_framework.Cvt_Erhg)):
+        obj = func(vls, *args, get_dict=True)
+        result[f'{basis}_Erhg'] = obj[obj['regime']]
+        result[f'{basis}_regime'] = REGIME_CODES[obj['regime']]
+        result[f'{basis}_boundary'] = float(_regime(func, vls * (1 - BOUNDARY_DELTA), args) !=
+                                            _regime(func, vls * (1 + BOUNDARY_DELTA), args))
+    result['LDV'] = DHLLDV_framework.LDV(None, *args)
+    try:
+        result['Erhg_graded'] = DHLLDV_framework.Erhg_graded(case_GSD(case), vls, Dp, epsilon, nu, rhol, rhos, Cv,
+                                                             Cvt_eq_Cvs=True)
+    except (StopIteration, ValueError, ZeroDivisionError, KeyError):
+        result['Erhg_graded'] = math.nan
+    result['Wilson_V50'] = Wilson_V50.Erhg(vls, Dp, d, d * case['spread'], epsilon, nu, rhol, rhos, 0.4)
+    result['Wilson_stratified'] = Wilson_Stratified.Erhg(vls, Dp, d, epsilon, nu, rhol, rhos, 0.4, Cv)
+    return result
+
+
+class Golden():
+    """The cases and their reference outputs"""
+    def __init__(self, cases, outputs, seed=None):
+        """cases: The list of case dicts
+        outputs: The dict of {quantity: list of values, one per case}"""
+        self.cases = cases
+        self.outputs = outputs
+        self.seed = seed
+
+    def __len__(self):
+        return len(self.cases)
+
+    @classmethod
+    def generate(cls, n=256, seed=0):
+        """Sample n cases and evaluate the references"""
+        cases = sample_cases(n, seed)
+        refs = [reference(c) for c in cases]
+        return cls(cases, {q: [r[q] for r in refs] for q in QUANTITIES}, seed)
+
+    def save(self, path):
+        """Write the golden data to path
+
+        The file is MAGIC, the length of the JSON header (uint32), the header, then the
+        zlib compressed little endian doubles, one row of INPUTS and quantities per case."""
+        quantities = list(self.outputs)
+        header = json.dumps({'inputs': INPUTS, 'quantities': quantities, 'count': len(self.cases),
+                             'seed': self.seed}).encode()
+        values = array.array('d')
+        for i, case in enumerate(self.cases):
+            values.extend(case[k] for k in INPUTS)
+            values.extend(self.outputs[q][i] for q in quantities)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+            f.write(zlib.compress(values.tobytes(), 9))
+
+    @classmethod
+    def load(cls, path):
+        """Read golden data written by save"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"equivalence: {path} is not a golden data file")
+        size = struct.unpack_from('<I', data, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        header = json.loads(data[start:start + size])
+        values = array.array('d')
+        values.frombytes(zlib.decompress(data[start + size:]))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        inputs, quantities = header['inputs'], header['quantities']
+        width = len(inputs) + len(quantities)
+        rows = [values[i * width:(i + 1) * width] for i in range(header['count'])]
+        cases = [dict(zip(inputs, row[:len(inputs)])) for row in rows]
+        outputs = {q: [row[len(inputs) + j] for row in rows] for j, q in enumerate(quantities)}
+        return cls(cases, outputs, header.get('seed'))
+
+
+class Report():
+    """The result of checking one fast path"""
+    def __init__(self, name, quantity):
+        self.name = name
+        self.quantity = quantity
+        self.checked = 0
+        self.mismatches = []    # (case, expected, got)
+        self.boundary = []      # Mismatches of the cases near a regime boundary
+
+    @property
+    def ok(self):
+        return not self.mismatches
+
+    def __str__(self):
+        lines = [f"{self.name} ({self.quantity}): {self.checked} checked, {len(self.mismatches)} mismatches, "
+                 f"{len(self.boundary)} at regime boundaries"]
+        for case, expected, got in self.mismatches[:10]:
+            inputs = ', '.join(f'{k}={v:0.6g}' for k, v in case.items())
+            lines.append(f"    expected {expected:0.10g}, got {got:0.10g} for {inputs}")
+        return '\n'.join(lines)
+
+
+def _close(expected, got, rtol, atol):
+    if math.isnan(expected) or math.isnan(got):
+        return math.isnan(expected) and math.isnan(got)
+    return abs(got - expected) <= atol + rtol * abs(expected)
+
+
+def check(golden, quantity, fast, batch=False, rtol=None, atol=None, name=None):
+    """Compare fast against the golden outputs of quantity
+
+    fast: Called with each case dict (or the list of all the cases if batch) for the value(s)
+    rtol, atol: The tolerances, default from TOLERANCES
+    returns a Report"""
+    default_rtol, default_atol = TOLERANCES.get(quantity, (1e-9, 1e-12))
+    rtol = default_rtol if rtol is None else rtol
+    atol = default_atol if atol is None else atol
+    values = fast(golden.cases) if batch else [fast(c) for c in golden.cases]
+    boundary = golden.outputs.get('Cvt_boundary' if quantity.startswith('Cvt') or quantity == 'Erhg_graded'
+                                  else 'Cvs_boundary')
+    report = Report(name or getattr(fast, '__name__', 'fast path'), quantity)
+    for i, (case, expected, got) in enumerate(zip(golden.cases, golden.outputs[quantity], values)):
+        report.checked += 1
+        if not _close(expected, float(got), rtol, atol):
+            if boundary is not None and boundary[i]:
+                report.boundary.append((case, expected, got))
+            else:
+                report.mismatches.append((case, expected, got))
+    return report
+
+
+def fast_path(name, quantity, batch=False, rtol=None, atol=None):
+    """Decorator to register a fast path to check against quantity"""
+    def decorator(func):
+        _fast_paths[name] = (quantity, func, batch, rtol, atol)
+        return func
+    return decorator
+
+
+def fast_paths():
+    """Return the names of the registered fast paths"""
+    return list(_fast_paths)
+
+
+def check_all(golden, names=None):
+    """Check the registered fast paths (default all) against golden, returns a list of Reports"""
+    reports = []
+    for name in names or fast_paths():
+        quantity, func, batch, rtol, atol = _fast_paths[name]
+        reports.append(check(golden, quantity, func, batch, rtol, atol, name))
+    return reports
+
+
+@fast_path('references', 'Cvt_Erhg')
+def _reference_cvt(case):
+    """The scalar reference itself, to catch changes to the framework"""
+    return DHLLDV_framework.Cvt_Erhg(case['vls'], *case_args(case))
+
+
+@fast_path('service batch', 'Cvt_Erhg', batch=True)
+def _service_cvt(cases):
+    from DHLLDV.service import Service
+    requests = [{'id': i, 'method': 'Cvt_Erhg',
+                 'params': dict(zip(('Dp', 'd', 'epsilon', 'nu', 'rhol', 'rhos', 'Cv'), case_args(c)), vls=c['vls'])}
+                for i, c in enumerate(cases)]
+    return [r['result'] for r in Service().handle_batch(requests)]
+
+
+@fast_path('HeadLossModels DHLLDV graded Cvt', 'Erhg_graded')
+def _models_graded(case):
+    from DHLLDV.HeadLossModels import SlurrySpec, evaluate
+    GSD = case_GSD(case)
+    Dp, d, epsilon, nu, rhol, rhos, Cv = case_args(case)
+    spec = SlurrySpec(Dp=Dp, d50=d, d85=GSD[0.85], d15=GSD[0.15], epsilon=epsilon, nu=nu, rhol=rhol, rhos=rhos, Cv=Cv)
+    try:
+        return evaluate('DHLLDV graded Cvt', spec, [case['vls']])['Erhg'][0]
+    except (StopIteration, ValueError, ZeroDivisionError, KeyError):
+        return math.nan
+
+
+@fast_path('Wilson_V50.Erhg_list', 'Wilson_V50')
+def _wilson_v50_list(case):
+    from Wilson import Wilson_V50
+    Dp, d, epsilon, nu, rhol, rhos, Cv = case_args(case)
+    return Wilson_V50.Erhg_list([case['vls']], Dp, d, d * case['spread'], epsilon, nu, rhol, rhos, 0.4)[0]
+
+
+@fast_path('Wilson_Stratified.Erhg_grid', 'Wilson_stratified')
+def _wilson_stratified_grid(case):
+    from Wilson import Wilson_Stratified
+    Dp, d, epsilon, nu, rhol, rhos, Cv = case_args(case)
+    return Wilson_Stratified.Erhg_grid([case['vls']], Dp, [d], epsilon, nu, rhol, rhos, 0.4, [Cv])[0][0][0]
+
+
+def _table_axis(x):
+    return x / TABLE_CELL, x * TABLE_CELL ** 1.5, 2
+
+
+def _table_fluid(case):
+    return 'fresh' if (case['rhol'], case['nu']) == FLUIDS[0] else 'salt'
+
+
+def _erhg_table(basis, case):
+    table = ErhgTable.build(basis, _table_fluid(case), case['rhos'], Dp=_table_axis(case['Dp']),
+                            d=_table_axis(case['d']), Cv=_table_axis(case['Cv']), vls=_table_axis(case['vls']),
+                            error_samples=0)
+    return table.Erhg(case['vls'], case['Dp'], case['d'], case['Cv'])
+
+
+@fast_path('surrogate.ErhgTable Cvs', 'Cvs_Erhg', rtol=TABLE_TOLERANCES['Erhg'][0], atol=TABLE_TOLERANCES['Erhg'][1])
+def _erhg_table_cvs(case):
+    return _erhg_table('Cvs', case)
+
+
+@fast_path('surrogate.ErhgTable Cvt', 'Cvt_Erhg', rtol=TABLE_TOLERANCES['Erhg'][0], atol=TABLE_TOLERANCES['Erhg'][1])
+def _erhg_table_cvt(case):
+    return _erhg_table('Cvt', case)
+
+
+def _ldv_table(case):
+    return LDVTable.build(_table_fluid(case), case['rhos'], Dp=_table_axis(case['Dp']), d=_table_axis(case['d']),
+                          Cv=_table_axis(case['Cv']), error_samples=0)
+
+
+@fast_path('surrogate.LDVTable', 'LDV', rtol=TABLE_TOLERANCES['LDV'][0], atol=TABLE_TOLERANCES['LDV'][1])
+def _ldv_table_ldv(case):
+    return _ldv_table(case).LDV(case['Dp'], case['d'], case['Cv'])
+
+
+@fast_path('DHLLDV_framework.use_LDV_table', 'LDV', rtol=TABLE_TOLERANCES['LDV'][0], atol=TABLE_TOLERANCES['LDV'][1])
+def _use_ldv_table(case):
+    previous = DHLLDV_framework.LDV_table
+    DHLLDV_framework.use_LDV_table(_ldv_table(case))
+    try:
+        return DHLLDV_framework.LDV(None, *case_args(case))
+    finally:
+        DHLLDV_framework.use_LDV_table(previous)
+
+
+@fast_path('regimes cached Cvs_regime', 'Cvs_regime')
+def _cached_cvs_regime(case):
+    from DHLLDV.regimes import regime_code
+    return REGIME_CODES[regime_code(case['vls'], *case_args(case), basis='Cvs')]
+
+
+@fast_path('regimes cached Cvt_regime', 'Cvt_regime')
+def _cached_cvt_regime(case):
+    from DHLLDV.regimes import regime_code
+    return REGIME_CODES[regime_code(case['vls'], *case_args(case), basis='Cvt')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m DHLLDV.equivalence',
+                                     description="Check the DHLLDV fast paths against golden data")
+    commands = parser.add_subparsers(dest='command', required=True)
+    gen = commands.add_parser('generate', help="Generate the golden data from the scalar references")
+    gen.add_argument('path')
+    gen.add_argument('-n', type=int, default=256, help="The number of cases")
+    gen.add_argument('--seed', type=int, default=0)
+    chk = commands.add_parser('check', help="Check the fast paths against the golden data")
+    chk.add_argument('path')
+    chk.add_argument('-k', dest='names', action='append', help="Only check this fast path")
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        Golden.generate(args.n, args.seed).save(args.path)
+        return 0
+    reports = check_all(Golden.load(args.path), args.names)
+    for report in reports:
+        print(report)
+    return 0 if all(r.ok for r in reports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
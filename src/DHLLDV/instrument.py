@@ -0,0 +1,203 @@
+"""
+instrument - Opt in call counts and timings for the framework functions
+
+    from DHLLDV import instrument, SlurryObj
+
+    with instrument.profile() as stats:
+        SlurryObj.Slurry()
+    print(instrument.report(stats))
+
+While enabled, the functions in MODULES (module functions and the methods of their
+classes) are replaced by wrappers that record, per function:
+    calls: The number of calls
+    total: The cumulative time, including the functions it calls (sec)
+    self: The time in the function itself (sec)
+    iterations: The loop steps taken by the iterative solvers, as reported to telemetry
+disable() puts the original functions back, so there is no cost when not in use. The
+stats can be exported as a dict, as JSON, or as a cProfile file for pstats and snakeviz.
+"""
+import functools
+import importlib
+import inspect
+import json
+import marshal
+import threading
+import time
+
+MODULES = ('homogeneous', 'heterogeneous', 'stratified', 'DHLLDV_framework', 'PumpObj', 'PipeObj')
+
+enabled = False
+_originals = []         # (owner, attribute name, original) to restore
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Record():
+    """The stats for one function"""
+    __slots__ = ('calls', 'total', 'self', 'iterations', 'callers', 'code')
+
+    def __init__(self, code=None):
+        self.calls = 0
+        self.total = 0.0
+        self.self = 0.0
+        self.iterations = 0
+        self.callers = {}   # caller name: [calls, total, self]
+        self.code = code    # (file, line, name) for pstats
+
+    def as_dict(self):
+        return {'calls': self.calls, 'total': self.total, 'self': self.self, 'iterations': self.iterations}
+
+
+stats = {}              # name: Record for the current (or last) run
+
+
+def _record(name, code=None):
+    rec = stats.get(name)
+    if rec is None:
+        rec = stats[name] = Record((name.split('.')[0] + '.py', 0, name))
+    if code is not None:
+        rec.code = code
+    return rec
+
+
+def _wrap(name, func):
+    """Return the timing wrapper for func, recorded under name"""
+    code = func.__code__
+    code = (code.co_filename, code.co_firstlineno, code.co_name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append([name, 0.0])
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            child = stack.pop()[1]
+            caller = stack[-1][0] if stack else None
+            if stack:
+                stack[-1][1] += elapsed
+            with _lock:
+                rec = _record(name, code)
+                rec.calls += 1
+                rec.total += elapsed
+                rec.self += elapsed - child
+                if caller is not None:
+                    c = rec.callers.setdefault(caller, [0, 0.0, 0.0])
+                    c[0] += 1
+                    c[1] += elapsed
+                    c[2] += elapsed - child
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def _targets(module):
+    """Yield (owner, attribute, function, name) for the functions and methods to wrap in module"""
+    short = module.__name__.rsplit('.', 1)[-1]
+    for attr, value in list(vars(module).items()):
+        if inspect.isfunction(value) and value.__module__ == module.__name__:
+            yield module, attr, value, f'{short}.{value.__name__}'
+        elif inspect.isclass(value) and value.__module__ == module.__name__:
+            for mattr, mvalue in list(vars(value).items()):
+                if mattr.startswith('__'):
+                    continue
+                if isinstance(mvalue, staticmethod):
+                    yield value, mattr, mvalue, f'{short}.{value.__name__}.{mattr}'
+                elif inspect.isfunction(mvalue):
+                    yield value, mattr, mvalue, f'{short}.{value.__name__}.{mattr}'
+
+
+def enable(modules=MODULES, reset=True):
+    """Start recording the functions in modules (names of DHLLDV modules)
+
+    reset: If True clear the stats from earlier runs"""
+    global enabled
+    if enabled:
+        disable()
+    if reset:
+        stats.clear()
+    wrappers = {}   # id(original): wrapper, so aliases (vls_lsdv = vls_FBSB) share one
+    for module_name in modules:
+        module = importlib.import_module(f'DHLLDV.{module_name}')
+        for owner, attr, value, name in _targets(module):
+            func = value.__func__ if isinstance(value, staticmethod) else value
+            wrapper = wrappers.get(id(func))
+            if wrapper is None:
+                wrapper = wrappers[id(func)] = _wrap(name, func)
+            _originals.append((owner, attr, value))
+            setattr(owner, attr, staticmethod(wrapper) if isinstance(value, staticmethod) else wrapper)
+    enabled = True
+    _solvers_report()
+
+
+def disable():
+    """Stop recording and put the original functions back"""
+    global enabled
+    while _originals:
+        owner, attr, value = _originals.pop()
+        setattr(owner, attr, value)
+    enabled = False
+    _solvers_report()
+
+
+def _solvers_report():
+    """Have the solvers report their steps (through telemetry) while enabled"""
+    from DHLLDV import telemetry
+    telemetry.update_enabled()
+
+
+def iterations(name, steps):
+    """Add the steps taken by an iterative solver to its stats, called by telemetry.record"""
+    with _lock:
+        _record(name).iterations += steps
+
+
+class profile():
+    """Context manager to record the functions in modules, yields the stats dict"""
+    def __init__(self, modules=MODULES):
+        self.modules = modules
+
+    def __enter__(self):
+        enable(self.modules)
+        return stats
+
+    def __exit__(self, *exc):
+        disable()
+
+
+def as_dict(s=None):
+    """Return the stats as a dict of {name: {'calls', 'total', 'self', 'iterations'}}"""
+    return {name: rec.as_dict() for name, rec in (stats if s is None else s).items()}
+
+
+def to_json(s=None, **kwargs):
+    """Return the stats as JSON, kwargs go to json.dumps"""
+    return json.dumps(as_dict(s), **kwargs)
+
+
+def pstats_dict(s=None):
+    """Return the stats in the format of cProfile's stats, for pstats.Stats"""
+    s = stats if s is None else s
+    result = {}
+    for name, rec in s.items():
+        callers = {s[c].code: (n, n, self_t, total) for c, (n, total, self_t) in rec.callers.items() if c in s}
+        result[rec.code] = (rec.calls, rec.calls, rec.self, rec.total, callers)
+    return result
+
+
+def dump_stats(path, s=None):
+    """Write the stats to path in the cProfile file format, read it with pstats.Stats(path)"""
+    with open(path, 'wb') as f:
+        marshal.dump(pstats_dict(s), f)
+
+
+def report(s=None, limit=20):
+    """Return a table of the functions with the most self time"""
+    s = stats if s is None else s
+    lines = [f"{'function':45s} {'calls':>9s} {'total (s)':>10s} {'self (s)':>10s} {'iterations':>10s}"]
+    for name, rec in sorted(s.items(), key=lambda item: -item[1].self)[:limit]:
+        lines.append(f"{name:45s} {rec.calls:9d} {rec.total:10.4f} {rec.self:10.4f} {rec.iterations:10d}")
+    return '\n'.join(lines)
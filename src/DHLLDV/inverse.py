@@ -0,0 +1,178 @@
+"""
+inverse - Solve for the velocity, concentration or flow that gives a target head loss
+
+    from DHLLDV import inverse
+    inverse.velocities_for_im(0.08, Dp, d, epsilon, nu, rhol, rhos, Cvt)    # [5.49, 8.97]
+    inverse.Cv_for_im(0.08, vls, Dp, d, epsilon, nu, rhol, rhos)            # [0.120]
+    inverse.flows_for_head(80.0, pipeline)                                   # [2.17, 3.81]
+    inverse.max_Cv_for_head(80.0, pipeline, Q)                               # 0.210
+
+The im of a slurry is not monotonic in the velocity (it falls to a minimum near the LDV
+and rises again), and the regimes make kinks in it, so a target can be met more than once.
+The functions return every root in the range, in increasing order.
+
+Each is built on a Curve: the head function sampled at steps points over the range once,
+then for each target the sign changes of (head - target) are refined with find_root. Pass
+a list of targets to Curve.roots_list to solve them all against one scan:
+
+    curve = inverse.im_vls_curve(Dp, d, epsilon, nu, rhol, rhos, Cvt)
+    curve.roots_list([0.05, 0.06, 0.07])    # [[...], [...], [...]]
+
+A target met twice between two sampled points (a narrow dip of the curve) is not found,
+increase steps to resolve it. The Cvt is limited to CV_RANGE by default, as at higher Cvt
+the Cvs of a slow slurry can exceed the bed concentration, where the model is undefined.
+"""
+from DHLLDV import DHLLDV_framework
+from DHLLDV import homogeneous
+from DHLLDV.DHLLDV_constants import gravity
+from DHLLDV.DHLLDV_Utils import find_root
+
+STEPS = 48
+VLS_RANGE = (0.5, 10.0)     # The default velocity range (m/sec)
+CV_RANGE = (0.005, 0.4)     # The default concentration range
+
+
+class Curve():
+    """A function of one variable sampled from lo to hi, to find where it equals targets
+
+    f: The function
+    lo, hi: The range of the variable
+    steps: The number of samples
+    xtol: The absolute tolerance of the roots, default (hi - lo) * 1e-9"""
+    def __init__(self, f, lo, hi, steps=STEPS, xtol=None):
+        self.f = f
+        self.xs = [lo + (hi - lo) * i / (steps - 1) for i in range(steps - 1)] + [hi]
+        self.ys = [f(x) for x in self.xs]
+        self.xtol = xtol if xtol is not None else (hi - lo) * 1e-9
+
+    def roots(self, target):
+        """Return the list of x where f(x) == target, in increasing order"""
+        found = []
+        xs, ys = self.xs, self.ys
+        if ys[0] == target:
+            found.append(xs[0])
+        for x0, x1, y0, y1 in zip(xs, xs[1:], ys, ys[1:]):
+            if y1 == target:
+                found.append(x1)
+            elif y0 != target and (y0 > target) != (y1 > target):
+                found.append(find_root(lambda x: self.f(x) - target, x0, x1, xtol=self.xtol))
+        return found
+
+    def roots_list(self, targets):
+        """Return the list of roots for each target in targets"""
+        return [self.roots(target) for target in targets]
+
+
+def _im(Erhg, vls, Dp, epsilon, nu, rhol, rhos, Cv):
+    return Erhg * (rhos - rhol) / rhol * Cv + homogeneous.fluid_head_loss(vls, Dp, epsilon, nu, rhol)
+
+
+def im_vls_curve(Dp, d, epsilon, nu, rhol, rhos, Cvt, vls_range=VLS_RANGE, steps=STEPS):
+    """Return the Curve of the im (Cvt_Erhg) of a slurry against the velocity"""
+    return Curve(lambda vls: _im(DHLLDV_framework.Cvt_Erhg(vls, Dp, d, epsilon, nu, rhol, rhos, Cvt),
+                                 vls, Dp, epsilon, nu, rhol, rhos, Cvt),
+                 *vls_range, steps)
+
+
+def im_Cv_curve(vls, Dp, d, epsilon, nu, rhol, rhos, Cv_range=CV_RANGE, steps=STEPS):
+    """Return the Curve of the im (Cvt_Erhg) of a slurry at vls against the Cvt"""
+    return Curve(lambda Cvt: _im(DHLLDV_framework.Cvt_Erhg(vls, Dp, d, epsilon, nu, rhol, rhos, Cvt),
+                                 vls, Dp, epsilon, nu, rhol, rhos, Cvt),
+                 *Cv_range, steps)
+
+
+def _graded_im(fracs, vls, Dp, epsilon, nu, rhol, rhos, Cv):
+    Erhg = DHLLDV_framework.Erhg_graded(fracs, vls, Dp, epsilon, nu, rhol, rhos, Cv, Cvt_eq_Cvs=True, num_fracs=None)
+    return _im(Erhg, vls, Dp, epsilon, nu, rhol, rhos, Cv)
+
+
+def graded_im_vls_curve(GSD, Dp, epsilon, nu, rhol, rhos, Cvt, vls_range=VLS_RANGE, steps=STEPS):
+    """Return the Curve of the im (Erhg_graded, Cvt) of a graded slurry against the velocity"""
+    fracs = DHLLDV_framework.create_fracs(GSD, Dp, nu, rhol, rhos)
+    return Curve(lambda vls: _graded_im(fracs, vls, Dp, epsilon, nu, rhol, rhos, Cvt), *vls_range, steps)
+
+
+def graded_im_Cv_curve(GSD, vls, Dp, epsilon, nu, rhol, rhos, Cv_range=CV_RANGE, steps=STEPS):
+    """Return the Curve of the im (Erhg_graded, Cvt) of a graded slurry at vls against the Cvt"""
+    fracs = DHLLDV_framework.create_fracs(GSD, Dp, nu, rhol, rhos)
+    return Curve(lambda Cvt: _graded_im(fracs, vls, Dp, epsilon, nu, rhol, rhos, Cvt), *Cv_range, steps)
+
+
+def system_head(pipeline, Q, Cv):
+    """Return the slurry system head (m of water) of pipeline at flow Q (m3/sec) and concentration Cv
+
+    This is Pipeline.calc_system_head(Q)[0] with the graded Cvt im of each section calculated at
+    the exact velocity and Cv, without changing the pipeline"""
+    H = 0.0
+    Hminor = 0.0
+    for i, p in enumerate(pipeline.pipesections):
+        s = pipeline.slurries[p.diameter]
+        v = p.velocity(Q)
+        H += _graded_im(s.GSD, v, s.Dp, s.epsilon, s.nu, s.rhol, s.rhos, Cv) * p.length
+        Hminor += p.total_K * v ** 2 / (2 * gravity) + (p.elev_change if i > 0 else 0.0)
+    Hminor += pipeline.pipesections[-1].velocity(Q) ** 2 / (2 * gravity)
+    slurry = pipeline.slurry
+    return H + Hminor * (Cv * (slurry.rhos - slurry.rhol) + slurry.rhol)
+
+
+def head_Q_curve(pipeline, Q_range=None, steps=STEPS):
+    """Return the Curve of the slurry system head (see system_head) at the Cv of the pipeline
+    against the flow
+
+    Q_range: (low, high) flow in m3/sec, default the velocity range of the slurry in the last section"""
+    if Q_range is None:
+        pipe = pipeline.pipesections[-1]
+        vls_list = pipeline.slurries[pipe.diameter].vls_list
+        Q_range = (pipe.flow(vls_list[0]), pipe.flow(vls_list[-1]))
+    return Curve(lambda Q: system_head(pipeline, Q, pipeline.Cv), *Q_range, steps)
+
+
+def head_Cv_curve(pipeline, Q, Cv_range=CV_RANGE, steps=STEPS):
+    """Return the Curve of the slurry system head (see system_head) at flow Q against the Cv"""
+    return Curve(lambda Cv: system_head(pipeline, Q, Cv), *Cv_range, steps)
+
+
+def velocities_for_im(target, Dp, d, epsilon, nu, rhol, rhos, Cvt, vls_range=VLS_RANGE, steps=STEPS):
+    """
+    Return the list of velocities where the im of the slurry is target
+    target = The hydraulic gradient (m water/m)
+    Dp = Pipe diameter (m)
+    d = Particle diameter (m)
+    epsilon = absolute pipe roughness (m)
+    nu = fluid kinematic viscosity in m2/sec
+    rhol = density of the fluid (ton/m3)
+    rhos = particle density (ton/m3)
+    Cvt = transported volume concentration
+    vls_range = (low, high) velocity (m/sec)
+    """
+    return im_vls_curve(Dp, d, epsilon, nu, rhol, rhos, Cvt, vls_range, steps).roots(target)
+
+
+def Cv_for_im(target, vls, Dp, d, epsilon, nu, rhol, rhos, Cv_range=CV_RANGE, steps=STEPS):
+    """Return the list of Cvt where the im of the slurry at vls is target, see velocities_for_im"""
+    return im_Cv_curve(vls, Dp, d, epsilon, nu, rhol, rhos, Cv_range, steps).roots(target)
+
+
+def velocities_for_im_graded(target, GSD, Dp, epsilon, nu, rhol, rhos, Cvt, vls_range=VLS_RANGE, steps=STEPS):
+    """Return the list of velocities where the im of the graded slurry is target"""
+    return graded_im_vls_curve(GSD, Dp, epsilon, nu, rhol, rhos, Cvt, vls_range, steps).roots(target)
+
+
+def Cv_for_im_graded(target, GSD, vls, Dp, epsilon, nu, rhol, rhos, Cv_range=CV_RANGE, steps=STEPS):
+    """Return the list of Cvt where the im of the graded slurry at vls is target"""
+    return graded_im_Cv_curve(GSD, vls, Dp, epsilon, nu, rhol, rhos, Cv_range, steps).roots(target)
+
+
+def flows_for_head(target, pipeline, Q_range=None, steps=STEPS):
+    """Return the list of flows (m3/sec) where the slurry system head of pipeline is target (m water)"""
+    return head_Q_curve(pipeline, Q_range, steps).roots(target)
+
+
+def max_Cv_for_head(available, pipeline, Q, Cv_range=CV_RANGE, steps=STEPS):
+    """Return the highest Cv in Cv_range that the available head (m water) can sustain at flow Q,
+    or None if the head is not enough for any"""
+    curve = head_Cv_curve(pipeline, Q, Cv_range, steps)
+    if curve.ys[-1] <= available:
+        return curve.xs[-1]
+    roots = curve.roots(available)
+    return roots[-1] if roots else None
@@ -0,0 +1,137 @@
+"""
+optimum - The velocity of minimum hydraulic gradient (im) of a slurry
+
+    from DHLLDV import optimum
+    optimum.minimum_im(Dp, d, epsilon, nu, rhol, rhos, Cv, basis='Cvt')
+        -> {'vls': 7.00, 'im': 0.0703, 'il': 0.0375, 'Erhg': 0.118, 'specific_energy': 1.52,
+            'LDV': 5.89, 'regime': 'He'}
+    optimum.minimum_im_list(Dp, d, epsilon, nu, rhol, rhos, [0.1, 0.2, 0.3])
+    optimum.minimum_im_graded(GSD, Dp, epsilon, nu, rhol, rhos, Cv)
+    optimum.minimum_im_graded_list([GSD1, GSD2], Dp, epsilon, nu, rhol, rhos, [0.1, 0.2, 0.3])
+
+The minimum of im is near the LDV, so the search starts from the LDV (of the d50 for a
+graded slurry), steps out by BRACKET_STEP until im rises on both sides, then finds the
+minimum with DHLLDV_Utils.find_minimum to within XTOL. This is the minimum nearest the
+LDV; on the Cvs basis im also falls towards zero velocity in the fixed bed regime.
+
+specific_energy is the energy to transport a ton of solids a metre, im * rhol * g / (rhos * Cv),
+in kJ/(ton m), taking Cv as the delivered concentration.
+
+The graded functions divide each GSD into fractions (create_fracs) once, and use the
+fractions at every velocity.
+"""
+from DHLLDV import DHLLDV_framework
+from DHLLDV import homogeneous
+from DHLLDV.DHLLDV_constants import gravity
+from DHLLDV.DHLLDV_Utils import find_minimum
+
+BRACKET_STEP = 1.25
+XTOL = 1e-4         # The tolerance of the velocity (m/sec)
+VMIN = 0.1          # The velocity range searched (m/sec)
+VMAX = 20.0
+
+
+def _bracket(im, seed):
+    """Return (low, high) around a minimum of im, stepping out from seed"""
+    low, high = seed / BRACKET_STEP, seed * BRACKET_STEP
+    im_seed = im(seed)
+    im_low = im(low)
+    if im_low < im_seed:
+        while low > VMIN and im_low < im_seed:
+            high, seed, im_seed = seed, low, im_low
+            low = seed / BRACKET_STEP
+            im_low = im(low)
+    else:
+        im_high = im(high)
+        while high < VMAX and im_high < im_seed:
+            low, seed, im_seed = seed, high, im_high
+            high = seed * BRACKET_STEP
+            im_high = im(high)
+    return max(low, VMIN), min(high, VMAX)
+
+
+def _result(vls, im, il, Rsd, rhol, rhos, Cv, LDV):
+    return {'vls': vls,
+            'im': im,
+            'il': il,
+            'Erhg': (im - il) / (Rsd * Cv),
+            'specific_energy': im * rhol * gravity / (rhos * Cv),
+            'LDV': LDV,
+            }
+
+
+def minimum_im(Dp, d, epsilon, nu, rhol, rhos, Cv, basis='Cvt'):
+    """
+    Return the dict of the velocity of minimum im, and the im, il, Erhg, specific energy, LDV
+    and regime there
+    Dp = Pipe diameter (m)
+    d = Particle diameter (m)
+    epsilon = absolute pipe roughness (m)
+    nu = fluid kinematic viscosity in m2/sec
+    rhol = density of the fluid (ton/m3)
+    rhos = particle density (ton/m3)
+    Cv = insitu (basis='Cvs') or transported (basis='Cvt') volume concentration
+    """
+    Erhg = DHLLDV_framework.Cvt_Erhg if basis == 'Cvt' else DHLLDV_framework.Cvs_Erhg
+    Rsd = (rhos - rhol) / rhol  # Eqn 8.2-1
+
+    def im(vls):
+        return Erhg(vls, Dp, d, epsilon, nu, rhol, rhos, Cv) * Rsd * Cv + \
+            homogeneous.fluid_head_loss(vls, Dp, epsilon, nu, rhol)
+
+    LDV = DHLLDV_framework.LDV(None, Dp, d, epsilon, nu, rhol, rhos, Cv)
+    vls, im_min = find_minimum(im, *_bracket(im, LDV), xtol=XTOL)
+    result = _result(vls, im_min, homogeneous.fluid_head_loss(vls, Dp, epsilon, nu, rhol), Rsd, rhol, rhos, Cv, LDV)
+    result['regime'] = Erhg(vls, Dp, d, epsilon, nu, rhol, rhos, Cv, get_dict=True)['regime']
+    return result
+
+
+def minimum_im_list(Dp, d, epsilon, nu, rhol, rhos, Cv_list, basis='Cvt'):
+    """Return the list of minimum_im for each concentration in Cv_list"""
+    return [minimum_im(Dp, d, epsilon, nu, rhol, rhos, Cv, basis) for Cv in Cv_list]
+
+
+def _d50(GSD):
+    """Return the d50 of a GSD, interpolated in the log of the diameters"""
+    fracs = sorted(GSD)
+    for low, high in zip(fracs, fracs[1:]):
+        if low <= 0.5 <= high:
+            return GSD[low] * (GSD[high] / GSD[low]) ** ((0.5 - low) / (high - low))
+    return GSD[min(fracs, key=lambda f: abs(f - 0.5))]
+
+
+def minimum_im_graded(GSD, Dp, epsilon, nu, rhol, rhos, Cv, basis='Cvt', fracs=None):
+    """
+    Return the dict of the velocity of minimum im of a graded slurry, and the im, il, Erhg,
+    specific energy and LDV (of the d50) there
+    GSD = Particle size distribution dict: {x:d_x, y:d_y, ...}, len(GSD>2)
+    Dp = Pipe diameter (m)
+    epsilon = absolute pipe roughness (m)
+    nu = fluid kinematic viscosity in m2/sec
+    rhol = density of the fluid (ton/m3)
+    rhos = particle density (ton/m3)
+    Cv = volume concentration, Cvt (basis='Cvt') or Cvs (basis='Cvs')
+    fracs = The fractions of the GSD from create_fracs, if already calculated
+    """
+    if fracs is None:
+        fracs = DHLLDV_framework.create_fracs(GSD, Dp, nu, rhol, rhos)
+    Rsd = (rhos - rhol) / rhol  # Eqn 8.2-1
+
+    def im(vls):
+        return DHLLDV_framework.Erhg_graded(fracs, vls, Dp, epsilon, nu, rhol, rhos, Cv, Cvt_eq_Cvs=basis == 'Cvt',
+                                            num_fracs=None) * Rsd * Cv + \
+            homogeneous.fluid_head_loss(vls, Dp, epsilon, nu, rhol)
+
+    LDV = DHLLDV_framework.LDV(None, Dp, _d50(GSD), epsilon, nu, rhol, rhos, Cv)
+    vls, im_min = find_minimum(im, *_bracket(im, LDV), xtol=XTOL)
+    return _result(vls, im_min, homogeneous.fluid_head_loss(vls, Dp, epsilon, nu, rhol), Rsd, rhol, rhos, Cv, LDV)
+
+
+def minimum_im_graded_list(GSD_list, Dp, epsilon, nu, rhol, rhos, Cv_list, basis='Cvt'):
+    """Return the minimum_im_graded for each GSD in GSD_list and concentration in Cv_list,
+    as a list (by GSD) of lists (by Cv)"""
+    results = []
+    for GSD in GSD_list:
+        fracs = DHLLDV_framework.create_fracs(GSD, Dp, nu, rhol, rhos)
+        results.append([minimum_im_graded(GSD, Dp, epsilon, nu, rhol, rhos, Cv, basis, fracs) for Cv in Cv_list])
+    return results
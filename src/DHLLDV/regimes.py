@@ -0,0 +1,380 @@
+"""
+regimes - The velocities where the flow regime of a slurry changes
+
+    from DHLLDV import regimes
+    regimes.boundaries(Dp, d, epsilon, nu, rhol, rhos, Cv)
+        -> ((1.62, 'FB', 'SB'), (3.05, 'SB', 'He'), (6.71, 'He', 'Ho'))
+    regimes.boundaries_list(Dp, [d1, d2], epsilon, nu, rhol, rhos, [Cv1, Cv2, Cv3])
+        -> [[boundaries of d1, Cv1, ...Cv3], [boundaries of d2, Cv1, ...Cv3]]
+    regimes.regime(vls, Dp, d, epsilon, nu, rhol, rhos, Cv)    # 'SB'
+
+The regime of DHLLDV_framework.Cvs_Erhg (or Cvt_Erhg with basis='Cvt') is the model
+whose Erhg is chosen, so the regime changes where the Erhg of two models are equal.
+boundaries scans SCAN_STEPS log spaced velocities from VMIN to VMAX for the regime
+changes, then finds each transition velocity with find_root on the difference of the
+Erhg of the regimes either side. The regime is then checked in the middle of each interval
+and either side of each transition, and the interval is divided where it is not the one
+expected, so a regime narrower than the scan (a short sliding bed) is found. At low
+velocity the Erhg of a coarse slurry can be complex, and for Cvt the Cvs can exceed the
+bed concentration, so the scan starts at the lowest velocity where the model is defined.
+
+The boundaries are cached by slurry, so regime is a comparison of vls with them. It
+agrees with Cvs_regime except within XTOL of a boundary, and uses Cvs_Erhg (or Cvt_Erhg)
+below the lowest defined velocity, above VMAX, and for a slurry where the model is not
+defined over the whole range above the lowest (boundaries is then empty).
+
+A RegimeMap holds the regime codes (see CODES, and UNDEFINED where the model is not) on a
+grid of velocity and concentration, or velocity and particle diameter, filled row by row
+from the boundaries, with the boundaries as polylines. It is saved as a surrogate table file:
+
+    python -m DHLLDV.regimes map cv_map.dlt --axis Cv 0.02 0.4 39 --vls 0.5 10 96 --basis Cvt
+    python -m DHLLDV.regimes map d_map.dlt --axis d 0.05e-3 10e-3 40 --Cv 0.2 --workers 4
+    python -m DHLLDV.regimes show cv_map.dlt
+"""
+import argparse
+import array
+import os
+import sys
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from math import exp, log
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV.DHLLDV_constants import steel_roughness
+from DHLLDV.DHLLDV_Utils import find_root
+from DHLLDV.surrogate import FLUIDS, REGIME_CODES as CODES, GridTable, log_axis
+
+VMIN = 0.1          # The velocity range scanned (m/sec)
+VMAX = 20.0
+SCAN_STEPS = 48
+XTOL = 1e-9         # The tolerance of the transition velocities (m/sec)
+CHECK = 1e-6        # The regime is checked this fraction either side of each transition
+REFINE_DEPTH = 8    # The most times a scan interval is divided to find narrow regimes
+UNDEFINED = -1      # The regime code in a map where the model is not defined
+NAMES = {'FB': 'fixed bed',
+         'SB': 'sliding bed',
+         'He': 'heterogeneous',
+         'Ho': 'homogeneous',
+         }
+# The errors of the models where they are not defined: a complex Erhg (TypeError) at low
+# velocity for coarse slurries, or a Cvs above the bed concentration (IndexError) for Cvt
+_UNDEFINED = (IndexError, TypeError, ValueError, ZeroDivisionError)
+_Erhg = {'Cvs': DHLLDV_framework.Cvs_Erhg,
+         'Cvt': DHLLDV_framework.Cvt_Erhg,
+         }
+
+
+def _scan_velocities():
+    step = log(VMAX / VMIN) / (SCAN_STEPS - 1)
+    return [VMIN] + [VMIN * exp(i * step) for i in range(1, SCAN_STEPS - 1)] + [VMAX]
+
+
+def _regime_obj(func, vls, args):
+    """Return the Erhg dict of func at vls, or None where the model is not real"""
+    try:
+        return func(vls, *args, get_dict=True)
+    except _UNDEFINED:
+        return None
+
+
+def _transition(func, args, lo, hi, obj_lo, obj_hi):
+    """Return the velocity between lo and hi where the regime changes"""
+    below, above = obj_lo['regime'], obj_hi['regime']
+
+    def difference(vls):
+        obj = func(vls, *args, get_dict=True)
+        return obj[below] - obj[above]
+
+    if (obj_lo[below] - obj_lo[above] > 0) != (obj_hi[below] - obj_hi[above] > 0):
+        return find_root(difference, lo, hi, xtol=XTOL)
+    # Some other regime comes between, bisect on the regime itself
+    while hi - lo > XTOL:
+        mid = (lo + hi) / 2
+        if func(mid, *args, get_dict=True)['regime'] == below:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+
+def _lowest_real(func, args, lo, hi):
+    """Return the lowest velocity between lo (not real) and hi (real) where func is real"""
+    while hi - lo > XTOL:
+        mid = (lo + hi) / 2
+        if _regime_obj(func, mid, args) is None:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+
+def _segment(func, args, lo, hi, obj_lo, obj_hi, depth=0):
+    """Return (velocities, regimes) of the regime changes from lo to hi, regimes[0] at lo
+
+    The regime is checked in the middle of each interval found and either side of each
+    change, and where it is not the expected one the segment is divided there, so a regime
+    narrower than the scan is found"""
+    below, above = obj_lo['regime'], obj_hi['regime']
+    if below == above:
+        velocities, regimes = [], [below]
+        checks = [((lo + hi) / 2, below)]
+    else:
+        vls = _transition(func, args, lo, hi, obj_lo, obj_hi)
+        velocities, regimes = [vls], [below, above]
+        checks = [(vls * (1 - CHECK), below), (vls * (1 + CHECK), above),
+                  ((lo + vls) / 2, below), ((vls + hi) / 2, above)]
+    if depth < REFINE_DEPTH:
+        for mid, expected in checks:
+            obj_mid = func(mid, *args, get_dict=True)
+            if obj_mid['regime'] != expected and lo < mid < hi:
+                v_lo, r_lo = _segment(func, args, lo, mid, obj_lo, obj_mid, depth + 1)
+                v_hi, r_hi = _segment(func, args, mid, hi, obj_mid, obj_hi, depth + 1)
+                return v_lo + v_hi, r_lo + r_hi[1:]
+    return velocities, regimes
+
+
+@lru_cache(maxsize=4096)
+def _boundaries(Dp, d, epsilon, nu, rhol, rhos, Cv, basis):
+    """Return (lowest, velocities, regimes) with regimes[i] from velocities[i - 1] to velocities[i],
+    from the lowest velocity where the model is real, or None if the model is not real over the
+    whole range above it"""
+    func = _Erhg[basis]
+    args = (Dp, d, epsilon, nu, rhol, rhos, Cv)
+    scan = _scan_velocities()
+    objs = [_regime_obj(func, vls, args) for vls in scan]
+    real = [i for i, obj in enumerate(objs) if obj is not None]
+    if not real or real != list(range(real[0], len(scan))):
+        return None
+    first = real[0]
+    if first > 0:
+        # At low velocity the Erhg of a coarse slurry can be complex, start where it is real
+        scan[first - 1] = _lowest_real(func, args, scan[first - 1], scan[first])
+        objs[first - 1] = func(scan[first - 1], *args, get_dict=True)
+        first -= 1
+    velocities, regimes = [], [objs[first]['regime']]
+    try:
+        for lo, hi, obj_lo, obj_hi in zip(scan[first:], scan[first + 1:], objs[first:], objs[first + 1:]):
+            v, r = _segment(func, args, lo, hi, obj_lo, obj_hi)
+            velocities += v
+            regimes += r[1:]
+    except _UNDEFINED:
+        return None
+    return scan[first], tuple(velocities), tuple(regimes)
+
+
+def boundaries(Dp, d, epsilon, nu, rhol, rhos, Cv, basis='Cvs'):
+    """
+    Return the regime transitions of the slurry from VMIN to VMAX, a tuple of
+    (vls, regime below, regime above), with the regimes 'FB', 'SB', 'He' or 'Ho'
+    Dp = Pipe diameter (m)
+    d = Particle diameter (m)
+    epsilon = absolute pipe roughness (m)
+    nu = fluid kinematic viscosity in m2/sec
+    rhol = density of the fluid (ton/m3)
+    rhos = particle density (ton/m3)
+    Cv = insitu (basis='Cvs') or transported (basis='Cvt') volume concentration
+    """
+    found = _boundaries(Dp, d, epsilon, nu, rhol, rhos, Cv, basis)
+    if found is None:
+        return ()
+    _, velocities, regimes = found
+    return tuple(zip(velocities, regimes, regimes[1:]))
+
+
+def boundaries_list(Dp, d_list, epsilon, nu, rhol, rhos, Cv_list, basis='Cvs'):
+    """Return the boundaries for each particle diameter in d_list and concentration in Cv_list,
+    as a list (by d) of lists (by Cv)"""
+    return [[boundaries(Dp, d, epsilon, nu, rhol, rhos, Cv, basis) for Cv in Cv_list] for d in d_list]
+
+
+def regime_code(vls, Dp, d, epsilon, nu, rhol, rhos, Cv, basis='Cvs'):
+    """Return the regime ('FB', 'SB', 'He' or 'Ho') of the slurry at vls, from the cached boundaries"""
+    found = _boundaries(Dp, d, epsilon, nu, rhol, rhos, Cv, basis)
+    if found is None or not found[0] <= vls <= VMAX:
+        return _Erhg[basis](vls, Dp, d, epsilon, nu, rhol, rhos, Cv, get_dict=True)['regime']
+    _, velocities, regimes = found
+    return regimes[bisect_right(velocities, vls)]
+
+
+def regime(vls, Dp, d, epsilon, nu, rhol, rhos, Cv, basis='Cvs'):
+    """Return the name of the regime of the slurry at vls, as Cvs_regime and Cvt_regime"""
+    return NAMES[regime_code(vls, Dp, d, epsilon, nu, rhol, rhos, Cv, basis)]
+
+
+def cache_clear():
+    """Clear the cached boundaries, for example after changing DHLLDV_framework.use_sf"""
+    _boundaries.cache_clear()
+
+
+def linear_axis(lo, hi, n):
+    """Return n values from lo to hi, evenly spaced"""
+    return [lo] + [lo + (hi - lo) * i / (n - 1) for i in range(1, n - 1)] + [hi]
+
+
+def _map_row(basis, vls_axis, Dp, d, epsilon, nu, rhol, rhos, Cv):
+    """Return the regime codes at each velocity in vls_axis, and the boundaries"""
+    found = _boundaries(Dp, d, epsilon, nu, rhol, rhos, Cv, basis)
+    lowest, velocities, regimes = found or (VMAX, (), ())
+    codes = array.array('b')
+    i = 0
+    for vls in vls_axis:
+        if found is not None and lowest <= vls <= VMAX:
+            while i < len(velocities) and velocities[i] <= vls:
+                i += 1
+            codes.append(CODES[regimes[i]])
+        else:
+            try:
+                codes.append(CODES[regime_code(vls, Dp, d, epsilon, nu, rhol, rhos, Cv, basis)])
+            except _UNDEFINED:
+                codes.append(UNDEFINED)
+    return codes, boundaries(Dp, d, epsilon, nu, rhol, rhos, Cv, basis)
+
+
+def _map_tile(basis, axis, values, vls_axis, slurry):
+    """Return the rows of a map for the values of axis ('Cv' or 'd')"""
+    rows = []
+    for value in values:
+        args = dict(slurry, **{axis: value})
+        rows.append(_map_row(basis, vls_axis, args['Dp'], args['d'], args['epsilon'], args['nu'],
+                             args['rhol'], args['rhos'], args['Cv']))
+    return rows
+
+
+def polylines(axis_values, row_boundaries):
+    """Join the boundaries of the rows of a map into polylines
+
+    returns a list of {'below': regime, 'above': regime, 'points': [[vls, axis value], ...]}, one
+    for each run of rows with the same transition (the k-th of its kind in the row)"""
+    lines = []
+    current = {}
+    for value, found in zip(axis_values, row_boundaries):
+        seen = {}
+        for vls, below, above in found:
+            key = (below, above, seen.get((below, above), 0))
+            seen[(below, above)] = key[2] + 1
+            if key not in current:
+                current[key] = {'below': below, 'above': above, 'points': []}
+                lines.append(current[key])
+            current[key]['points'].append([vls, value])
+        for key in [k for k in current if seen.get(k[:2], 0) <= k[2]]:
+            del current[key]
+    return lines
+
+
+class RegimeMap():
+    """The regime of a slurry on a grid of (Cv or d, vls), see build"""
+    KIND = 'regime map'
+    LETTERS = {0: 'F', 1: 'S', 2: 'h', 3: 'o', UNDEFINED: '.'}
+
+    def __init__(self, table):
+        if table.meta.get('kind') != self.KIND:
+            raise ValueError(f"regimes: the table is a {table.meta.get('kind')} table, not a {self.KIND}")
+        self.table = table
+        self.axis = table.axes[0][0]
+
+    @classmethod
+    def build(cls, axis='Cv', values=(0.02, 0.4, 39), vls=(0.5, 10.0, 96), Dp=0.762, d=0.001, Cv=0.175,
+              basis='Cvt', fluid='salt', rhos=2.65, epsilon=steel_roughness, workers=None, tile=8):
+        """Calculate a map
+
+        axis: 'Cv' (values evenly spaced) or 'd' (values log spaced)
+        values, vls: (low, high, number of points) of the axis and the velocity (evenly spaced)
+        Dp, d, Cv: The slurry, the one named by axis is replaced by the axis values
+        basis: 'Cvt' or 'Cvs'
+        fluid: 'fresh' or 'salt'
+        workers: The number of processes for the calculation, None or 0 for this process
+        tile: The number of rows of the map each process calculates at a time"""
+        if axis not in ('Cv', 'd'):
+            raise ValueError(f"regimes: axis must be 'Cv' or 'd', not {axis!r}")
+        if basis not in _Erhg:
+            raise ValueError(f"regimes: basis must be 'Cvs' or 'Cvt', not {basis!r}")
+        rhol, nu = FLUIDS[fluid]
+        axis_values = (linear_axis if axis == 'Cv' else log_axis)(*values)
+        vls_axis = linear_axis(*vls)
+        slurry = {'Dp': Dp, 'd': d, 'epsilon': epsilon, 'nu': nu, 'rhol': rhol, 'rhos': rhos, 'Cv': Cv}
+        tiles = [axis_values[i:i + tile] for i in range(0, len(axis_values), tile)]
+        jobs = [(basis, axis, t, vls_axis, slurry) for t in tiles]
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_map_tile, *zip(*jobs)))
+        else:
+            results = [_map_tile(*job) for job in jobs]
+        rows = [row for result in results for row in result]
+        codes = array.array('b')
+        for row, _ in rows:
+            codes.extend(row)
+        meta = dict(slurry, kind=cls.KIND, basis=basis, fluid=fluid,
+                    polylines=polylines(axis_values, [found for _, found in rows]))
+        del meta[axis]
+        return cls(GridTable([(axis, axis_values), ('vls', vls_axis)], {'regime': codes}, meta))
+
+    @classmethod
+    def open(cls, path):
+        return cls(GridTable.open(path))
+
+    def save(self, path):
+        self.table.save(path)
+
+    @property
+    def polylines(self):
+        """The regime boundaries, see polylines"""
+        return self.table.meta['polylines']
+
+    def code(self, i, j):
+        """Return the regime code at the i-th axis value and j-th velocity"""
+        return self.table.layers['regime'][i * len(self.table.axes[1][1]) + j]
+
+    def row(self, i):
+        """Return the list of regime codes at the i-th axis value"""
+        n = len(self.table.axes[1][1])
+        return list(self.table.layers['regime'][i * n:(i + 1) * n])
+
+    def text(self):
+        """Return the map as text, a line for each axis value with a letter for each velocity"""
+        lines = []
+        for i, value in reversed(list(enumerate(self.table.axes[0][1]))):
+            lines.append(f"{self.axis}={value:<10.4g} " + ''.join(self.LETTERS[c] for c in self.row(i)))
+        vls_axis = self.table.axes[1][1]
+        lines.append(f"vls {vls_axis[0]:g} to {vls_axis[-1]:g} m/sec, "
+                     + ', '.join(f"{letter}={name}" for letter, name in zip('FSho', NAMES.values()))
+                     + ', .=undefined')
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m DHLLDV.regimes', description="DHLLDV regime maps")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('map', help="Calculate a regime map")
+    build.add_argument('path')
+    build.add_argument('--axis', nargs=4, default=('Cv', '0.02', '0.4', '39'), metavar=('NAME', 'LOW', 'HIGH', 'N'),
+                       help="Cv or d, and the range of its values")
+    build.add_argument('--vls', type=float, nargs=3, default=(0.5, 10.0, 96), metavar=('LOW', 'HIGH', 'N'))
+    build.add_argument('--Dp', type=float, default=0.762, help="The pipe diameter (m)")
+    build.add_argument('--d', type=float, default=0.001, help="The particle diameter (m)")
+    build.add_argument('--Cv', type=float, default=0.175, help="The volume concentration")
+    build.add_argument('--basis', choices=('Cvs', 'Cvt'), default='Cvt')
+    build.add_argument('--fluid', choices=sorted(FLUIDS), default='salt')
+    build.add_argument('--rhos', type=float, default=2.65, help="The solids density (ton/m3)")
+    build.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    show = commands.add_parser('show', help="Print a regime map and its boundaries")
+    show.add_argument('path')
+    args = parser.parse_args(argv)
+    if args.command == 'map':
+        name, lo, hi, n = args.axis
+        regime_map = RegimeMap.build(name, (float(lo), float(hi), int(n)), (args.vls[0], args.vls[1], int(args.vls[2])),
+                                     args.Dp, args.d, args.Cv, args.basis, args.fluid, args.rhos,
+                                     workers=args.workers)
+        regime_map.save(args.path)
+    else:
+        regime_map = RegimeMap.open(args.path)
+    print(regime_map.text())
+    for line in regime_map.polylines:
+        (v0, y0), (v1, y1) = line['points'][0], line['points'][-1]
+        print(f"{line['below']} to {line['above']}: {len(line['points'])} points, "
+              f"vls {v0:0.3f} at {regime_map.axis}={y0:0.4g} to vls {v1:0.3f} at {regime_map.axis}={y1:0.4g}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
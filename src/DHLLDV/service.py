@@ -0,0 +1,327 @@
+"""
+service - A long running DHLLDV calculation service that speaks JSON lines
+
+    python -m DHLLDV.service                    # requests on stdin, responses on stdout
+    python -m DHLLDV.service --socket PATH      # or on a local (unix) socket
+    python -m DHLLDV.service --port 8765        # or on a TCP port on localhost
+
+Each request is one line of JSON, each response is one line with the same id:
+    {"id": 1, "method": "Cvt_Erhg", "params": {"vls": [3.0, 4.0], "Dp": 0.762, "d": 0.001, "Cv": 0.175}}
+    {"id": 1, "result": [0.418..., 0.291...]}
+or {"id": 1, "error": "..."} if the request fails.
+
+The methods and their params (defaults as SlurrySpec, d defaults to d50):
+    Cvs_Erhg, Cvt_Erhg: vls (a number or list), Dp, d, epsilon, nu, rhol, rhos, Cv
+    Erhg_graded: as above plus GSD ({fraction: diameter}, default from d15, d50, d85) and Cvt_eq_Cvs
+    LDV: Dp, d, epsilon, nu, rhol, rhos, Cv
+    system_head: Q (a number or list), pipeline (a list of sections, each with name, diameter,
+                 length, K and dz), and the slurry as Erhg_graded (without Dp, the slurry is in the
+                 last section). Returns [slurry head, water head] (m of water)
+    operating_point: As system_head, without Q, plus pump (a dict in the PumpCatalog format, with
+                     an optional speed in Hz). Returns {'Q', 'H', 'P', 'N'}
+
+Requests that are waiting together are handled as a batch: requests for the same method and
+slurry are evaluated together, each distinct velocity once. A lone request is handled at
+once; when others are already waiting, the batch is held open for a short window to collect
+more. Results, slurries and pipelines are kept in caches, so repeated requests are answered
+without recalculating.
+"""
+import argparse
+import json
+import math
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV.DHLLDV_Utils import find_root
+from DHLLDV.HeadLossModels import SlurrySpec
+
+_framework_args = ('Dp', 'd', 'epsilon', 'nu', 'rhol', 'rhos', 'Cv')
+_batched = ('Cvs_Erhg', 'Cvt_Erhg', 'Erhg_graded')
+
+
+def _framework_params(params):
+    """Return the tuple of (Dp, d, epsilon, nu, rhol, rhos, Cv) from the params, with defaults"""
+    spec = SlurrySpec()
+    defaults = {'Dp': spec.Dp, 'd': params.get('d50', spec.d50), 'epsilon': spec.epsilon, 'nu': spec.nu,
+                'rhol': spec.rhol, 'rhos': spec.rhos, 'Cv': spec.Cv}
+    return tuple(float(params.get(k, defaults[k])) for k in _framework_args)
+
+
+def _gsd(params):
+    """Return the GSD from the params as a sorted tuple of (fraction, diameter)"""
+    if 'GSD' in params:
+        return tuple(sorted((float(f), float(d)) for f, d in params['GSD'].items()))
+    d50 = float(params.get('d', params.get('d50', SlurrySpec.d50)))
+    return ((0.15, float(params.get('d15', d50 / 2.0))), (0.5, d50), (0.85, float(params.get('d85', d50 * 2.72))))
+
+
+def pipeline_key(params):
+    """Return the hashable key of the slurry and pipeline in the params, as for a system_head request"""
+    sections = tuple((s.get('name', f'Pipe {i}'), float(s['diameter']), float(s.get('length', 0.0)),
+                      float(s.get('K', 0.0)), float(s.get('dz', 0.0)))
+                     for i, s in enumerate(params['pipeline']))
+    return sections, _framework_params(params)[1:], _gsd(params)
+
+
+@lru_cache(maxsize=64)
+def _pipeline(key, vls_max):
+    """Build (and keep) the Pipeline for a key from pipeline_key, with the slurry curves to vls_max (m/sec)"""
+    from DHLLDV.PipeObj import Pipe, Pipeline
+    sections, (d, epsilon, nu, rhol, rhos, Cv), gsd = key
+    Dp = sections[-1][1]
+    spec = SlurrySpec(Dp=Dp, d50=d, epsilon=epsilon, nu=nu, rhol=rhol, rhos=rhos, Cv=Cv,
+                      GSD=DHLLDV_framework.create_fracs(dict(gsd), Dp, nu, rhol, rhos))
+    return Pipeline([Pipe(*s) for s in sections], slurry=spec.to_slurry(vls_max=vls_max))
+
+
+def pipeline_for(key, Q_max):
+    """Return the Pipeline for a key with the slurry curves covering the flow Q_max (m3/sec) in every section"""
+    vls_max = max(Q_max / (math.pi * s[1] ** 2 / 4) for s in key[0])
+    return _pipeline(key, max(10.0, float(math.ceil(vls_max))))
+
+
+def _pump(spec, slurry):
+    """Build a Pump from a dict in the PumpCatalog format"""
+    from DHLLDV.PumpCatalog import PumpCatalog
+    pump = PumpCatalog([spec]).pump(0, slurry)
+    if 'speed' in spec:
+        pump.current_speed = float(spec['speed'])
+    return pump
+
+
+class Service():
+    """Evaluate JSON requests, in batches, with caching"""
+    def __init__(self, batch_window=0.002, max_batch=256, cache_size=4096):
+        """batch_window: The time to wait for more requests when several are already waiting (sec)
+        max_batch: The most requests in a batch
+        cache_size: The number of results to keep"""
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._results = OrderedDict()
+        self._queue = queue.Queue()
+        self.methods = {'LDV': self._ldv,
+                        'system_head': self._system_head,
+                        'operating_point': self._operating_point,
+                        }
+
+    def _cached(self, key):
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        return None
+
+    def _store(self, key, value):
+        self._results[key] = value
+        while len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+
+    def handle(self, request):
+        """Return the response dict for one request dict"""
+        return self.handle_batch([request])[0]
+
+    def handle_batch(self, requests):
+        """Return the list of response dicts for a list of request dicts"""
+        responses = [None] * len(requests)
+        groups = {}
+        for i, request in enumerate(requests):
+            try:
+                method = request['method']
+                params = request.get('params', {})
+                if method in _batched:
+                    args = _framework_params(params)
+                    if method == 'Erhg_graded':
+                        args = args + (_gsd(params), bool(params.get('Cvt_eq_Cvs', False)))
+                    vls = params['vls']
+                    vls_list = [float(v) for v in vls] if isinstance(vls, list) else [float(vls)]
+                    groups.setdefault((method, args), []).append((i, vls_list, isinstance(vls, list)))
+                elif method in self.methods:
+                    key = (method, json.dumps(params, sort_keys=True))
+                    result = self._cached(key)
+                    if result is None:
+                        result = self.methods[method](params)
+                        self._store(key, result)
+                    responses[i] = {'id': request.get('id'), 'result': result}
+                else:
+                    raise KeyError(f"No method {method}")
+            except Exception as e:
+                responses[i] = {'id': request.get('id') if isinstance(request, dict) else None,
+                                'error': f"{type(e).__name__}: {e}"}
+        for (method, args), members in groups.items():
+            try:
+                values = self._erhg(method, args, {v for _, vls_list, _ in members for v in vls_list})
+                for i, vls_list, is_list in members:
+                    result = [values[v] for v in vls_list]
+                    responses[i] = {'id': requests[i].get('id'), 'result': result if is_list else result[0]}
+            except Exception as e:
+                for i, _, _ in members:
+                    responses[i] = {'id': requests[i].get('id'), 'error': f"{type(e).__name__}: {e}"}
+        return responses
+
+    def _erhg(self, method, args, velocities):
+        """Return a dict of {vls: Erhg} for the velocities, each calculated once"""
+        values = {}
+        for vls in velocities:
+            key = (method, args, vls)
+            value = self._cached(key)
+            if value is None:
+                if method == 'Erhg_graded':
+                    Dp, d, epsilon, nu, rhol, rhos, Cv, GSD, Cvt_eq_Cvs = args
+                    value = DHLLDV_framework.Erhg_graded(dict(GSD), vls, Dp, epsilon, nu, rhol, rhos, Cv, Cvt_eq_Cvs)
+                else:
+                    value = getattr(DHLLDV_framework, method)(vls, *args)
+                self._store(key, value)
+            values[vls] = value
+        return values
+
+    def _ldv(self, params):
+        return DHLLDV_framework.LDV(None, *_framework_params(params))
+
+    def _system_head(self, params):
+        Q = params['Q']
+        pipeline = pipeline_for(pipeline_key(params), max(float(q) for q in Q) if isinstance(Q, list) else float(Q))
+        if isinstance(Q, list):
+            return [list(pipeline.calc_system_head(float(q))) for q in Q]
+        return list(pipeline.calc_system_head(float(Q)))
+
+    def _operating_point(self, params):
+        spec = params['pump']
+        ratio = float(spec.get('speed', spec['design_speed'])) / float(spec['design_speed'])
+        # The slurry curves cover the whole pump curve
+        pipeline = pipeline_for(pipeline_key(params), max(spec['Q']) * ratio)
+        pump = _pump(spec, pipeline.slurry)
+        flows = sorted(pump.design_QH_curve.keys())
+        lo = flows[0] * ratio * 1.0001
+        hi = flows[-1] * ratio * 0.9999
+
+        def excess(Q):
+            return pump.point(Q)[1] - pipeline.calc_system_head(Q)[0]
+
+        # The slurry system curve can cross the pump curve twice, the stable point is the
+        # highest flow crossing, so search down from the top of the pump curve
+        steps = 50
+        Q_hi, f_hi = None, None
+        for i in range(steps + 1):
+            Q = hi - (hi - lo) * i / steps
+            f = excess(Q)
+            if f >= 0 and f_hi is not None and f_hi < 0:
+                Q, H, P, N = pump.point(find_root(excess, Q, Q_hi, xtol=1e-6))
+                return {'Q': Q, 'H': H, 'P': P, 'N': N}
+            Q_hi, f_hi = Q, f
+        raise ValueError("The pump curve does not cross the system curve")
+
+    def _worker(self):
+        """Take requests off the queue in batches and send the responses"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = None     # Only wait for more once a second request is waiting
+            while len(batch) < self.max_batch:
+                try:
+                    if deadline is None:
+                        item = self._queue.get_nowait()
+                    else:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.batch_window
+            for (line, reply), response in zip(batch, self.handle_batch([request for request, _ in batch])):
+                reply(response)
+
+    def submit(self, line, reply):
+        """Queue one request line, reply(response dict) is called with the response"""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("The request must be a JSON object")
+        except ValueError as e:
+            reply({'id': None, 'error': f"Bad request: {e}"})
+            return
+        self._queue.put((request, reply))
+
+    def start(self):
+        """Start the batching worker thread"""
+        worker = threading.Thread(target=self._worker, daemon=True)
+        worker.start()
+        return worker
+
+    def serve(self, lines, out):
+        """Answer the requests in lines (an iterable, e.g. stdin) on out (e.g. stdout)"""
+        lock = threading.Lock()
+
+        def reply(response):
+            with lock:
+                out.write(json.dumps(response) + '\n')
+                out.flush()
+
+        worker = self.start()
+        for line in lines:
+            if line.strip():
+                self.submit(line, reply)
+        self._queue.put(None)
+        worker.join()
+
+    def server(self, path=None, port=None):
+        """Return a socketserver answering requests on a unix socket at path, or a TCP port on localhost"""
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lock = threading.Lock()
+
+                def reply(response):
+                    with lock:
+                        try:
+                            self.wfile.write((json.dumps(response) + '\n').encode())
+                            self.wfile.flush()
+                        except (OSError, ValueError):
+                            pass    # The client went away, or the connection is closed
+
+                for line in self.rfile:
+                    if line.strip():
+                        service.submit(line.decode(), reply)
+
+        if path:
+            if os.path.exists(path):
+                os.remove(path)
+            server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        else:
+            server = socketserver.ThreadingTCPServer(('127.0.0.1', port), Handler)
+        server.daemon_threads = True
+        return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m DHLLDV.service', description="DHLLDV JSON lines service")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--socket', help="Listen on a unix socket at this path")
+    group.add_argument('--port', type=int, help="Listen on this TCP port on localhost")
+    parser.add_argument('--window', type=float, default=2.0,
+                        help="The time to wait for more requests when several are waiting (ms)")
+    args = parser.parse_args(argv)
+    service = Service(batch_window=args.window / 1000)
+    if args.socket or args.port:
+        service.start()
+        with service.server(args.socket, args.port) as server:
+            server.serve_forever()
+    else:
+        service.serve(sys.stdin, sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
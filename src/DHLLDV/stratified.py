@@ -10,6 +10,7 @@ from math import pi, sin, log
 
 from .DHLLDV_constants import gravity, Arel_to_beta, musf, Cvb, alpha_tel
 from . import homogeneous
+from . import telemetry
 
 
 def beta(Cvs):
@@ -162,10 +163,14 @@ def vls_FBSB(Dp,  d, epsilon, nu, rhol, rhos, Cvs,
     for n in range(max_steps):
         fn = fb_Erhg(vls_fb, Dp,  d, epsilon, nu, rhol, rhos, Cvs)-musf
         if abs(fn) < e:
+            if telemetry.enabled:
+                telemetry.record('stratified.vls_FBSB', n, fn, True)
             return vls_fb
         dfndv = (fb_Erhg(vls_fb + dv, Dp, d, epsilon, nu, rhol, rhos, Cvs) - musf - fn) / dv
         #print(f"{n:6d} {vls_fb:6.3f} {fn:9.4f} {dfndv:10.5f}")
         vls_fb = vls_fb - fn/dfndv
+    if telemetry.enabled:
+        telemetry.record('stratified.vls_FBSB', max_steps, fn, False, (Dp, d, epsilon, nu, rhol, rhos, Cvs))
     return vls_fb
 vls_lsdv = vls_FBSB # Theses are the same value, see discussion in section 7.8.6
 
@@ -0,0 +1,467 @@
+"""
+surrogate - Precomputed tables of the framework results, for fast approximate answers
+
+    python -m DHLLDV.surrogate build erhg.dlt --basis Cvt --fluid salt --rhos 2.65 --workers 4
+    python -m DHLLDV.surrogate build-ldv ldv.dlt --fluid salt --rhos 2.65
+    python -m DHLLDV.surrogate error erhg.dlt
+
+An ErhgTable holds Cvs_Erhg or Cvt_Erhg, and the regime, on a grid of log spaced
+velocities, concentrations, particle diameters and pipe diameters, for one fluid and
+solids density. The file is memory mapped when opened, so it loads instantly and the
+pages are shared between processes. A query is answered by multilinear interpolation
+(in the logs of the inputs and of Erhg) between the 16 grid points around it.
+
+The exact framework function is used instead when the query is outside the table, or
+when the regime is not the same at all the grid points around it (near a regime switch,
+where Erhg has a kink). The table records the maximum interpolation error measured
+against the exact model when it was built, see GridTable.error.
+
+An LDVTable holds the LDV on a (Dp, d, Cv) grid in the same way, see
+DHLLDV_framework.use_LDV_table to have the framework use one.
+"""
+import argparse
+import array
+import bisect
+import json
+import math
+import mmap
+import os
+import random
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV.DHLLDV_constants import steel_roughness, water_density, water_viscosity
+
+MAGIC = b'DHLLDVT1'
+VERSION = 1
+FLUIDS = {'fresh': (water_density[20], water_viscosity[20]),
+          'salt': (1.0248103, 1.0508e-6)}
+REGIME_CODES = {'FB': 0, 'SB': 1, 'He': 2, 'Ho': 3}
+
+
+def log_axis(lo, hi, n):
+    """Return n values from lo to hi, evenly spaced in log"""
+    step = (math.log(hi) - math.log(lo)) / (n - 1)
+    return [lo] + [math.exp(math.log(lo) + i * step) for i in range(1, n - 1)] + [hi]
+
+
+class GridTable():
+    """Values on a grid of log spaced axes, with multilinear interpolation
+
+    axes: A list of (name, list of values), the values increasing and positive
+    layers: A dict of {name: array}, each with one value per grid point, the last axis
+            varying fastest. 'd' (double) arrays are interpolated, 'b' (int8) arrays hold
+            codes (the regime) that are compared at the corners of the cell.
+    meta: A dict of other information to store with the table"""
+    def __init__(self, axes, layers, meta=None):
+        self.axes = [(name, list(values)) for name, values in axes]
+        self.layers = layers
+        self.meta = dict(meta or {})
+        self._logs = [[math.log(v) for v in values] for _, values in self.axes]
+        self._strides = []
+        stride = 1
+        for _, values in reversed(self.axes):
+            self._strides.insert(0, stride)
+            stride *= len(values)
+        self.size = stride
+        self._mmap = None
+
+    @property
+    def error(self):
+        """The interpolation error measured when the table was built, see measure_error"""
+        return self.meta.get('error')
+
+    def locate(self, point):
+        """Return the (base index, list of (stride, fraction)) of the cell holding point, or None if outside"""
+        base = 0
+        weights = []
+        for x, logs, stride in zip(point, self._logs, self._strides):
+            if x <= 0:
+                return None
+            lx = math.log(x)
+            if not logs[0] <= lx <= logs[-1]:
+                return None
+            i = min(bisect.bisect_right(logs, lx) - 1, len(logs) - 2)
+            base += i * stride
+            weights.append((stride, (lx - logs[i]) / (logs[i + 1] - logs[i])))
+        return base, weights
+
+    def corners(self, cell):
+        """Yield the (index, weight) of the grid points at the corners of a cell from locate"""
+        base, weights = cell
+        for bits in product((0, 1), repeat=len(weights)):
+            index = base
+            w = 1.0
+            for bit, (stride, t) in zip(bits, weights):
+                if bit:
+                    index += stride
+                    w *= t
+                else:
+                    w *= 1 - t
+            yield index, w
+
+    def same_code(self, layer, cell):
+        """Return the code in layer if it is the same at all the corners of cell, otherwise None"""
+        codes = self.layers[layer]
+        indices = [i for i, _ in self.corners(cell)]
+        first = codes[indices[0]]
+        return first if all(codes[i] == first for i in indices) else None
+
+    def interpolate(self, layer, cell, log_values=False):
+        """Return the multilinear interpolation of layer in cell, optionally in the log of the values"""
+        values = self.layers[layer]
+        if log_values:
+            return math.exp(sum(w * math.log(values[i]) for i, w in self.corners(cell)))
+        return sum(w * values[i] for i, w in self.corners(cell))
+
+    def save(self, path):
+        """Write the table to path: MAGIC, header length (uint32), JSON header, the layers
+
+        Each layer starts on an 8 byte boundary, so the file can be memory mapped."""
+        names = list(self.layers)
+        header = {'version': VERSION, 'axes': self.axes, 'meta': self.meta,
+                  'layers': [(name, self.layers[name].typecode) for name in names]}
+        blob = json.dumps(header).encode()
+        start = len(MAGIC) + 4 + len(blob)
+        blob += b' ' * (-start % 8)
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(blob)) + blob)
+            for name in names:
+                data = array.array(self.layers[name].typecode, self.layers[name])
+                if sys.byteorder != 'little':
+                    data.byteswap()
+                f.write(data.tobytes())
+                f.write(b'\0' * (-f.tell() % 8))
+
+    @classmethod
+    def open(cls, path):
+        """Memory map a table written by save"""
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"surrogate: {path} is not a table file")
+        size = struct.unpack_from('<I', mm, len(MAGIC))[0]
+        offset = len(MAGIC) + 4
+        header = json.loads(mm[offset:offset + size])
+        if header['version'] != VERSION:
+            raise ValueError(f"surrogate: {path} is table version {header['version']}, not {VERSION}")
+        offset += size
+        count = 1
+        for _, values in header['axes']:
+            count *= len(values)
+        view = memoryview(mm)
+        layers = {}
+        for name, typecode in header['layers']:
+            nbytes = count * array.array(typecode).itemsize
+            if sys.byteorder == 'little':
+                layers[name] = view[offset:offset + nbytes].cast(typecode)
+            else:
+                layers[name] = array.array(typecode, view[offset:offset + nbytes])
+                layers[name].byteswap()
+            offset += nbytes + (-nbytes % 8)
+        table = cls(header['axes'], layers, header['meta'])
+        table._mmap = mm
+        return table
+
+    def close(self):
+        if self._mmap is not None:
+            self.layers = {}
+            self._mmap.close()
+            self._mmap = None
+
+
+def _erhg_node(basis, vls, Dp, d, epsilon, nu, rhol, rhos, Cv):
+    func = DHLLDV_framework.Cvt_Erhg if basis == 'Cvt' else DHLLDV_framework.Cvs_Erhg
+    with DHLLDV_framework.exact_LDV():
+        obj = func(vls, Dp, d, epsilon, nu, rhol, rhos, Cv, get_dict=True)
+    return obj[obj['regime']], REGIME_CODES[obj['regime']]
+
+
+def _erhg_slice(basis, Dp, d, Cv, vls_axis, epsilon, nu, rhol, rhos):
+    return [_erhg_node(basis, vls, Dp, d, epsilon, nu, rhol, rhos, Cv) for vls in vls_axis]
+
+
+class ErhgTable():
+    """Cvs_Erhg or Cvt_Erhg and the regime, tabulated over (Dp, d, Cv, vls)
+
+    Use ErhgTable.build to make one, ErhgTable.open to load one."""
+    AXES = ('Dp', 'd', 'Cv', 'vls')
+
+    KIND = 'Erhg'
+
+    def __init__(self, table):
+        if table.meta.get('kind') != self.KIND:
+            raise ValueError(f"surrogate: The table holds {table.meta.get('kind')}, not {self.KIND}")
+        self.table = table
+        meta = table.meta
+        self.basis = meta['basis']
+        self.epsilon = meta['epsilon']
+        self.nu = meta['nu']
+        self.rhol = meta['rhol']
+        self.rhos = meta['rhos']
+        self.exact_func = DHLLDV_framework.Cvt_Erhg if self.basis == 'Cvt' else DHLLDV_framework.Cvs_Erhg
+        self.hits = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def build(cls, basis='Cvt', fluid='salt', rhos=2.65, epsilon=steel_roughness, Dp=(0.1, 1.2, 12),
+              d=(0.05e-3, 10e-3, 24), Cv=(0.01, 0.4, 16), vls=(0.5, 10.0, 48), workers=None, error_samples=2000):
+        """Calculate a table
+
+        basis: 'Cvt' or 'Cvs'
+        fluid: 'fresh' or 'salt'
+        Dp, d, Cv, vls: (low, high, number of points) for each axis
+        workers: The number of processes for the calculation, None or 0 for this process
+        error_samples: The number of random points to measure the error with"""
+        if basis not in ('Cvs', 'Cvt'):
+            raise ValueError(f"surrogate: basis must be 'Cvs' or 'Cvt', not {basis!r}")
+        rhol, nu = FLUIDS[fluid]
+        axes = [('Dp', log_axis(*Dp)), ('d', log_axis(*d)), ('Cv', log_axis(*Cv)), ('vls', log_axis(*vls))]
+        jobs = [(basis, Dp_, d_, Cv_, axes[3][1], epsilon, nu, rhol, rhos)
+                for Dp_, d_, Cv_ in product(axes[0][1], axes[1][1], axes[2][1])]
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                slices = list(executor.map(_erhg_slice, *zip(*jobs), chunksize=8))
+        else:
+            slices = [_erhg_slice(*job) for job in jobs]
+        Erhg = array.array('d', (E for s in slices for E, _ in s))
+        regime = array.array('b', (r for s in slices for _, r in s))
+        meta = {'kind': cls.KIND, 'basis': basis, 'fluid': fluid, 'epsilon': epsilon, 'nu': nu, 'rhol': rhol, 'rhos': rhos}
+        result = cls(GridTable(axes, {'Erhg': Erhg, 'regime': regime}, meta))
+        if error_samples:
+            result.table.meta['error'] = result.measure_error(error_samples)
+        return result
+
+    @classmethod
+    def open(cls, path):
+        return cls(GridTable.open(path))
+
+    def save(self, path):
+        self.table.save(path)
+
+    def exact(self, vls, Dp, d, Cv):
+        """Return the exact Erhg, with the exact LDV even if DHLLDV_framework.use_LDV_table is active"""
+        with DHLLDV_framework.exact_LDV():
+            return self.exact_func(vls, Dp, d, self.epsilon, self.nu, self.rhol, self.rhos, Cv)
+
+    def lookup(self, vls, Dp, d, Cv):
+        """Return the interpolated Erhg, or None if the point is outside the table or near a regime switch"""
+        cell = self.table.locate((Dp, d, Cv, vls))
+        if cell is None or self.table.same_code('regime', cell) is None:
+            return None
+        return self.table.interpolate('Erhg', cell, log_values=True)
+
+    def Erhg(self, vls, Dp, d, Cv):
+        """Return Erhg from the table, or from the exact function where the table does not apply"""
+        value = self.lookup(vls, Dp, d, Cv)
+        if value is None:
+            self.fallbacks += 1
+            return self.exact(vls, Dp, d, Cv)
+        self.hits += 1
+        return value
+
+    def Erhg_list(self, vls_list, Dp, d, Cv):
+        """Return Erhg at each velocity in vls_list"""
+        return [self.Erhg(vls, Dp, d, Cv) for vls in vls_list]
+
+    def regime(self, vls, Dp, d, Cv):
+        """Return the regime code (see REGIME_CODES) from the table, or None where it changes"""
+        cell = self.table.locate((Dp, d, Cv, vls))
+        return None if cell is None else self.table.same_code('regime', cell)
+
+    def measure_error(self, samples=2000, seed=0):
+        """Compare the table against the exact function at random points inside it
+
+        returns a dict with the 'max' and 'p99' relative error of the interpolated points,
+        the 'worst' point (vls, Dp, d, Cv) and the 'fallback' fraction of the points"""
+        rng = random.Random(seed)
+        axes = dict(self.table.axes)
+        errors = []
+        worst = None
+        fallbacks = 0
+        for _ in range(samples):
+            point = {name: math.exp(rng.uniform(math.log(axes[name][0]), math.log(axes[name][-1])))
+                     for name in self.AXES}
+            value = self.lookup(point['vls'], point['Dp'], point['d'], point['Cv'])
+            if value is None:
+                fallbacks += 1
+                continue
+            exact = self.exact(point['vls'], point['Dp'], point['d'], point['Cv'])
+            error = abs(value - exact) / abs(exact)
+            if not errors or error > max_error:
+                worst = [point['vls'], point['Dp'], point['d'], point['Cv']]
+                max_error = error
+            errors.append(error)
+        errors.sort()
+        return {'max': errors[-1] if errors else 0.0,
+                'p99': errors[int(len(errors) * 0.99)] if errors else 0.0,
+                'worst': worst,
+                'fallback': fallbacks / samples,
+                'samples': samples,
+                }
+
+
+def _ldv_slice(Dp, d, Cv_axis, epsilon, nu, rhol, rhos):
+    return [DHLLDV_framework.LDV(None, Dp, d, epsilon, nu, rhol, rhos, Cv, exact=True) for Cv in Cv_axis]
+
+
+class LDVTable():
+    """The limit deposit velocity tabulated over (Dp, d, Cv), for one fluid and solids density
+
+    Use LDVTable.build to make one, LDVTable.open to load one. To have
+    DHLLDV_framework.LDV (and so slip_ratio, Cvt_Erhg and the Slurry curves) use a table,
+    see DHLLDV_framework.use_LDV_table.
+
+    The error bound stored with the table is the largest relative error at the centre of
+    every cell (where the interpolation is farthest from the grid points) and at random
+    points. LDV has kinks where its limiting mechanism changes, so a table should be
+    checked with measure_error after changing its axes."""
+    KIND = 'LDV'
+    MODEL_VERSION = 1   # Change when DHLLDV_framework.LDV changes, so old tables are refused
+    AXES = ('Dp', 'd', 'Cv')
+    D_JUMP = 2. / 1000  # LDV jumps at d = drough, the cells across it use the exact LDV
+
+    def __init__(self, table):
+        if table.meta.get('kind') != self.KIND:
+            raise ValueError(f"surrogate: The table holds {table.meta.get('kind')}, not {self.KIND}")
+        if table.meta.get('model_version') != self.MODEL_VERSION:
+            raise ValueError(f"surrogate: The table is for LDV model version {table.meta.get('model_version')}, "
+                             f"not {self.MODEL_VERSION}, rebuild it")
+        self.table = table
+        meta = table.meta
+        self.epsilon = meta['epsilon']
+        self.nu = meta['nu']
+        self.rhol = meta['rhol']
+        self.rhos = meta['rhos']
+        self._fluid = (self.epsilon, self.nu, self.rhol, self.rhos)
+        d_axis = dict(table.axes)['d']
+        self._d_jump = next(((lo, hi) for lo, hi in zip(d_axis, d_axis[1:]) if lo < self.D_JUMP <= hi), None)
+
+    @classmethod
+    def build(cls, fluid='salt', rhos=2.65, epsilon=steel_roughness, Dp=(0.05, 1.5, 24), d=(0.02e-3, 20e-3, 48),
+              Cv=(0.005, 0.4, 32), workers=None, error_samples=2000):
+        """Calculate a table
+
+        fluid: 'fresh' or 'salt'
+        Dp, d, Cv: (low, high, number of points) for each axis
+        workers: The number of processes for the calculation, None or 0 for this process
+        error_samples: The number of random points to measure the error with, besides the cell centres"""
+        rhol, nu = FLUIDS[fluid]
+        axes = [('Dp', log_axis(*Dp)), ('d', log_axis(*d)), ('Cv', log_axis(*Cv))]
+        jobs = [(Dp_, d_, axes[2][1], epsilon, nu, rhol, rhos) for Dp_, d_ in product(axes[0][1], axes[1][1])]
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                slices = list(executor.map(_ldv_slice, *zip(*jobs), chunksize=8))
+        else:
+            slices = [_ldv_slice(*job) for job in jobs]
+        meta = {'kind': cls.KIND, 'model_version': cls.MODEL_VERSION, 'fluid': fluid, 'epsilon': epsilon,
+                'nu': nu, 'rhol': rhol, 'rhos': rhos}
+        result = cls(GridTable(axes, {'LDV': array.array('d', (v for s in slices for v in s))}, meta))
+        result.table.meta['error'] = result.measure_error(error_samples)
+        return result
+
+    @classmethod
+    def open(cls, path):
+        return cls(GridTable.open(path))
+
+    def save(self, path):
+        self.table.save(path)
+
+    def exact(self, Dp, d, Cv):
+        return DHLLDV_framework.LDV(None, Dp, d, self.epsilon, self.nu, self.rhol, self.rhos, Cv, exact=True)
+
+    def lookup(self, Dp, d, epsilon, nu, rhol, rhos, Cv):
+        """Return the interpolated LDV, or None if the fluid, solids or pipe roughness are not
+        those of the table, or the point is outside it. The arguments are as for LDV"""
+        if (epsilon, nu, rhol, rhos) != self._fluid:
+            return None
+        if self._d_jump is not None and self._d_jump[0] < d < self._d_jump[1]:
+            return None
+        cell = self.table.locate((Dp, d, Cv))
+        if cell is None:
+            return None
+        return self.table.interpolate('LDV', cell, log_values=True)
+
+    def LDV(self, Dp, d, Cv):
+        """Return the LDV (m/sec) from the table, or the exact LDV where the table does not apply"""
+        value = self.lookup(Dp, d, self.epsilon, self.nu, self.rhol, self.rhos, Cv)
+        return self.exact(Dp, d, Cv) if value is None else value
+
+    def LDV_list(self, Dp, d, Cv_list):
+        """Return the LDV at each concentration in Cv_list"""
+        return [self.LDV(Dp, d, Cv) for Cv in Cv_list]
+
+    def measure_error(self, samples=2000, seed=0):
+        """Compare the table against the exact LDV at the centre of every cell and at random points
+
+        returns a dict with the 'max' and 'p99' relative error and the 'worst' point (Dp, d, Cv)"""
+        rng = random.Random(seed)
+        axes = [values for _, values in self.table.axes]
+        points = [tuple((a[i] * a[i + 1]) ** 0.5 for a, i in zip(axes, index))
+                  for index in product(*[range(len(a) - 1) for a in axes])]
+        points += [tuple(math.exp(rng.uniform(math.log(a[0]), math.log(a[-1]))) for a in axes)
+                   for _ in range(samples)]
+        errors = []
+        worst = None
+        for point in points:
+            exact = self.exact(*point)
+            error = abs(self.LDV(*point) - exact) / exact
+            if not errors or error > max_error:
+                worst, max_error = list(point), error
+            errors.append(error)
+        errors.sort()
+        return {'max': errors[-1],
+                'p99': errors[int(len(errors) * 0.99)],
+                'worst': worst,
+                'samples': len(points),
+                }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m DHLLDV.surrogate', description="DHLLDV surrogate tables")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="Calculate an Erhg table")
+    build.add_argument('path')
+    build.add_argument('--basis', choices=('Cvs', 'Cvt'), default='Cvt')
+    build.add_argument('--fluid', choices=sorted(FLUIDS), default='salt')
+    build.add_argument('--rhos', type=float, default=2.65, help="The solids density (ton/m3)")
+    for axis, default in (('Dp', (0.1, 1.2, 12)), ('d', (0.05e-3, 10e-3, 24)), ('Cv', (0.01, 0.4, 16)),
+                          ('vls', (0.5, 10.0, 48))):
+        build.add_argument(f'--{axis}', type=float, nargs=3, default=default, metavar=('LOW', 'HIGH', 'N'))
+    build.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    build_ldv = commands.add_parser('build-ldv', help="Calculate an LDV table")
+    build_ldv.add_argument('path')
+    build_ldv.add_argument('--fluid', choices=sorted(FLUIDS), default='salt')
+    build_ldv.add_argument('--rhos', type=float, default=2.65, help="The solids density (ton/m3)")
+    for axis, default in (('Dp', (0.05, 1.5, 24)), ('d', (0.02e-3, 20e-3, 48)), ('Cv', (0.005, 0.4, 32))):
+        build_ldv.add_argument(f'--{axis}', type=float, nargs=3, default=default, metavar=('LOW', 'HIGH', 'N'))
+    build_ldv.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    error = commands.add_parser('error', help="Measure the interpolation error of a table")
+    error.add_argument('path')
+    error.add_argument('-n', '--samples', type=int, default=2000)
+    args = parser.parse_args(argv)
+    if args.command in ('build', 'build-ldv'):
+        names = ('Dp', 'd', 'Cv', 'vls') if args.command == 'build' else ('Dp', 'd', 'Cv')
+        axes = {a: (lo, hi, int(n)) for a in names for lo, hi, n in [getattr(args, a)]}
+        if args.command == 'build':
+            table = ErhgTable.build(args.basis, args.fluid, args.rhos, workers=args.workers, **axes)
+        else:
+            table = LDVTable.build(args.fluid, args.rhos, workers=args.workers, **axes)
+        table.save(args.path)
+        result = table.table.error
+    else:
+        grid = GridTable.open(args.path)
+        table = LDVTable(grid) if grid.meta.get('kind') == LDVTable.KIND else ErhgTable(grid)
+        result = table.measure_error(args.samples)
+    print(f"max relative error {result['max']:0.3g}, 99th percentile {result['p99']:0.3g}, "
+          f"worst at {table.AXES}={result['worst']}")
+    if 'fallback' in result:
+        print(f"{result['fallback'] * 100:0.1f}% of points use the exact model")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+telemetry - Convergence records for the iterative solvers
+
+    from DHLLDV import telemetry
+
+    with telemetry.collect(on_failure='warn'):
+        run_the_sweep()
+    print(telemetry.report())
+
+The iterative solvers (the four loops in DHLLDV_framework.LDV, stratified.vls_FBSB,
+Wilson_V50.V50 and V50_list, Pump.point and DHLLDV_Utils.find_root) call record when
+enabled, with the steps taken, the final residual and whether they converged. For each
+call site this keeps the number of calls and failures, a histogram of the steps, the
+largest residual and the inputs of the last few failures. Non convergence can be made to
+warn (NonConvergenceWarning) or raise (ConvergenceError). A Wilson V50 answered from the
+Wilson_V50.V50_M cache is recorded as a Wilson_V50.V50 call of no steps.
+
+The steps are also passed on to instrument when it is enabled.
+"""
+import collections
+import threading
+import warnings
+
+from DHLLDV import instrument
+
+MAX_EXAMPLES = 10       # Failed inputs kept per call site
+
+enabled = False         # Checked by the solvers, True while collecting or instrumenting
+collecting = False
+on_failure = None       # None, 'warn' or 'raise'
+_lock = threading.Lock()
+
+
+class ConvergenceError(ArithmeticError):
+    """An iterative solver did not converge"""
+
+
+class NonConvergenceWarning(RuntimeWarning):
+    """An iterative solver did not converge"""
+
+
+class SiteStats():
+    """The convergence records for one call site"""
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.steps = collections.Counter()      # steps: number of calls
+        self.max_residual = 0.0
+        self.examples = collections.deque(maxlen=MAX_EXAMPLES)  # (inputs, steps, residual) of failures
+
+    def as_dict(self):
+        total = sum(n * c for n, c in self.steps.items())
+        return {'calls': self.calls,
+                'failures': self.failures,
+                'mean_steps': total / self.calls if self.calls else 0.0,
+                'max_steps': max(self.steps) if self.steps else 0,
+                'steps': dict(sorted(self.steps.items())),
+                'max_residual': self.max_residual,
+                'examples': list(self.examples),
+                }
+
+
+sites = {}              # call site: SiteStats
+
+
+def update_enabled():
+    """Set enabled from collecting and instrument.enabled"""
+    global enabled
+    enabled = collecting or instrument.enabled
+
+
+def record(site, steps, residual, converged, inputs=None):
+    """Record one solver call
+
+    site: The name of the call site, 'module.function' or 'module.function:loop'
+    steps: The iterations taken
+    residual: The final residual (or change in the solution) of the solver
+    converged: False if the solver stopped at its step limit
+    inputs: The inputs of the call, kept if it did not converge"""
+    if instrument.enabled:
+        instrument.iterations(site.split(':')[0], steps)
+    if not collecting:
+        return
+    with _lock:
+        s = sites.get(site)
+        if s is None:
+            s = sites[site] = SiteStats()
+        s.calls += 1
+        s.steps[steps] += 1
+        residual = abs(residual)
+        if residual > s.max_residual:
+            s.max_residual = residual
+        if not converged:
+            s.failures += 1
+            s.examples.append((inputs, steps, residual))
+    if not converged:
+        msg = f"{site} did not converge in {steps} steps, residual {residual:0.3g}, inputs {inputs}"
+        if on_failure == 'raise':
+            raise ConvergenceError(msg)
+        if on_failure == 'warn':
+            warnings.warn(msg, NonConvergenceWarning, stacklevel=3)
+
+
+def enable(failure=None, reset=True):
+    """Start collecting
+
+    failure: What to do when a solver does not converge: None (only record), 'warn' or 'raise'
+    reset: If True clear the records of earlier runs"""
+    global collecting, on_failure
+    if failure not in (None, 'warn', 'raise'):
+        raise ValueError(f"telemetry: on_failure must be None, 'warn' or 'raise', not {failure!r}")
+    if reset:
+        sites.clear()
+    on_failure = failure
+    collecting = True
+    update_enabled()
+
+
+def disable():
+    """Stop collecting, the records are kept"""
+    global collecting, on_failure
+    collecting = False
+    on_failure = None
+    update_enabled()
+
+
+class collect():
+    """Context manager to collect the solver records, yields the sites dict"""
+    def __init__(self, on_failure=None):
+        self.on_failure = on_failure
+
+    def __enter__(self):
+        enable(self.on_failure)
+        return sites
+
+    def __exit__(self, *exc):
+        disable()
+
+
+def summary():
+    """Return the records as a dict of {site: dict}, see SiteStats.as_dict"""
+    return {site: s.as_dict() for site, s in sites.items()}
+
+
+def report():
+    """Return a table of the call sites, with the histogram of steps"""
+    lines = [f"{'solver':40s} {'calls':>8s} {'failures':>8s} {'mean':>6s} {'max':>4s} {'max residual':>12s}  steps: calls"]
+    for site, s in sorted(sites.items()):
+        d = s.as_dict()
+        histogram = ' '.join(f'{n}:{c}' for n, c in d['steps'].items())
+        lines.append(f"{site:40s} {d['calls']:8d} {d['failures']:8d} {d['mean_steps']:6.2f} {d['max_steps']:4d} "
+                     f"{d['max_residual']:12.3g}  {histogram}")
+    return '\n'.join(lines)
@@ -52,17 +52,56 @@ def Vsm(Dp, d, rhol, rhos, musf, Cv, Cvb=0.6, f=None):
         Cvb = The bed concentration
         f =The friction factor, if given use WASC2 Eqn 5.1
     """
-    Cvrmx = Cvr_max(Dp, d, rhol, rhos)
     Vsmx = Vsm_max(Dp, d, rhol, rhos, musf, f=f)
+    Vs = Vsmx * Vsm_ratio(Dp, d, rhol, rhos, Cv, Cvb)
+    return min(Vs, Vsmx)
+
+def Vsm_ratio(Dp, d, rhol, rhos, Cv, Cvb=0.6):
+    """Return the ratio Vsm/Vsm_max of Eqn. 6.20-36, before limiting to 1
+    This does not depend on the velocity, see Vsm for the arguments"""
+    Cvrmx = Cvr_max(Dp, d, rhol, rhos)
     Cvr = Cv/Cvb
     if Cvrmx <= 0.33:
         alpha = log(0.333)/log(Cvrmx)
-        Vs = Vsmx * 6.75 * (Cvr**alpha) * (1 - Cvr**alpha)**2 # Eqn. 6.20-36
+        return 6.75 * (Cvr**alpha) * (1 - Cvr**alpha)**2 # Eqn. 6.20-36
     else:
         beta = log(0.666)/log(1-Cvrmx)
-        Vs = Vsmx * 6.75 * (1-Cvr)**2*beta * (1-(1-Cvr)**beta)  # Eqn. 6.20-36
+        return 6.75 * (1-Cvr)**2*beta * (1-(1-Cvr)**beta)  # Eqn. 6.20-36
 
-    return min(Vs, Vsmx)
+def Erhg_grid(vls_list, Dp, d_list, epsilon, nu, rhol, rhos, musf, Cvt_list, Cvb=0.6):
+    """Return the relative excess head loss for every particle diameter, concentration and velocity
+    The friction factor is calculated once per velocity, Vsm_max once per diameter and
+    the Vsm ratio once per diameter and concentration.
+            vls_list = average line speeds (velocity, m/sec)
+            d_list = Particle diameters (m)
+            Cvt_list = The delivered volume concentrations
+            Other arguments as for Erhg
+    returns a list (one per diameter) of lists (one per concentration) of Erhg (one per velocity)"""
+    alts = []
+    for Vls in vls_list:
+        f = swamee_jain_ff(pipe_reynolds_number(Vls, Dp, nu), Dp, epsilon)
+        alts.append((0.018/f)**0.13 * (2 * gravity*Dp*(rhos-rhol))**0.5 if f else None)
+    scale = musf/0.4
+    grid = []
+    for d in d_list:
+        base = Vsm_max(Dp, d, rhol, rhos, musf)
+        Vsmxs = [base if alt is None else min(alt, base) for alt in alts]
+        rows = []
+        for Cvt in Cvt_list:
+            K = min(Vsm_ratio(Dp, d, rhol, rhos, Cvt, Cvb), 1.0)
+            rows.append([scale * (0.55*Vsmx*K/Vls)**0.25 for Vsmx, Vls in zip(Vsmxs, vls_list)])
+        grid.append(rows)
+    return grid
+
+def Erhg_list(vls_list, Dp, d, epsilon, nu, rhol, rhos, musf, Cvt, Cvb=0.6):
+    """Return the relative excess head loss for each velocity in vls_list, see Erhg"""
+    return Erhg_grid(vls_list, Dp, [d], epsilon, nu, rhol, rhos, musf, [Cvt], Cvb)[0][0]
+
+def stratified_head_loss_list(vls_list, Dp, d, epsilon, nu, rhol, rhos, musf, Cvt, Cvb=0.6):
+    """Return the head loss for each velocity in vls_list, see stratified_head_loss"""
+    Rsd = (rhos - rhol) / rhol  # Eqn 8.2-1
+    Erhgs = Erhg_list(vls_list, Dp, d, epsilon, nu, rhol, rhos, musf, Cvt, Cvb)
+    return [fluid_head_loss(vls, Dp, epsilon, nu, rhol) + Rsd*Cvt*E for vls, E in zip(vls_list, Erhgs)]
 
 def Erhg(Vls, Dp, d, epsilon, nu, rhol, rhos, musf, Cvt, Cvb=0.6):
     """Return the relative excess head loss
@@ -1,8 +1,10 @@
 """
 Wilson_V50.py - Heterogenous transport using the Wilson V50 model
 """
+from functools import lru_cache
 from math import cosh, log, sqrt
 from DHLLDV.heterogeneous import vt_ruby
+from DHLLDV import telemetry
 from DHLLDV.DHLLDV_constants import gravity
 from DHLLDV.homogeneous import pipe_reynolds_number, swamee_jain_ff, fluid_head_loss
 
@@ -59,13 +61,85 @@ def V50(Dp, d50, d85, epsilon, nu, rhol, rhos):
     v50_last = w50 * sqrt(8/ff_last) * cosh(60*d50/Dp)
     Re = pipe_reynolds_number(v50_last, Dp, nu)
     ff_this = swamee_jain_ff(Re, Dp, epsilon)
+    steps = 0
     while int(ff_this*10000) != int(ff_last*10000): #4 digit agreement
         ff_last = ff_this
         v50_last = w50 * sqrt(8 / ff_last) * cosh(60 * d50 / Dp)
         Re = pipe_reynolds_number(v50_last, Dp, nu)
         ff_this = swamee_jain_ff(Re, Dp, epsilon)
+        steps += 1
+    if telemetry.enabled:
+        telemetry.record('Wilson_V50.V50', steps, ff_this - ff_last, True)
     return w50 * sqrt(8/ff_this) * cosh(60*d50/Dp)
 
+def V50_list(Dp, d50_list, epsilon, nu, rhol, rhos, rtol=1e-6, max_steps=50):
+    """Return the V50 for each d50 in the list, V50 does not depend on d85
+    Iterates the friction factor for all the diameters together, each stops when its
+    V50 changes by less than rtol (relative).
+            Dp = Pipe diameter (m)
+            d50_list = Median Particle diameters (m)
+            epsilon = absolute pipe roughness (m)
+            nu = fluid kinematic viscosity in m2/sec
+            rhol = density of the fluid (ton/m3)
+            rhos = particle density (ton/m3)
+            rtol = relative tolerance on V50
+            max_steps = the most iterations before giving up
+        """
+    bases = [w(d50, nu, rhol, rhos) * cosh(60 * d50 / Dp) for d50 in d50_list]
+    v50s = [b * sqrt(8 / 0.012) for b in bases]
+    active = list(range(len(bases)))
+    steps = 0
+    change = 0.0
+    while active and steps < max_steps:
+        still = []
+        change = 0.0
+        for i in active:
+            ff = swamee_jain_ff(pipe_reynolds_number(v50s[i], Dp, nu), Dp, epsilon)
+            v50 = bases[i] * sqrt(8 / ff)
+            change = max(change, abs(v50 - v50s[i]) / v50)
+            if abs(v50 - v50s[i]) > rtol * v50:
+                still.append(i)
+            v50s[i] = v50
+        active = still
+        steps += 1
+    if telemetry.enabled:
+        telemetry.record('Wilson_V50.V50_list', steps, change, not active,
+                         (Dp, [d50_list[i] for i in active], epsilon, nu, rhol, rhos))
+    return v50s
+
+def M_list(Dp, d50_list, d85_list, nu, rhol, rhos):
+    """Return M for each pair of d50 and d85 in the lists, see M"""
+    return [M(Dp, d50, d85, nu, rhol, rhos) for d50, d85 in zip(d50_list, d85_list)]
+
+@lru_cache(maxsize=1024)
+def V50_M(Dp, d50, d85, epsilon, nu, rhol, rhos):
+    """Return (V50, M) for the pipe and material, cached as neither depends on the velocity
+    The arguments are as for V50 and M"""
+    return V50(Dp, d50, d85, epsilon, nu, rhol, rhos), M(Dp, d50, d85, nu, rhol, rhos)
+
+def _V50_M(Dp, d50, d85, epsilon, nu, rhol, rhos):
+    """Return V50_M, with a call answered from the cache recorded by telemetry as a V50 of no steps,
+    so the V50 calls count the Erhg calls and not just the cache misses"""
+    if not telemetry.enabled:
+        return V50_M(Dp, d50, d85, epsilon, nu, rhol, rhos)
+    misses = V50_M.cache_info().misses
+    result = V50_M(Dp, d50, d85, epsilon, nu, rhol, rhos)
+    if V50_M.cache_info().misses == misses:
+        telemetry.record('Wilson_V50.V50', 0, 0.0, True)
+    return result
+
+def Erhg_list(vls_list, Dp, d50, d85, epsilon, nu, rhol, rhos, musf):
+    """Return the relative excess head loss for each velocity in vls_list, see Erhg
+    V50 and M are calculated once for the whole list"""
+    _V50, _M = _V50_M(Dp, d50, d85, epsilon, nu, rhol, rhos)
+    return [(musf/2)*(_V50/vls)**_M for vls in vls_list]
+
+def heterogeneous_head_loss_list(vls_list, Dp, d50, d85, epsilon, nu, rhol, rhos, Cvs, musf):
+    """Return the head loss (m.w.c per m) for each velocity in vls_list, see heterogeneous_head_loss"""
+    Rsd = (rhos - rhol)/rhol     # Eqn 8.2-1
+    Erhgs = Erhg_list(vls_list, Dp, d50, d85, epsilon, nu, rhol, rhos, musf)
+    return [E*Rsd*Cvs + fluid_head_loss(vls, Dp, epsilon, nu, rhol) for vls, E in zip(vls_list, Erhgs)]
+
 def Erhg(vls, Dp, d50, d85, epsilon, nu, rhol, rhos, musf):
     """Return the relative excess head loss using gthe Wilson V50 model
             Vls = average line speed (velocity, m/sec)
@@ -78,8 +152,7 @@ def Erhg(vls, Dp, d50, d85, epsilon, nu, rhol, rhos, musf):
             rhos = particle density (ton/m3)
             musf = The coefficient of sliding friction
         """
-    _M = M(Dp, d50, d85, nu, rhol, rhos)
-    _V50 = V50(Dp, d50, d85, epsilon, nu, rhol, rhos)
+    _V50, _M = _V50_M(Dp, d50, d85, epsilon, nu, rhol, rhos)
     return (musf/2)*(_V50/vls)**_M
 
 def heterogeneous_pressure_loss(vls, Dp, d50, d85, epsilon, nu, rhol, rhos, Cvs, musf):
@@ -0,0 +1,127 @@
+"""test_BoosterObj.py - Tests of the PumpTrain with pumps in series along a pipeline"""
+
+import unittest
+
+from DHLLDV.DHLLDV_Utils import interpDict
+from DHLLDV.PipeObj import Pipe, Pipeline
+from DHLLDV.PumpObj import Pump
+from DHLLDV.SlurryObj import Slurry
+from DHLLDV.BoosterObj import PumpTrain, Station, plan_stations
+
+H = interpDict({0.3567568: 30.093008, 0.7135136: 29.489334, 1.0702704: 29.090661,
+                1.4270272: 28.781914, 1.7837840: 28.474970, 2.1405408: 28.104580,
+                2.4972976: 27.627627, 2.8540544: 27.023164, 3.0324328: 26.672462,
+                3.2108112: 26.291587, 3.5675680: 25.452159, 3.9243248: 24.538921,
+                4.2810816: 23.595749, 4.6378384: 22.671603, 4.9945952: 21.816991,
+                5.3513520: 21.082392})
+P = interpDict({0.356757: 229.184279, 0.713514: 344.839984, 1.070270: 450.410668,
+                1.427027: 553.727956, 1.783784: 656.571060, 2.140541: 758.888651,
+                2.497298: 860.271806, 2.854054: 960.803020, 3.032433: 1011.056064,
+                3.210811: 1061.634585, 3.567568: 1165.351961, 3.924325: 1276.124040,
+                4.281082: 1399.632204, 4.637838: 1542.729293, 4.994595: 1712.676097,
+                5.351352: 1915.670989})
+
+
+class TestPumpTrain(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.slurry = Slurry(Cv=0.1)
+        cls.pipeline = Pipeline([Pipe('Entrance', 0.8636, 0, 0.5, -10.0),
+                                 Pipe('Discharge', 0.762, 1500, 1.0, 1.5)],
+                                slurry=cls.slurry)
+
+    def setUp(self):
+        stations = [Station(Pump("Test Pump", 3.5, 1.88, 0.8636, 0.8636, H, P, 1500, 'none', self.slurry), x)
+                    for x in (0, 500, 1000)]
+        self.train = PumpTrain(self.pipeline, stations)
+
+    def test_profile_delivery(self):
+        """The delivery pressure is the pump heads less the system head"""
+        Q = 2.5
+        profile = self.train.pressure_profile(Q)
+        heads = sum(s['head'] for s in profile['stations'])
+        self.assertAlmostEqual(profile['delivery'], heads - self.train.required_head(Q), places=6)
+
+    def test_profile_stations(self):
+        """The discharge of a station is the suction plus the pump head"""
+        profile = self.train.pressure_profile(2.5)
+        for s in profile['stations']:
+            with self.subTest(chainage=s['chainage']):
+                self.assertAlmostEqual(s['discharge'], s['suction'] + s['head'], places=9)
+
+    def test_pump_slurry(self):
+        """The pumps handle the pipeline slurry, and keep their own"""
+        own = Slurry(Cv=0.3)
+        pump = Pump("Test Pump", 3.5, 1.88, 0.8636, 0.8636, H, P, 1500, 'none', own)
+        profile = PumpTrain(self.pipeline, [Station(pump, 0)]).pressure_profile(2.5)
+        self.assertIs(pump.slurry, own)
+        self.assertEqual(profile['stations'][0]['head'], pump.point(2.5, rhom=self.slurry.rhom)[1])
+
+    def test_optimize_speeds(self):
+        """The optimized speeds just deliver the flow"""
+        Q = 2.5
+        result = self.train.optimize_speeds(Q)
+        self.assertGreaterEqual(result['head'], self.train.required_head(Q))
+        self.assertLess(result['power'], sum(s['power'] for s in self.train.pressure_profile(Q)['stations']))
+        self.train.set_speeds(result['speeds'])
+        self.assertGreaterEqual(self.train.pressure_profile(Q)['delivery'], 0.0)
+
+    def test_optimize_speeds_workers(self):
+        """The process pool gives the same answer as the serial search"""
+        self.assertEqual(self.train.optimize_speeds(2.5), self.train.optimize_speeds(2.5, workers=2))
+
+    def test_optimize_speeds_impossible(self):
+        """No speeds can deliver against too low a discharge limit"""
+        self.assertIsNone(self.train.optimize_speeds(2.5, max_discharge=10.0))
+
+
+class TestPlanStations(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.slurry = Slurry(Cv=0.1)
+        cls.pipeline = Pipeline([Pipe('Entrance', 0.8636, 0, 0.5, -10.0),
+                                 Pipe('Discharge', 0.762, 5000, 1.0, 1.5),
+                                 Pipe('Climb', 0.762, 5000, 1.0, 12.5)],
+                                slurry=cls.slurry)
+        cls.pumps = [Pump("Small", 3.5, 1.88, 0.8636, 0.8636, H, P, 1500, 'none', cls.slurry),
+                     Pump("Big", 3.5, 1.88, 0.8636, 0.8636, H, P, 3500, 'none', cls.slurry)]
+        cls.pumps[1].current_speed = 5.5
+
+    def check_plan(self, plan, Q):
+        """Check the pressures along the planned pipeline"""
+        profile = PumpTrain(self.pipeline, plan['stations']).pressure_profile(Q)
+        self.assertGreaterEqual(min(profile['pressure']), -7.0 - 1e-9)
+        self.assertLessEqual(max(profile['pressure']), 100.0 + 1e-9)
+        self.assertGreaterEqual(profile['delivery'], 0.0)
+
+    def test_plan_count(self):
+        """Plan the fewest stations"""
+        plan = plan_stations(self.pipeline, self.pumps, 2.5, -7.0, 100.0, step=10.0)
+        self.assertEqual(plan['count'], 7)
+        self.assertEqual(plan['stations'][0].chainage, 0)
+        self.check_plan(plan, 2.5)
+
+    def test_plan_power(self):
+        """Plan the least power, which uses more, smaller stations"""
+        by_count = plan_stations(self.pipeline, self.pumps, 2.5, -7.0, 100.0, step=10.0)
+        by_power = plan_stations(self.pipeline, self.pumps, 2.5, -7.0, 100.0, step=10.0,
+                                 objective='power', placement='early')
+        self.assertLessEqual(by_power['power'], by_count['power'])
+        self.assertGreaterEqual(by_power['count'], by_count['count'])
+        self.check_plan(by_power, 2.5)
+
+    def test_plan_impossible(self):
+        """A pipe rating below the pump head leaves no plan"""
+        self.assertIsNone(plan_stations(self.pipeline, self.pumps, 2.5, -7.0, 20.0))
+
+    def test_pump_slurry(self):
+        """The pumps are planned with the pipeline slurry, and keep their own"""
+        own = Slurry(Cv=0.3)
+        pumps = [Pump("Big", 3.5, 1.88, 0.8636, 0.8636, H, P, 3500, 'none', own)]
+        pumps[0].current_speed = 5.5
+        plan = plan_stations(self.pipeline, pumps, 2.5, -7.0, 100.0, step=10.0)
+        self.assertIs(pumps[0].slurry, own)
+        self.assertAlmostEqual(plan['head'], plan['count'] * pumps[0].point(2.5, rhom=self.slurry.rhom)[1], places=9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""test_HeadLossModels.py - Tests of the head loss model registry"""
+
+import unittest
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV import HeadLossModels
+from DHLLDV import SlurryObj
+from DHLLDV.HeadLossModels import SlurrySpec
+from Wilson import Wilson_V50
+
+
+class TestHeadLossModels(unittest.TestCase):
+    def setUp(self):
+        self.spec = SlurrySpec(Dp=0.762, d50=0.2/1000, d85=0.3/1000, d15=0.2/1000/1.5, Cv=0.1)
+        self.vls_list = [(i + 1) / 2. for i in range(20)]
+
+    def test_models_registered(self):
+        """The DHLLDV and Wilson models are in the registry"""
+        for name in ('DHLLDV Cvs', 'DHLLDV Cvt', 'DHLLDV graded Cvt', 'Wilson V50', 'Wilson stratified'):
+            with self.subTest(model=name):
+                self.assertIn(name, HeadLossModels.models())
+
+    def test_matches_direct(self):
+        """The registered models match calling the model functions directly"""
+        s = self.spec
+        r = HeadLossModels.compare(s, self.vls_list, ['DHLLDV Cvt', 'Wilson V50'])
+        for i, vls in enumerate(self.vls_list):
+            self.assertAlmostEqual(r['DHLLDV Cvt']['Erhg'][i],
+                                   DHLLDV_framework.Cvt_Erhg(vls, s.Dp, s.d50, s.epsilon, s.nu, s.rhol, s.rhos, s.Cv),
+                                   places=12)
+            self.assertAlmostEqual(r['Wilson V50']['im'][i],
+                                   Wilson_V50.heterogeneous_head_loss(vls, s.Dp, s.d50, s.d85, s.epsilon, s.nu,
+                                                                      s.rhol, s.rhos, s.Cv, s.musf),
+                                   places=12)
+
+    def test_graded(self):
+        """The graded model matches Erhg_graded with the same GSD"""
+        s = self.spec
+        GSD = {0.15: s.d15, 0.50: s.d50, 0.85: s.d85}
+        r = HeadLossModels.evaluate('DHLLDV graded Cvt', s, self.vls_list)
+        for vls, E in zip(self.vls_list, r['Erhg']):
+            self.assertAlmostEqual(E, DHLLDV_framework.Erhg_graded(GSD, vls, s.Dp, s.epsilon, s.nu, s.rhol,
+                                                                   s.rhos, s.Cv, Cvt_eq_Cvs=True), places=12)
+
+    def test_register(self):
+        """A new model can be registered and compared"""
+        @HeadLossModels.register('Test homogeneous')
+        def homogeneous_model(spec, vls_list, shared):
+            return [1.0] * len(vls_list)
+        try:
+            r = HeadLossModels.compare(self.spec, self.vls_list, ['Test homogeneous'])
+            self.assertEqual(r['Test homogeneous']['im'][0], self.spec.Rsd * self.spec.Cv + r['il'][0])
+        finally:
+            HeadLossModels._models.pop('Test homogeneous')
+
+    def test_to_slurry(self):
+        """The Slurry curves are generated once, for the fluid and solids of the spec"""
+        s = SlurrySpec(Dp=0.5, d50=0.5/1000, rhos=2.0, rhol=1.0, nu=1.0e-6, Cv=0.2)
+        generated = []
+        generate_curves = SlurryObj.Slurry.generate_curves
+        SlurryObj.Slurry.generate_curves = lambda slurry: generated.append(slurry) or generate_curves(slurry)
+        try:
+            slurry = s.to_slurry(vls_max=12.0)
+        finally:
+            SlurryObj.Slurry.generate_curves = generate_curves
+        self.assertEqual(generated, [slurry])
+        self.assertEqual(len(slurry.vls_list), 121)
+        self.assertEqual(slurry.Erhg_curves['Cvt_Erhg'][39],
+                         DHLLDV_framework.Cvt_Erhg(4.0, s.Dp, s.d50, s.epsilon, s.nu, s.rhol, s.rhos, s.Cv))
+
+    def test_unknown_model(self):
+        with self.assertRaises(KeyError):
+            HeadLossModels.evaluate('No such model', self.spec, self.vls_list)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""test_PumpCatalog.py - Tests of the pump curve library"""
+
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from DHLLDV.PumpCatalog import PumpCatalog
+
+Q = [0.3567568, 0.7135136, 1.0702704, 1.4270272, 1.7837840, 2.1405408, 2.4972976, 2.8540544,
+     3.2108112, 3.5675680, 3.9243248, 4.2810816, 4.6378384, 4.9945952, 5.3513520]
+H = [30.093008, 29.489334, 29.090661, 28.781914, 28.474970, 28.104580, 27.627627, 27.023164,
+     26.291587, 25.452159, 24.538921, 23.595749, 22.671603, 21.816991, 21.082392]
+P = [229.184279, 344.839984, 450.410668, 553.727956, 656.571060, 758.888651, 860.271806, 960.803020,
+     1061.634585, 1165.351961, 1276.124040, 1399.632204, 1542.729293, 1712.676097, 1915.670989]
+
+
+def scaled_pump(name, flow_scale, head_scale, power_scale=None):
+    """A pump entry made by scaling the test pump curve"""
+    if power_scale is None:
+        power_scale = flow_scale * head_scale
+    return {'name': name, 'design_speed': 3.5, 'design_impeller': 1.88,
+            'suction_dia': 0.8636, 'disch_dia': 0.8636, 'avail_power': 3000 * power_scale,
+            'limited': 'none',
+            'Q': [q * flow_scale for q in Q],
+            'H': [h * head_scale for h in H],
+            'P': [p * power_scale for p in P]}
+
+
+class TestPumpCatalog(unittest.TestCase):
+    def setUp(self):
+        self.entries = [scaled_pump('Small', 0.5, 1.0),
+                        scaled_pump('Base', 1.0, 1.0),
+                        scaled_pump('Lossy', 1.0, 1.0, 1.2),
+                        scaled_pump('High head', 1.0, 2.0),
+                        scaled_pump('Large', 2.0, 1.0)]
+        self.catalog = PumpCatalog(self.entries)
+
+    def test_candidates(self):
+        """The small pump can't reach the flow, and only the high head pump has the head"""
+        self.assertEqual(sorted(self.catalog.candidates(3.0, 20.0)), [1, 2, 3, 4])
+        self.assertEqual(self.catalog.candidates(3.0, 40.0), [3])
+
+    def test_duty_head(self):
+        """The pump slows to just meet the required head"""
+        match = self.catalog.duty(1, 2.0, 20.0)
+        self.assertAlmostEqual(match['head'], 20.0, places=3)
+        self.assertLess(match['speed'], 3.5)
+
+    def test_best_match(self):
+        """The pumps are sorted by efficiency, with the lossy pump behind the base pump"""
+        names = [m['name'] for m in self.catalog.best_match(lambda q: 10 + 2 * q ** 2, 2.5)]
+        self.assertLess(names.index('Base'), names.index('Lossy'))
+        self.assertNotIn('Small', names)
+
+    def test_best_match_slurry(self):
+        """Slurry density raises the pump head"""
+        water = self.catalog.best_match(28.0, 3.0)
+        slurry = self.catalog.best_match(28.0, 3.0, rhom=1.3)
+        self.assertLess(len(water), len(slurry))
+
+    def test_load_files(self):
+        """Load the same pumps from JSON and CSV files"""
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, 'pumps.json'), 'w') as f:
+                json.dump({'pumps': self.entries[:2]}, f)
+            with open(os.path.join(folder, 'pumps.csv'), 'w', newline='') as f:
+                fields = ['name', 'design_speed', 'design_impeller', 'suction_dia', 'disch_dia',
+                          'avail_power', 'limited', 'Q', 'H', 'P']
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                for e in self.entries[2:]:
+                    for q, h, p in zip(e['Q'], e['H'], e['P']):
+                        writer.writerow(dict(e, Q=q, H=h, P=p))
+            catalog = PumpCatalog()
+            self.assertEqual(catalog.load(folder), 5)
+        self.assertEqual([m['name'] for m in catalog.best_match(20.0, 3.0)],
+                         [m['name'] for m in self.catalog.best_match(20.0, 3.0)])
+
+    def test_pump(self):
+        """The Pump object for an entry gives the same head as the catalog"""
+        match = self.catalog.duty(1, 2.0, 20.0)
+        pump = self.catalog.pump(1, slurry=None)
+        pump.slurry.rhom = 1.0
+        pump.current_speed = match['speed']
+        self.assertAlmostEqual(pump.point(2.0)[1], match['head'], places=6)
+
+    def test_efficiency(self):
+        """Below the design speed the catalog efficiency is the Pump efficiency"""
+        match = self.catalog.duty(1, 2.0, 20.0)
+        self.assertLess(match['speed'], 3.5)
+        pump = self.catalog.pump(1, slurry=None)
+        pump.slurry.rhom = 1.0
+        pump.current_speed = match['speed']
+        self.assertAlmostEqual(match['efficiency'], pump.efficiency(2.0, exact=True), places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
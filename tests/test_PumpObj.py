@@ -4,6 +4,7 @@ Added by R. Ramsdell 14 September 2021"""
 
 import unittest
 
+from DHLLDV import telemetry
 from DHLLDV.DHLLDV_Utils import interpDict
 from DHLLDV.PumpObj import Pump
 
@@ -110,5 +111,48 @@ class MyTestCase(unittest.TestCase):
         with self.subTest(msg='Test the torque limited head'):
             self.assertAlmostEqual(H, 20.926, places=3)
 
+    def test_power_limited_convergence(self):
+        """The reduced speed search records whether it converged"""
+        self.pump.limited = 'power'
+        with telemetry.collect() as sites:
+            self.pump.point(2.854054)
+            self.pump.point(2.854054, max_steps=1)
+        s = sites['PumpObj.Pump.point']
+        self.assertEqual((s.calls, s.failures), (2, 1))
+        self.assertEqual(s.examples[0][0], ("Test Pump", 2.854054, 3.5, self.pump.slurry.rhom))
+
+    def test_surface_head_power(self):
+        """Test the head and power from the precomputed surface against the exact calculation"""
+        self.pump.build_surface()
+        self.pump.current_speed = 3.377719
+        Q, H, P, N = self.pump.point(2.854054)
+        Qx, Hx, Px, Nx = self.pump.point(2.854054, exact=True)
+        with self.subTest(msg='Test the surface head'):
+            self.assertAlmostEqual(H, Hx, places=2)
+        with self.subTest(msg='Test the surface power'):
+            self.assertAlmostEqual(P, Px, delta=0.5)
+
+    def test_surface_efficiency(self):
+        """Test the efficiency from the precomputed surface"""
+        self.pump.build_surface()
+        self.assertAlmostEqual(self.pump.efficiency(2.957377), 0.78603, places=3)
+
+    def test_surface_fallback(self):
+        """Test that a point off the surface uses the exact calculation"""
+        self.pump.build_surface(min_speed=3.0)
+        self.pump.current_speed = 2.5
+        self.assertIsNone(self.pump.surface.lookup(2.0, 2.5))
+        self.assertEqual(self.pump.point(2.0), self.pump.point(2.0, exact=True))
+
+    def test_surface_power_limited(self):
+        """Test the power limited case using the surface"""
+        self.pump.build_surface()
+        self.pump.limited = 'power'
+        Q, H, P, N = self.pump.point(2.854054)
+        with self.subTest(msg='Test the power limited power'):
+            self.assertAlmostEqual(P, 894.97, places=0)
+        with self.subTest(msg='Test the power limited head'):
+            self.assertAlmostEqual(H, 25.131, places=1)
+
 if __name__ == '__main__':
     unittest.main()
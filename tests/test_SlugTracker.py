@@ -0,0 +1,69 @@
+"""test_SlugTracker.py - Tests of the density slug simulation"""
+
+import unittest
+from math import pi
+
+from DHLLDV.DHLLDV_Utils import interpDict
+from DHLLDV.PipeObj import Pipe, Pipeline
+from DHLLDV.PumpObj import Pump
+from DHLLDV.SlurryObj import Slurry
+from DHLLDV.BoosterObj import PumpTrain, Station
+from DHLLDV.SlugTracker import SlugTracker
+
+H = interpDict({0.3567568: 30.093008, 0.7135136: 29.489334, 1.0702704: 29.090661,
+                1.4270272: 28.781914, 1.7837840: 28.474970, 2.1405408: 28.104580,
+                2.4972976: 27.627627, 2.8540544: 27.023164, 3.2108112: 26.291587,
+                3.5675680: 25.452159, 3.9243248: 24.538921, 4.2810816: 23.595749,
+                4.6378384: 22.671603, 4.9945952: 21.816991, 5.3513520: 21.082392})
+P = interpDict({0.356757: 229.184279, 0.713514: 344.839984, 1.070270: 450.410668,
+                1.427027: 553.727956, 1.783784: 656.571060, 2.140541: 758.888651,
+                2.497298: 860.271806, 2.854054: 960.803020, 3.210811: 1061.634585,
+                3.567568: 1165.351961, 3.924325: 1276.124040, 4.281082: 1399.632204,
+                4.637838: 1542.729293, 4.994595: 1712.676097, 5.351352: 1915.670989})
+
+
+class TestSlugTracker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.slurry = Slurry(Cv=0.1)
+        cls.pipeline = Pipeline([Pipe('Entrance', 0.8636, 0, 0.5, -10.0),
+                                 Pipe('Discharge', 0.762, 1000, 1.0, 1.5),
+                                 Pipe('Shore', 0.762, 500, 1.0, 0.0)],
+                                slurry=cls.slurry)
+
+    def setUp(self):
+        stations = [Station(Pump("Test Pump", 3.5, 1.88, 0.8636, 0.8636, H, P, 1500, 'none', self.slurry), x)
+                    for x in (0, 500, 1000)]
+        self.train = PumpTrain(self.pipeline, stations)
+
+    def test_section_sums(self):
+        """The running section totals match the cells"""
+        tracker = SlugTracker(self.train, cells=300, Cv=0.0)
+        for i in range(250):
+            tracker.push(0.01 * (i % 17))
+        for k, (s, e) in enumerate(zip(tracker.starts, tracker.ends)):
+            with self.subTest(section=k):
+                self.assertAlmostEqual(tracker.sums[k], sum(tracker.Cv_at(i) for i in range(s, e)), places=9)
+
+    def test_uniform_head(self):
+        """With the slurry Cv everywhere, the head matches the pipeline system head"""
+        tracker = SlugTracker(self.train, cells=300)
+        self.assertAlmostEqual(tracker.system_head(2.5), self.pipeline.calc_system_head(2.5)[0], delta=0.5)
+
+    def test_slug_transit(self):
+        """A slug reaches the discharge after the line volume has been pumped"""
+        tracker = SlugTracker(self.train, cells=300, Cv=0.0)
+        results = tracker.run(1200, lambda t: 0.1, Q_guess=3.0)
+        volume = sum(p.length * pi * (p.diameter / 2) ** 2 for p in self.pipeline.pipesections)
+        pumped = 0.0
+        for t, Q, Cv_out in zip(results['t'], results['Q'], results['Cv_out']):
+            if Cv_out > 0:
+                break
+            pumped += Q
+        self.assertAlmostEqual(pumped, volume, delta=2 * tracker.cell_volume + max(results['Q']))
+        self.assertLess(results['Q'][-1], results['Q'][0])
+        self.assertAlmostEqual(results['Cv_mean'][-1], 0.1, places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
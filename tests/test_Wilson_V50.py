@@ -47,6 +47,25 @@ class MyTestCase(unittest.TestCase):
                                                            self.rhos, 0.2, self.musf)
         self.assertAlmostEqual(im, 0.0612, places=1)
 
+    def test_V50_list(self):
+        """The V50 of a list of diameters matches V50 for each diameter"""
+        d50s = [0.2/1000, 0.7/1000, 2.0/1000]
+        d85s = [d*1.5 for d in d50s]
+        v50s = Wilson.Wilson_V50.V50_list(0.65, d50s, self.epsilon, self.nu, self.rhol, self.rhos)
+        for d50, d85, v50 in zip(d50s, d85s, v50s):
+            with self.subTest(d50=d50):
+                _v50 = Wilson.Wilson_V50.V50(0.65, d50, d85, self.epsilon, self.nu, self.rhol, self.rhos)
+                self.assertAlmostEqual(v50/_v50, 1.0, places=3)
+
+    def test_Erhg_list(self):
+        """The Erhg of a list of velocities matches Erhg for each velocity"""
+        vls_list = [(i+1)/10. for i in range(100)]
+        Erhgs = Wilson.Wilson_V50.Erhg_list(vls_list, 0.65, 0.7/1000, 1.0/1000, self.epsilon,
+                                            self.nu, self.rhol, self.rhos, self.musf)
+        for vls, E in zip(vls_list, Erhgs):
+            self.assertEqual(E, Wilson.Wilson_V50.Erhg(vls, 0.65, 0.7/1000, 1.0/1000, self.epsilon,
+                                                       self.nu, self.rhol, self.rhos, self.musf))
+
 
 if __name__ == '__main__':
     unittest.main()
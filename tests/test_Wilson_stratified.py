@@ -61,6 +61,20 @@ class MyTestCase(unittest.TestCase):
                                                        0.0714)
         self.assertAlmostEqual(p, 553./1000, delta=.015)
 
+    def test_Erhg_grid(self):
+        """The grid matches Erhg for each diameter, concentration and velocity, both Cvr_max branches"""
+        vls_list = [(i+1)/10. for i in range(100)]
+        d_list = [0.2/1000, 1.0/1000, 100./1000]
+        Cvt_list = [0.05, 0.15, 0.3]
+        grid = Wilson_Stratified.Erhg_grid(vls_list, 0.7, d_list, 79.5e-05, .00109/1020,
+                                           1.02, 1.790, 0.31, Cvt_list)
+        for d, rows in zip(d_list, grid):
+            for Cvt, Erhgs in zip(Cvt_list, rows):
+                with self.subTest(d=d, Cvt=Cvt):
+                    for vls, E in zip(vls_list, Erhgs):
+                        self.assertAlmostEqual(E, Wilson_Stratified.Erhg(vls, 0.7, d, 79.5e-05, .00109/1020,
+                                                                         1.02, 1.790, 0.31, Cvt), places=12)
+
 if __name__ == '__main__':
     unittest.main()
 
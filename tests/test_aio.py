@@ -0,0 +1,100 @@
+"""test_aio.py - Tests of the asyncio facade"""
+
+import asyncio
+import threading
+import unittest
+
+from DHLLDV import aio
+from DHLLDV import HeadLossModels
+from DHLLDV.HeadLossModels import SlurrySpec
+
+
+class TestEvaluator(unittest.TestCase):
+    def test_evaluate_curves(self):
+        """The curves match compare, in chunks"""
+        spec = SlurrySpec(Dp=0.5, Cv=0.2)
+        vls_list = [1.0, 2.0, 3.0, 4.0, 5.0]
+        names = ['DHLLDV Cvt', 'Wilson V50']
+
+        async def run():
+            async with aio.Evaluator(chunk_size=2) as evaluator:
+                return await evaluator.evaluate_curves(spec, vls_list, names)
+        self.assertEqual(asyncio.run(run()), HeadLossModels.compare(spec, vls_list, names))
+
+    def test_coalesce(self):
+        """Identical requests in flight are calculated once"""
+        calls = []
+
+        async def run():
+            async with aio.Evaluator() as evaluator:
+                async def make():
+                    calls.append(1)
+                    await asyncio.sleep(0.01)
+                    return len(calls)
+                results = await asyncio.gather(*[evaluator._run('key', make) for _ in range(3)])
+                self.assertEqual(evaluator.pending, 0)
+                return results
+        self.assertEqual(asyncio.run(run()), [1, 1, 1])
+        self.assertEqual(len(calls), 1)
+
+    def test_backpressure(self):
+        """No more than max_pending calculations run at once"""
+        running = []
+        peak = []
+
+        async def run():
+            async with aio.Evaluator(max_pending=2) as evaluator:
+                async def make():
+                    running.append(1)
+                    peak.append(len(running))
+                    await asyncio.sleep(0.01)
+                    running.pop()
+                    return True
+                return await asyncio.gather(*[evaluator._run(i, make) for i in range(5)])
+        self.assertEqual(asyncio.run(run()), [True] * 5)
+        self.assertEqual(max(peak), 2)
+
+    def test_cancel(self):
+        """Cancelling every caller stops the remaining chunks"""
+        started = []
+        release = threading.Event()
+
+        def slow(spec, vls_list, names):
+            started.append(vls_list)
+            release.wait(5)
+            return HeadLossModels.compare(spec, vls_list, names)
+
+        async def run():
+            async with aio.Evaluator(chunk_size=1) as evaluator:
+                original, aio._compare = aio._compare, slow
+                try:
+                    task = asyncio.ensure_future(evaluator.evaluate_curves(vls_list=[1.0, 2.0, 3.0],
+                                                                            models=['DHLLDV Cvs']))
+                    while not started:
+                        await asyncio.sleep(0.001)
+                    task.cancel()
+                    with self.assertRaises(asyncio.CancelledError):
+                        await task
+                    release.set()
+                    await asyncio.sleep(0.05)
+                    self.assertEqual(evaluator.pending, 0)
+                finally:
+                    aio._compare = original
+        asyncio.run(run())
+        self.assertEqual(started, [[1.0]])
+
+    def test_ldv(self):
+        spec = SlurrySpec(Cv=0.1)
+        self.assertEqual(asyncio.run(aio.ldv(spec)), aio._ldv(spec))
+
+    def test_system_heads(self):
+        """The system heads use the whole slurry of the spec"""
+        pipeline = [{'name': 'Discharge', 'diameter': 0.762, 'length': 1000, 'K': 1.0}]
+        heavy, = asyncio.run(aio.system_heads([3.0], pipeline, SlurrySpec(Cv=0.1)))
+        light, = asyncio.run(aio.system_heads([3.0], pipeline, SlurrySpec(Cv=0.1, rhos=2.0)))
+        self.assertEqual(light[1], heavy[1])
+        self.assertLess(light[0], heavy[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
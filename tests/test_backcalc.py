@@ -0,0 +1,120 @@
+"""test_backcalc.py - Tests of the concentration back-calculation from logs"""
+
+import csv
+import math
+import os
+import tempfile
+import unittest
+
+from DHLLDV import DHLLDV_framework, backcalc, homogeneous
+from DHLLDV.DHLLDV_constants import steel_roughness
+
+Dp = 0.762
+fluid = (steel_roughness, 1.0508e-6, 1.0248103, 2.65)
+Rsd = (2.65 - 1.0248103) / 1.0248103
+area = math.pi * Dp ** 2 / 4
+GSD = {0.15: 0.0005, 0.50: 0.001, 0.85: 0.00272}
+
+
+def im(Erhg, vls, Cv):
+    return Erhg * Rsd * Cv + homogeneous.fluid_head_loss(vls, Dp, *fluid[:3])
+
+
+def samples(n=40):
+    """Return the log rows (time, Q, im, rhom) and the true Cvt, for a varying 1 mm Cvt slurry"""
+    rows = []
+    Cvs = []
+    for i in range(n):
+        vls = 5.0 + math.sin(i / 5.0)
+        Cv = 0.15 + 0.1 * math.sin(i / 7.0)
+        rows.append((i * 0.1, vls * area, im(DHLLDV_framework.Cvt_Erhg(vls, Dp, 0.001, *fluid, Cv), vls, Cv),
+                     1.0248103 + Cv * (2.65 - 1.0248103)))
+        Cvs.append(Cv)
+    return rows, Cvs
+
+
+class TestBackCalc(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.rows, cls.Cvs = samples()
+        cls.log = os.path.join(cls.tmp.name, 'log.csv')
+        with open(cls.log, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time', 'Q', 'im', 'rhom'])
+            writer.writerows(cls.rows)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def read(self, path):
+        chunks = list(backcalc.read_chunks(path, backcalc.COLUMNS))
+        return {name: [v for chunk in chunks for v in chunk[name]] for name in backcalc.COLUMNS}
+
+    def test_csv(self):
+        """The back-calculated Cvt is the Cvt that made the log"""
+        output = os.path.join(self.tmp.name, 'out.csv')
+        count = backcalc.run(self.log, output, backcalc.BackCalculator('Cvt', Dp, 0.001), chunk_size=7)
+        self.assertEqual(count, len(self.rows))
+        result = self.read(output)
+        for Cv, expected, density in zip(result['Cv'], self.Cvs, result['Cv_density']):
+            self.assertAlmostEqual(Cv, expected, places=6)
+            self.assertAlmostEqual(density, expected, places=9)
+
+    def test_binary(self):
+        """Binary logs give the same results, in any chunk size"""
+        log = os.path.join(self.tmp.name, 'log.dlb')
+        with open(log, 'wb') as f:
+            writer = backcalc.BinaryWriter(f, ['time', 'Q', 'im'])
+            writer.write_chunk({'time': [r[0] for r in self.rows], 'Q': [r[1] for r in self.rows],
+                                'im': [r[2] for r in self.rows]})
+        outputs = []
+        for chunk_size in (3, 1000):
+            output = os.path.join(self.tmp.name, f'out{chunk_size}.dlb')
+            backcalc.run(log, output, backcalc.BackCalculator('Cvt', Dp, 0.001), chunk_size=chunk_size)
+            outputs.append(self.read(output))
+        self.assertEqual(outputs[0]['Cv'], outputs[1]['Cv'])
+        for Cv, expected in zip(outputs[0]['Cv'], self.Cvs):
+            self.assertAlmostEqual(Cv, expected, places=6)
+        self.assertTrue(all(math.isnan(Cv) for Cv in outputs[0]['Cv_density']))
+
+    def test_samples(self):
+        """Samples without solids or with missing values"""
+        calculator = backcalc.BackCalculator('Cvs', Dp, 0.001)
+        il = homogeneous.fluid_head_loss(4.0, Dp, *fluid[:3])
+        self.assertEqual(calculator.Cv(4.0, il * 0.99), 0.0)
+        self.assertTrue(math.isnan(calculator.Cv(math.nan, 0.1)))
+        self.assertTrue(math.isnan(calculator.Cv(4.0, math.nan)))
+        self.assertTrue(math.isnan(calculator.Cv(4.0, 10.0)))
+        self.assertEqual(calculator.failures, 1)
+        target = im(DHLLDV_framework.Cvs_Erhg(4.0, Dp, 0.001, *fluid, 0.2), 4.0, 0.2)
+        self.assertAlmostEqual(calculator.Cv(4.0, target), 0.2, places=6)
+
+    def test_low_velocity(self):
+        """A slow sample of a coarse slurry (a pump starting) where the Erhg is complex"""
+        calculator = backcalc.BackCalculator('Cvt', Dp=1.1, d=0.011)
+        self.assertTrue(math.isnan(calculator.Cv(0.3, 0.05)))
+        self.assertEqual(calculator.failures, 1)
+
+    def test_graded(self):
+        calculator = backcalc.BackCalculator('graded Cvt', Dp, GSD=GSD)
+        fracs = DHLLDV_framework.create_fracs(GSD, Dp, 1.0508e-6, 1.0248103, 2.65)
+        for vls, Cv in ((4.0, 0.1), (4.2, 0.12), (6.0, 0.3)):
+            Erhg = DHLLDV_framework.Erhg_graded(fracs, vls, Dp, *fluid, Cv, Cvt_eq_Cvs=True, num_fracs=None)
+            self.assertAlmostEqual(calculator.Cv(vls, im(Erhg, vls, Cv)), Cv, places=6)
+
+    def test_models(self):
+        self.assertRaises(ValueError, backcalc.BackCalculator, 'Wilson', Dp, 0.001)
+        self.assertRaises(ValueError, backcalc.BackCalculator, 'graded Cvt', Dp, 0.001)
+        self.assertRaises(ValueError, backcalc.BackCalculator, 'Cvt', Dp, GSD=GSD)
+
+    def test_main(self):
+        output = os.path.join(self.tmp.name, 'main.csv')
+        self.assertEqual(backcalc.main([self.log, '-o', output, '--Dp', str(Dp), '--d', '0.001']), 0)
+        with open(output) as f:
+            self.assertEqual(len(list(csv.DictReader(f))), len(self.rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""test_batch.py - Tests of the batch scenario runner"""
+
+import csv
+import io
+import os
+import tempfile
+import unittest
+
+from DHLLDV import batch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SCENARIO = {'defaults': {'Dp': 0.762, 'd50': 0.001, 'Cv': 0.175},
+            'sweep': {'Cv': [0.1, 0.2]},
+            'vls': {'start': 1.0, 'stop': 5.0, 'step': 1.0},
+            'models': ['DHLLDV Cvt', 'Wilson V50']}
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.dir.name, 'results.csv')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def read(self):
+        with open(self.output, newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_expand_cases(self):
+        scenario = dict(SCENARIO, cases=[{'name': 'fine', 'd50': 0.0002}, {'name': 'coarse', 'd50': 0.002}])
+        cases = batch.expand_cases(scenario)
+        self.assertEqual([c['name'] for c in cases], ['fine Cv=0.1', 'fine Cv=0.2', 'coarse Cv=0.1', 'coarse Cv=0.2'])
+        self.assertEqual(cases[3]['d50'], 0.002)
+        self.assertEqual(cases[3]['Cv'], 0.2)
+        self.assertEqual(cases[0]['Dp'], 0.762)
+
+    def test_velocity_list(self):
+        self.assertEqual(batch.velocity_list({'start': 1.0, 'stop': 5.0, 'step': 1.0}), [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(batch.velocity_list([2.0, 3.0]), [2.0, 3.0])
+
+    def test_run(self):
+        progress = io.StringIO()
+        self.assertEqual(batch.run(SCENARIO, self.output, progress=progress), 2)
+        rows = self.read()
+        self.assertEqual(len(rows), 2 * (2 * 5 + 1))    # 2 cases of 2 models at 5 velocities, plus the LDV
+        self.assertEqual(sum(r['model'] == 'LDV' for r in rows), 2)
+        self.assertIn('2/2 cases', progress.getvalue())
+
+    def test_resume(self):
+        batch.run(SCENARIO, self.output, progress=None)
+        scenario = dict(SCENARIO, sweep={'Cv': [0.1, 0.2, 0.3]})
+        self.assertEqual(batch.run(scenario, self.output, resume=True, progress=None), 1)
+        rows = self.read()
+        self.assertEqual(sorted({r['case'] for r in rows}), ['Cv=0.1', 'Cv=0.2', 'Cv=0.3'])
+        self.assertEqual(len(rows), 3 * 11)
+
+    @unittest.skipUnless(numpy, "Needs numpy")
+    def test_npz(self):
+        output = os.path.join(self.dir.name, 'results.npz')
+        batch.run(SCENARIO, output, progress=None)
+        scenario = dict(SCENARIO, sweep={'Cv': [0.1, 0.2, 0.3]})
+        batch.run(scenario, output, resume=True, progress=None)
+        self.assertFalse(os.path.exists(output + '.parts'))
+        with numpy.load(output) as results:
+            self.assertEqual(sorted(set(results['case'])), ['Cv=0.1', 'Cv=0.2', 'Cv=0.3'])
+            self.assertEqual(len(results['vls']), 3 * 11)
+
+    def test_pipeline(self):
+        scenario = dict(SCENARIO, sweep={}, defaults=dict(SCENARIO['defaults'],
+                        pipeline=[{'name': 'Entrance', 'diameter': 0.8636, 'dz': -10.0, 'K': 0.5},
+                                  {'name': 'Discharge', 'diameter': 0.762, 'length': 1000, 'K': 1.0, 'dz': 1.5}]))
+        batch.run(scenario, self.output, progress=None)
+        system = [r for r in self.read() if r['model'] == 'system']
+        self.assertEqual(len(system), 5)
+        self.assertGreater(float(system[-1]['Hm']), float(system[-1]['Hl']))
+
+    def test_pipeline_slurry(self):
+        """The system rows use the whole slurry of the case, beyond 10 m/sec"""
+        scenario = dict(SCENARIO, sweep={'rhos': [2.0, 2.65]}, vls=[4.0, 11.0], defaults=dict(SCENARIO['defaults'],
+                        pipeline=[{'name': 'Suction', 'diameter': 0.7, 'length': 100, 'K': 0.5},
+                                  {'name': 'Discharge', 'diameter': 0.762, 'length': 1000, 'K': 1.0}]))
+        self.assertEqual(batch.run(scenario, self.output, progress=None), 2)
+        system = [r for r in self.read() if r['model'] == 'system']
+        self.assertEqual([float(r['vls']) for r in system], [4.0, 11.0, 4.0, 11.0])
+        light, heavy = system[0], system[2]
+        self.assertEqual(light['Hl'], heavy['Hl'])
+        self.assertLess(float(light['Hm']), float(heavy['Hm']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""test_equivalence.py - Check the fast paths and the scalar references against the golden data"""
+
+import os
+import tempfile
+import unittest
+
+from DHLLDV import equivalence
+
+GOLDEN = os.path.join(os.path.dirname(__file__), 'golden', 'equivalence.dlg')
+
+
+class TestEquivalence(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.golden = equivalence.Golden.load(GOLDEN)
+
+    def test_references(self):
+        """The scalar references still give the golden outputs"""
+        for i, case in enumerate(self.golden.cases[::8]):
+            ref = equivalence.reference(case)
+            for q in equivalence.TOLERANCES:
+                with self.subTest(case=i, quantity=q):
+                    rtol, atol = equivalence.TOLERANCES[q]
+                    self.assertTrue(equivalence._close(self.golden.outputs[q][i * 8], ref[q], rtol, atol))
+
+    def test_fast_paths(self):
+        for report in equivalence.check_all(self.golden):
+            with self.subTest(fast_path=report.name):
+                self.assertTrue(report.ok, str(report))
+                self.assertEqual(report.checked, len(self.golden))
+
+    def test_mismatch(self):
+        """A wrong fast path is reported with its inputs, except at regime boundaries"""
+        boundary = self.golden.outputs['Cvt_boundary']
+        report = equivalence.check(self.golden, 'Cvt_Erhg', lambda c: 0.0, name='zero')
+        self.assertFalse(report.ok)
+        self.assertEqual(len(report.mismatches), len(boundary) - sum(boundary))
+        self.assertEqual(len(report.boundary), sum(boundary))
+        self.assertIn('Dp=', str(report))
+
+    def test_round_trip(self):
+        golden = equivalence.Golden.generate(4, seed=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'golden.dlg')
+            golden.save(path)
+            loaded = equivalence.Golden.load(path)
+        self.assertEqual(loaded.cases, golden.cases)
+        self.assertEqual(loaded.outputs, golden.outputs)
+        self.assertEqual(loaded.seed, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
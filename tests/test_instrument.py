@@ -0,0 +1,52 @@
+"""test_instrument.py - Tests of the call count and timing instrumentation"""
+
+import json
+import os
+import pstats
+import tempfile
+import unittest
+
+from DHLLDV import DHLLDV_framework, homogeneous, instrument, stratified
+from DHLLDV.DHLLDV_constants import steel_roughness
+
+args = (0.762, 0.001, steel_roughness, 1.0508e-6, 1.0248103, 2.65, 0.175)
+
+
+class TestInstrument(unittest.TestCase):
+    def tearDown(self):
+        instrument.disable()
+
+    def test_counts(self):
+        """The calls, times and solver iterations are recorded"""
+        original = homogeneous.swamee_jain_ff
+        with instrument.profile() as stats:
+            self.assertIsNot(homogeneous.swamee_jain_ff, original)
+            expected = DHLLDV_framework.LDV(None, *args)
+            stratified.vls_lsdv(*args)
+        self.assertIs(homogeneous.swamee_jain_ff, original)
+        self.assertFalse(instrument.enabled)
+        self.assertEqual(DHLLDV_framework.LDV(None, *args), expected)
+        ldv = stats['DHLLDV_framework.LDV']
+        self.assertEqual(ldv.calls, 1)
+        self.assertGreater(ldv.iterations, 0)
+        self.assertGreaterEqual(ldv.total, ldv.self)
+        self.assertGreater(stats['homogeneous.swamee_jain_ff'].calls, ldv.iterations)
+        self.assertIn('DHLLDV_framework.LDV', stats['homogeneous.swamee_jain_ff'].callers)
+        self.assertEqual(stats['stratified.vls_FBSB'].calls, 1)
+        self.assertNotIn('stratified.vls_lsdv', stats)
+
+    def test_export(self):
+        with instrument.profile():
+            stratified.vls_FBSB(*args)
+        data = json.loads(instrument.to_json())
+        self.assertEqual(data['stratified.vls_FBSB']['calls'], 1)
+        self.assertEqual(data, instrument.as_dict())
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dhlldv.prof')
+            instrument.dump_stats(path)
+            p = pstats.Stats(path)
+            self.assertEqual(p.total_calls, sum(r['calls'] for r in data.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
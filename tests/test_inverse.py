@@ -0,0 +1,84 @@
+"""test_inverse.py - Tests of the inverse solvers"""
+
+import unittest
+
+from DHLLDV import DHLLDV_framework, homogeneous, inverse
+from DHLLDV.DHLLDV_constants import steel_roughness
+from DHLLDV.PipeObj import Pipeline
+
+fluid = (steel_roughness, 1.0508e-6, 1.0248103, 2.65)
+Rsd = (2.65 - 1.0248103) / 1.0248103
+GSD = {0.15: 0.0005, 0.50: 0.001, 0.85: 0.00272}
+
+
+def im(vls, Dp, d, Cvt):
+    return (DHLLDV_framework.Cvt_Erhg(vls, Dp, d, *fluid, Cvt) * Rsd * Cvt
+            + homogeneous.fluid_head_loss(vls, Dp, *fluid[:3]))
+
+
+class TestCurve(unittest.TestCase):
+    def test_roots(self):
+        """Every root in the range, in order"""
+        curve = inverse.Curve(lambda x: (x - 1) * (x - 2) * (x - 3), 0.0, 4.0, steps=9)
+        roots = curve.roots(0.0)
+        self.assertEqual(len(roots), 3)
+        for root, expected in zip(roots, (1, 2, 3)):
+            self.assertAlmostEqual(root, expected, places=7)
+        self.assertEqual(curve.roots(100.0), [])
+        self.assertEqual(curve.roots_list([0.0, 100.0]), [roots, []])
+
+
+class TestInverse(unittest.TestCase):
+    def test_velocities(self):
+        """im is non monotonic in the velocity, both roots are found"""
+        roots = inverse.velocities_for_im(0.08, 0.762, 0.001, *fluid, 0.175)
+        self.assertEqual(len(roots), 2)
+        for vls in roots:
+            self.assertAlmostEqual(im(vls, 0.762, 0.001, 0.175), 0.08, places=8)
+        curve = inverse.im_vls_curve(0.762, 0.001, *fluid, 0.175)
+        self.assertEqual(curve.roots_list([0.08, 1.0]), [roots, []])
+
+    def test_Cv(self):
+        roots = inverse.Cv_for_im(0.08, 5.0, 0.762, 0.001, *fluid)
+        self.assertEqual(len(roots), 1)
+        self.assertAlmostEqual(im(5.0, 0.762, 0.001, roots[0]), 0.08, places=8)
+
+    def test_graded(self):
+        fracs = DHLLDV_framework.create_fracs(GSD, 0.762, 1.0508e-6, 1.0248103, 2.65)
+        for vls in inverse.velocities_for_im_graded(0.08, GSD, 0.762, *fluid, 0.175):
+            Erhg = DHLLDV_framework.Erhg_graded(fracs, vls, 0.762, *fluid, 0.175, Cvt_eq_Cvs=True, num_fracs=None)
+            self.assertAlmostEqual(Erhg * Rsd * 0.175 + homogeneous.fluid_head_loss(vls, 0.762, *fluid[:3]), 0.08,
+                                   places=8)
+        for Cvt in inverse.Cv_for_im_graded(0.08, GSD, 5.0, 0.762, *fluid):
+            Erhg = DHLLDV_framework.Erhg_graded(fracs, 5.0, 0.762, *fluid, Cvt, Cvt_eq_Cvs=True, num_fracs=None)
+            self.assertAlmostEqual(Erhg * Rsd * Cvt + homogeneous.fluid_head_loss(5.0, 0.762, *fluid[:3]), 0.08,
+                                   places=8)
+
+
+class TestPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pipeline = Pipeline()
+        cls.Q = cls.pipeline.pipesections[-1].flow(5.0)
+
+    def test_system_head(self):
+        """system_head is calc_system_head at the pipeline Cv, on the tabulated velocities"""
+        self.assertAlmostEqual(inverse.system_head(self.pipeline, self.Q, self.pipeline.Cv),
+                               self.pipeline.calc_system_head(self.Q)[0], places=8)
+
+    def test_flows(self):
+        """The exact system head at the flows is the target, as for max_Cv_for_head"""
+        roots = inverse.flows_for_head(80.0, self.pipeline)
+        self.assertEqual(len(roots), 2)
+        for Q in roots:
+            self.assertAlmostEqual(inverse.system_head(self.pipeline, Q, self.pipeline.Cv), 80.0, places=6)
+
+    def test_max_Cv(self):
+        Cv = inverse.max_Cv_for_head(80.0, self.pipeline, self.Q)
+        self.assertAlmostEqual(inverse.system_head(self.pipeline, self.Q, Cv), 80.0, places=6)
+        self.assertEqual(inverse.max_Cv_for_head(1000.0, self.pipeline, self.Q), inverse.CV_RANGE[1])
+        self.assertIsNone(inverse.max_Cv_for_head(1.0, self.pipeline, self.Q))
+
+
+if __name__ == '__main__':
+    unittest.main()
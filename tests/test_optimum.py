@@ -0,0 +1,46 @@
+"""test_optimum.py - Tests of the minimum im velocity"""
+
+import unittest
+
+from DHLLDV import DHLLDV_framework, homogeneous, optimum
+from DHLLDV.DHLLDV_constants import steel_roughness
+
+fluid = (steel_roughness, 1.0508e-6, 1.0248103, 2.65)
+Rsd = (2.65 - 1.0248103) / 1.0248103
+GSD = {0.15: 0.0005, 0.50: 0.001, 0.85: 0.00272}
+
+
+def im(Erhg, vls, Dp, Cv):
+    return Erhg * Rsd * Cv + homogeneous.fluid_head_loss(vls, Dp, steel_roughness, 1.0508e-6, 1.0248103)
+
+
+class TestMinimumIm(unittest.TestCase):
+    def test_uniform(self):
+        """The minimum is lower than im a little either side of it"""
+        for Dp, d, Cv in ((0.762, 0.001, 0.175), (0.5, 0.0003, 0.1), (0.3, 0.002, 0.3)):
+            with self.subTest(Dp=Dp, d=d, Cv=Cv):
+                result = optimum.minimum_im(Dp, d, *fluid, Cv)
+                vls = result['vls']
+                self.assertAlmostEqual(result['im'], im(DHLLDV_framework.Cvt_Erhg(vls, Dp, d, *fluid, Cv), vls, Dp, Cv))
+                for step in (-0.05, 0.05):
+                    other = im(DHLLDV_framework.Cvt_Erhg(vls + step, Dp, d, *fluid, Cv), vls + step, Dp, Cv)
+                    self.assertGreater(other, result['im'])
+                self.assertAlmostEqual(result['specific_energy'], result['im'] * 1.0248103 * 9.80665 / (2.65 * Cv), 3)
+
+    def test_list(self):
+        results = optimum.minimum_im_list(0.762, 0.001, *fluid, [0.1, 0.2], basis='Cvs')
+        self.assertEqual(results[1], optimum.minimum_im(0.762, 0.001, *fluid, 0.2, basis='Cvs'))
+
+    def test_graded(self):
+        results = optimum.minimum_im_graded_list([GSD], 0.762, *fluid, [0.175])
+        result = results[0][0]
+        self.assertEqual(result, optimum.minimum_im_graded(GSD, 0.762, *fluid, 0.175))
+        fracs = DHLLDV_framework.create_fracs(GSD, 0.762, 1.0508e-6, 1.0248103, 2.65)
+        for step in (-0.05, 0.05):
+            vls = result['vls'] + step
+            Erhg = DHLLDV_framework.Erhg_graded(fracs, vls, 0.762, *fluid, 0.175, Cvt_eq_Cvs=True, num_fracs=None)
+            self.assertGreater(im(Erhg, vls, 0.762, 0.175), result['im'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""test_regimes.py - Tests of the regime boundaries and maps"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from DHLLDV import DHLLDV_framework, regimes
+from DHLLDV.regimes import CODES, RegimeMap
+from DHLLDV.DHLLDV_constants import steel_roughness
+
+fluid = (steel_roughness, 1.0508e-6, 1.0248103, 2.65)
+
+
+class TestBoundaries(unittest.TestCase):
+    def check(self, Dp, d, Cv, basis):
+        """The regime changes at each boundary, and nowhere else on a dense scan"""
+        func = DHLLDV_framework.Cvs_Erhg if basis == 'Cvs' else DHLLDV_framework.Cvt_Erhg
+        args = (Dp, d, *fluid, Cv)
+        found = regimes.boundaries(*args, basis=basis)
+        for vls, below, above in found:
+            self.assertEqual(func(vls * (1 - 1e-6), *args, get_dict=True)['regime'], below)
+            self.assertEqual(func(vls * (1 + 1e-6), *args, get_dict=True)['regime'], above)
+        changes = []
+        previous = None
+        for i in range(400):
+            vls = 0.1 + i * 0.05
+            r = func(vls, *args, get_dict=True)['regime']
+            if previous is not None and r != previous:
+                changes.append((previous, r))
+            previous = r
+        self.assertEqual([(below, above) for _, below, above in found], changes)
+        return found
+
+    def test_boundaries(self):
+        for basis in ('Cvs', 'Cvt'):
+            for Dp, d, Cv in ((0.762, 0.001, 0.175), (0.3, 0.0002, 0.1), (0.5, 0.005, 0.3), (1.0, 0.0005, 0.05)):
+                with self.subTest(basis=basis, Dp=Dp, d=d, Cv=Cv):
+                    self.check(Dp, d, Cv, basis)
+
+    def test_list(self):
+        d_list = [0.0005, 0.001]
+        Cv_list = [0.1, 0.2, 0.3]
+        result = regimes.boundaries_list(0.762, d_list, *fluid, Cv_list)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[1][2], regimes.boundaries(0.762, 0.001, *fluid, 0.3))
+
+    def test_regime(self):
+        """The cached regime is the same as Cvs_regime and Cvt_regime"""
+        args = (0.762, 0.001, *fluid, 0.175)
+        for i in range(60):
+            vls = 0.05 + i * 0.25
+            self.assertEqual(DHLLDV_framework.Cvs_regime(vls, *args, cached=True),
+                             DHLLDV_framework.Cvs_regime(vls, *args))
+            self.assertEqual(DHLLDV_framework.Cvt_regime(vls, *args, cached=True),
+                             DHLLDV_framework.Cvt_regime(vls, *args))
+
+
+    def test_coarse_Cvt(self):
+        """The Cvt Erhg of coarse slurries is complex at low velocity"""
+        args = (1.112, 0.011064, steel_roughness, 1e-6, 1.0248, 2.65, 0.0318)
+        self.assertEqual(DHLLDV_framework.Cvt_regime(3.3, *args, cached=True), DHLLDV_framework.Cvt_regime(3.3, *args))
+        self.assertGreater(regimes.boundaries(*args, basis='Cvt')[0][0], 0.5)
+
+    def test_narrow(self):
+        """A sliding bed narrower than the scan"""
+        args = (0.772, 0.00989, *fluid, 0.149)
+        self.assertEqual([(below, above) for _, below, above in regimes.boundaries(*args)][:2],
+                         [('FB', 'SB'), ('SB', 'He')])
+        self.assertEqual(DHLLDV_framework.Cvs_regime(3.89, *args, cached=True), 'sliding bed')
+
+    def test_random(self):
+        """The cached regime is the exact one for random slurries and velocities"""
+        rng = random.Random(46)
+        for _ in range(150):
+            Dp, d, Cv = rng.uniform(0.15, 1.2), 10 ** rng.uniform(-4.3, -1.7), rng.uniform(0.01, 0.4)
+            vls = rng.uniform(0.5, 10.0)
+            args = (vls, Dp, d, *fluid, Cv)
+            for regime in (DHLLDV_framework.Cvs_regime, DHLLDV_framework.Cvt_regime):
+                try:
+                    exact = regime(*args)
+                except (IndexError, TypeError):     # Where the model is not defined
+                    continue
+                with self.subTest(regime=regime.__name__, args=args):
+                    self.assertEqual(regime(*args, cached=True), exact)
+
+
+class TestRegimeMap(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.map = RegimeMap.build('d', (0.05e-3, 10e-3, 9), (0.5, 10.0, 39), Cv=0.2, basis='Cvs', tile=4)
+
+    def test_codes(self):
+        """Each cell has the regime of Cvs_Erhg"""
+        d_axis = self.map.table.axes[0][1]
+        vls_axis = self.map.table.axes[1][1]
+        for i, d in enumerate(d_axis):
+            for j, vls in enumerate(vls_axis):
+                obj = DHLLDV_framework.Cvs_Erhg(vls, 0.762, d, *fluid, 0.2, get_dict=True)
+                self.assertEqual(self.map.code(i, j), CODES[obj['regime']])
+
+    def test_undefined(self):
+        """Cells of a coarse Cvt map where the Erhg is complex"""
+        regime_map = RegimeMap.build('d', (0.05e-3, 20e-3, 4), (0.1, 10.0, 12), Dp=1.1, Cv=0.03, basis='Cvt')
+        self.assertEqual(regime_map.code(3, 0), regimes.UNDEFINED)
+        self.assertEqual(regime_map.code(3, 11), CODES['He'])
+        self.assertIn('.=undefined', regime_map.text())
+
+    def test_polylines(self):
+        """The polylines join the boundaries of the rows"""
+        d_axis = self.map.table.axes[0][1]
+        points = sorted((vls, d, line['below'], line['above'])
+                        for line in self.map.polylines for vls, d in line['points'])
+        expected = sorted((vls, d, below, above) for d in d_axis
+                          for vls, below, above in regimes.boundaries(0.762, d, *fluid, 0.2))
+        self.assertEqual(points, expected)
+        for line in self.map.polylines:
+            ds = [d for _, d in line['points']]
+            self.assertEqual(ds, sorted(ds))
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'map.dlt')
+            self.map.save(path)
+            loaded = RegimeMap.open(path)
+            try:
+                self.assertEqual(loaded.row(3), self.map.row(3))
+                self.assertEqual(loaded.polylines, self.map.polylines)
+                self.assertEqual(loaded.text(), self.map.text())
+            finally:
+                loaded.table.close()
+
+    def test_workers(self):
+        parallel = RegimeMap.build('Cv', (0.1, 0.3, 3), (1.0, 6.0, 6), basis='Cvs', workers=2, tile=1)
+        serial = RegimeMap.build('Cv', (0.1, 0.3, 3), (1.0, 6.0, 6), basis='Cvs')
+        self.assertEqual([parallel.row(i) for i in range(3)], [serial.row(i) for i in range(3)])
+        self.assertEqual(parallel.polylines, serial.polylines)
+
+
+if __name__ == '__main__':
+    unittest.main()
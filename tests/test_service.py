@@ -0,0 +1,120 @@
+"""test_service.py - Tests of the JSON lines calculation service"""
+
+import io
+import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV.DHLLDV_constants import steel_roughness
+from DHLLDV.service import Service
+
+Q = [0.3567568, 0.7135136, 1.0702704, 1.4270272, 1.7837840, 2.1405408, 2.4972976, 2.8540544,
+     3.2108112, 3.5675680, 3.9243248, 4.2810816, 4.6378384, 4.9945952, 5.3513520]
+H = [30.093008, 29.489334, 29.090661, 28.781914, 28.474970, 28.104580, 27.627627, 27.023164,
+     26.291587, 25.452159, 24.538921, 23.595749, 22.671603, 21.816991, 21.082392]
+P = [229.184279, 344.839984, 450.410668, 553.727956, 656.571060, 758.888651, 860.271806, 960.803020,
+     1061.634585, 1165.351961, 1276.124040, 1399.632204, 1542.729293, 1712.676097, 1915.670989]
+
+PIPELINE = [{'name': 'Entrance', 'diameter': 0.8636, 'dz': -10.0, 'K': 0.5},
+            {'name': 'Discharge', 'diameter': 0.762, 'length': 1000, 'K': 1.0, 'dz': 1.5}]
+PUMP = {'name': 'Test Pump', 'design_speed': 3.5, 'design_impeller': 1.88, 'suction_dia': 0.8636,
+        'disch_dia': 0.8636, 'avail_power': 1500, 'limited': 'none', 'Q': Q, 'H': H, 'P': P, 'speed': 5.0}
+
+
+class TestService(unittest.TestCase):
+    def setUp(self):
+        self.service = Service()
+
+    def test_batch(self):
+        """Requests for the same slurry are batched and match the framework"""
+        requests = [{'id': 1, 'method': 'Cvt_Erhg', 'params': {'vls': [3.0, 4.0], 'Cv': 0.2}},
+                    {'id': 2, 'method': 'Cvt_Erhg', 'params': {'vls': 4.0, 'Cv': 0.2}},
+                    {'id': 3, 'method': 'Cvs_Erhg', 'params': {'vls': 4.0, 'Cv': 0.2, 'd': 0.0005}},
+                    {'id': 4, 'method': 'unknown'}]
+        responses = self.service.handle_batch(requests)
+        self.assertEqual([r['id'] for r in responses], [1, 2, 3, 4])
+        expected = DHLLDV_framework.Cvt_Erhg(4.0, 0.762, 0.001, steel_roughness, 1.0508e-6, 1.0248103, 2.65, 0.2)
+        self.assertEqual(responses[0]['result'][1], expected)
+        self.assertEqual(responses[1]['result'], expected)
+        self.assertEqual(responses[2]['result'],
+                         DHLLDV_framework.Cvs_Erhg(4.0, 0.762, 0.0005, steel_roughness, 1.0508e-6, 1.0248103, 2.65, 0.2))
+        self.assertIn('error', responses[3])
+
+    def test_pipeline(self):
+        """The system head and operating point of a pipeline"""
+        head = self.service.handle({'id': 1, 'method': 'system_head',
+                                    'params': {'Q': 3.0, 'pipeline': PIPELINE, 'Cv': 0.1}})['result']
+        self.assertGreater(head[0], head[1])
+        point = self.service.handle({'id': 2, 'method': 'operating_point',
+                                     'params': {'pipeline': PIPELINE, 'Cv': 0.1, 'pump': PUMP}})['result']
+        head = self.service.handle({'id': 3, 'method': 'system_head',
+                                    'params': {'Q': point['Q'], 'pipeline': PIPELINE, 'Cv': 0.1}})['result']
+        self.assertAlmostEqual(point['H'], head[0], delta=0.01)
+
+    def test_operating_point_fast(self):
+        """An operating point near and beyond the top of the default slurry curves (10 m/sec)"""
+        for speed in (6.0, 7.0):
+            point = self.service.handle({'id': 1, 'method': 'operating_point',
+                                         'params': {'pipeline': PIPELINE, 'Cv': 0.1, 'pump': dict(PUMP, speed=speed)}})
+            self.assertGreater(point['result']['Q'] / (3.14159 * 0.762 ** 2 / 4), 9.9)
+            head = self.service.handle({'id': 2, 'method': 'system_head',
+                                        'params': {'Q': point['result']['Q'], 'pipeline': PIPELINE, 'Cv': 0.1}})
+            self.assertAlmostEqual(point['result']['H'], head['result'][0], delta=0.01)
+
+    def test_pipeline_slurry(self):
+        """The system head uses the whole slurry, with the same names as the Erhg methods"""
+        def head(**params):
+            params.update(Q=3.0, pipeline=PIPELINE, Cv=0.1)
+            return self.service.handle({'id': 1, 'method': 'system_head', 'params': params})['result'][0]
+        self.assertEqual(head(d50=0.0005), head(d=0.0005))
+        self.assertNotEqual(head(d50=0.0005), head())
+        self.assertLess(head(rhos=2.0), head())
+
+    def test_serve(self):
+        """Requests on a stream, including a bad line"""
+        lines = [json.dumps({'id': i, 'method': 'LDV', 'params': {'Cv': 0.1 * i}}) + '\n' for i in (1, 2)]
+        out = io.StringIO()
+        self.service.serve(lines + ['not json\n'], out)
+        responses = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(sorted(r['id'] for r in responses if 'result' in r), [1, 2])
+
+    def test_lone_request(self):
+        """A lone request does not wait for the batching window"""
+        service = Service(batch_window=5.0)
+        service.handle({'id': 1, 'method': 'LDV', 'params': {}})    # Cached
+        responses = queue.Queue()
+        service.start()
+        start = time.monotonic()
+        service.submit('{"id": 2, "method": "LDV", "params": {}}', responses.put)
+        self.assertEqual(responses.get(timeout=5.0)['id'], 2)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Needs unix sockets")
+    def test_socket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dhlldv.sock')
+            self.service.start()
+            server = self.service.server(path)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(path)
+                    client.sendall(b'{"id": 7, "method": "LDV", "params": {}}\n')
+                    response = json.loads(client.makefile().readline())
+                self.assertEqual(response['id'], 7)
+                self.assertAlmostEqual(response['result'], DHLLDV_framework.LDV(
+                    None, 0.762, 0.001, steel_roughness, 1.0508e-6, 1.0248103, 2.65, 0.175))
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
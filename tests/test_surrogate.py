@@ -0,0 +1,145 @@
+"""test_surrogate.py - Tests of the precomputed Erhg and LDV tables"""
+
+import os
+import tempfile
+import unittest
+
+from DHLLDV import DHLLDV_framework
+from DHLLDV.DHLLDV_constants import steel_roughness
+from DHLLDV.surrogate import ErhgTable, GridTable, LDVTable, log_axis
+
+fluid = (steel_roughness, 1.0508e-6, 1.0248103, 2.65)
+
+
+class TestErhgTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.table = ErhgTable.build('Cvt', 'salt', 2.65, Dp=(0.5, 0.8, 2), d=(0.0005, 0.002, 3), Cv=(0.1, 0.2, 3),
+                                    vls=(2.0, 8.0, 12), error_samples=200)
+
+    def exact(self, vls, Dp, d, Cv):
+        return DHLLDV_framework.Cvt_Erhg(vls, Dp, d, steel_roughness, 1.0508e-6, 1.0248103, 2.65, Cv)
+
+    def test_axis(self):
+        axis = log_axis(0.1, 10.0, 3)
+        self.assertAlmostEqual(axis[1], 1.0)
+        self.assertEqual((axis[0], axis[-1]), (0.1, 10.0))
+
+    def test_nodes(self):
+        """At the grid points the table gives the exact values"""
+        axes = dict(self.table.table.axes)
+        for vls in axes['vls'][3:6]:
+            value = self.table.lookup(vls, axes['Dp'][1], axes['d'][1], axes['Cv'][1])
+            if value is not None:
+                self.assertAlmostEqual(value, self.exact(vls, axes['Dp'][1], axes['d'][1], axes['Cv'][1]), places=12)
+
+    def test_fallback(self):
+        """Outside the table the exact function is used"""
+        self.assertIsNone(self.table.lookup(1.0, 0.6, 0.001, 0.15))
+        before = self.table.fallbacks
+        self.assertEqual(self.table.Erhg(1.0, 0.6, 0.001, 0.15), self.exact(1.0, 0.6, 0.001, 0.15))
+        self.assertEqual(self.table.fallbacks, before + 1)
+
+    def test_error(self):
+        """The interpolated values are within the measured error"""
+        error = self.table.table.error
+        self.assertLess(error['max'], 0.2)
+        for vls in (2.5, 4.5, 6.5):
+            value = self.table.lookup(vls, 0.6, 0.001, 0.15)
+            if value is not None:
+                exact = self.exact(vls, 0.6, 0.001, 0.15)
+                self.assertLessEqual(abs(value - exact) / exact, error['max'] * 1.5)
+
+    def test_file(self):
+        """The table is the same after saving and memory mapping it"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'erhg.dlt')
+            self.table.save(path)
+            loaded = ErhgTable.open(path)
+            try:
+                self.assertEqual(loaded.table.axes, self.table.table.axes)
+                self.assertEqual(loaded.table.error, self.table.table.error)
+                self.assertEqual(list(loaded.table.layers['regime']), list(self.table.table.layers['regime']))
+                for vls in (2.5, 4.5, 6.5):
+                    self.assertEqual(loaded.Erhg(vls, 0.6, 0.001, 0.15), self.table.Erhg(vls, 0.6, 0.001, 0.15))
+            finally:
+                loaded.table.close()
+
+    def test_bad_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bad.dlt')
+            with open(path, 'wb') as f:
+                f.write(b'not a table')
+            self.assertRaises(ValueError, GridTable.open, path)
+
+
+class TestLDVTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.table = LDVTable.build('salt', 2.65, Dp=(0.3, 1.0, 4), d=(0.0002, 0.005, 8), Cv=(0.05, 0.3, 6),
+                                   error_samples=100)
+
+    def tearDown(self):
+        DHLLDV_framework.use_LDV_table(None)
+
+    def test_bound(self):
+        """The table is within its error bound of the exact LDV"""
+        bound = self.table.table.error['max']
+        self.assertLess(bound, 0.1)
+        for Dp, d, Cv in ((0.5, 0.0005, 0.1), (0.8, 0.001, 0.2), (0.35, 0.004, 0.25)):
+            exact = DHLLDV_framework.LDV(None, Dp, d, *fluid[:3], fluid[3], Cv)
+            self.assertLessEqual(abs(self.table.LDV(Dp, d, Cv) - exact) / exact, bound)
+
+    def test_use(self):
+        """The framework uses the table for its own fluid, inside its range"""
+        args = (0.5, 0.0005, *fluid, 0.1)
+        exact = DHLLDV_framework.LDV(None, *args)
+        DHLLDV_framework.use_LDV_table(self.table)
+        self.assertEqual(DHLLDV_framework.LDV(None, *args), self.table.LDV(0.5, 0.0005, 0.1))
+        self.assertNotEqual(DHLLDV_framework.LDV(None, *args), exact)
+        self.assertEqual(DHLLDV_framework.LDV(None, *args, exact=True), exact)
+        fresh = (0.5, 0.0005, steel_roughness, 1.0e-6, 1.0, 2.65, 0.1)
+        self.assertEqual(DHLLDV_framework.LDV(None, *fresh), DHLLDV_framework.LDV(None, *fresh, exact=True))
+        outside = (0.5, 0.0005, *fluid, 0.4)
+        self.assertEqual(DHLLDV_framework.LDV(None, *outside), DHLLDV_framework.LDV(None, *outside, exact=True))
+        jump = (0.5, 0.0025, *fluid, 0.1)
+        self.assertIsNone(self.table.lookup(*jump))
+
+    def test_exact_erhg(self):
+        """An ErhgTable is built on the exact LDV while a table is in use"""
+        lookups = []
+
+        class Counting(LDVTable):
+            def lookup(self, *args):
+                lookups.append(args)
+                return super().lookup(*args)
+
+        DHLLDV_framework.use_LDV_table(Counting(self.table.table))
+        DHLLDV_framework.Cvt_Erhg(4.0, 0.5, 0.0005, *fluid, 0.1)
+        self.assertTrue(lookups)
+        del lookups[:]
+        erhg = ErhgTable.build('Cvt', 'salt', 2.65, Dp=(0.5, 0.6, 2), d=(0.0005, 0.0006, 2), Cv=(0.1, 0.11, 2),
+                               vls=(4.0, 4.5, 2), error_samples=0)
+        erhg.exact(4.0, 0.5, 0.0005, 0.1)
+        self.assertEqual(lookups, [])
+        self.assertIsInstance(DHLLDV_framework.LDV_table, Counting)
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ldv.dlt')
+            self.table.save(path)
+            loaded = DHLLDV_framework.use_LDV_table(path)
+            self.assertEqual(loaded.LDV(0.5, 0.0005, 0.1), self.table.LDV(0.5, 0.0005, 0.1))
+            self.assertRaises(ValueError, ErhgTable.open, path)
+            DHLLDV_framework.use_LDV_table(None)
+            loaded.table.close()
+            self.table.table.meta['model_version'] = 0
+            try:
+                self.table.save(path)
+                self.assertRaises(ValueError, LDVTable.open, path)
+            finally:
+                self.table.table.meta['model_version'] = LDVTable.MODEL_VERSION
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""test_telemetry.py - Tests of the solver convergence telemetry"""
+
+import unittest
+
+from DHLLDV import DHLLDV_framework, instrument, stratified, telemetry
+from DHLLDV.DHLLDV_constants import steel_roughness
+from DHLLDV.DHLLDV_Utils import find_root
+from Wilson import Wilson_V50
+
+args = (0.762, 0.001, steel_roughness, 1.0508e-6, 1.0248103, 2.65, 0.175)
+
+
+class TestTelemetry(unittest.TestCase):
+    def tearDown(self):
+        telemetry.disable()
+        instrument.disable()
+
+    def test_collect(self):
+        """Each solver reports its steps and residual"""
+        with telemetry.collect() as sites:
+            DHLLDV_framework.LDV(None, *args)
+            stratified.vls_FBSB(*args)
+            Wilson_V50.V50(0.762, 0.001, 0.00272, steel_roughness, 1.0508e-6, 1.0248103, 2.65)
+            find_root(lambda x: x * x - 2, 0, 2)
+        self.assertFalse(telemetry.enabled)
+        for site in ('stratified.vls_FBSB', 'Wilson_V50.V50', 'DHLLDV_Utils.find_root'):
+            self.assertEqual(sites[site].calls, 1, site)
+            self.assertEqual(sites[site].failures, 0, site)
+        # The LDV loops stop at max_steps=10, short of their 1e-5 tolerance
+        for loop in ('very small', 'small', 'large', 'lower limit'):
+            s = sites['DHLLDV_framework.LDV:' + loop]
+            self.assertEqual(s.steps, {10: 1})
+            self.assertLess(s.max_residual, 1e-3)
+        self.assertEqual(sum(telemetry.summary()['DHLLDV_Utils.find_root']['steps'].values()), 1)
+        self.assertIn('stratified.vls_FBSB', telemetry.report())
+
+    def test_failure(self):
+        """Non convergence is recorded, and can warn or raise"""
+        with telemetry.collect() as sites:
+            stratified.vls_FBSB(*args, max_steps=1)
+        s = sites['stratified.vls_FBSB']
+        self.assertEqual((s.calls, s.failures), (1, 1))
+        self.assertEqual(s.examples[0][0], args)
+        with telemetry.collect('warn'):
+            with self.assertWarns(telemetry.NonConvergenceWarning):
+                stratified.vls_FBSB(*args, max_steps=1)
+        with telemetry.collect('raise'):
+            with self.assertRaises(telemetry.ConvergenceError):
+                stratified.vls_FBSB(*args, max_steps=1)
+
+    def test_cached_V50(self):
+        """Each Wilson Erhg call is recorded, with no steps when V50 is cached"""
+        Wilson_V50.V50_M.cache_clear()
+        with telemetry.collect() as sites:
+            for i in range(3):
+                Wilson_V50.Erhg_list([2.0, 4.0], 0.762, 0.001, 0.00272, steel_roughness, 1.0508e-6, 1.0248103,
+                                     2.65, 0.4)
+        s = sites['Wilson_V50.V50']
+        self.assertEqual(s.calls, 3)
+        self.assertEqual(s.steps[0], 2)
+
+    def test_instrument(self):
+        """The steps go to instrument, without collecting"""
+        telemetry.sites.clear()
+        with instrument.profile() as stats:
+            self.assertTrue(telemetry.enabled)
+            DHLLDV_framework.LDV(None, *args)
+        self.assertFalse(telemetry.enabled)
+        self.assertEqual(telemetry.sites, {})
+        self.assertGreater(stats['DHLLDV_framework.LDV'].iterations, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
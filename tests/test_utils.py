@@ -38,6 +38,17 @@ class TestInterpDict(unittest.TestCase):
         
 
 
+class TestFindMinimum(unittest.TestCase):
+
+    def testSmooth(self):
+        x, fx = DHLLDV_Utils.find_minimum(lambda x: (x - 1.234)**2 + 3, 0, 5, xtol=1e-9)
+        self.assertAlmostEqual(x, 1.234, places=6)
+        self.assertAlmostEqual(fx, 3)
+
+    def testKink(self):
+        x, fx = DHLLDV_Utils.find_minimum(lambda x: abs(x - 2.5), 5, 0, xtol=1e-8)
+        self.assertAlmostEqual(x, 2.5, places=7)
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
\ No newline at end of file